@@ -0,0 +1,97 @@
+"""
+Processus d'inférence: charge DeepFace/TensorFlow une seule fois et sert les analyses
+émotionnelles aux passerelles (INFERENCE_MODE=remote) sur un socket Unix.
+
+Usage (depuis backend/):
+    python -m app.inference_worker [--socket /tmp/aib-inference.sock]
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+import dotenv
+
+dotenv.load_dotenv()
+
+from app.services.fer_cache import EmotionResultCache
+from app.services.inference import EmotionInferenceService, InferenceQueueFull
+from app.services.inference_client import INFERENCE_SOCKET
+from app.services.ipc import read_message, write_message
+from app.utils.logger import logger_init
+
+logger_init()
+logger = logging.getLogger(__name__)
+
+
+async def handle_connection(service: EmotionInferenceService, cache: EmotionResultCache,
+                            reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """
+    Traite les requêtes d'une passerelle; les réponses partent dans l'ordre où elles sont prêtes.
+    Le cache perceptuel des résultats est tenu ici, partagé par toutes les passerelles.
+    """
+    tasks = set()
+
+    async def answer(request_id, payload: bytes):
+        try:
+            result, key = await cache.lookup(payload)
+            if result is None:
+                result = await service.score(payload)
+                cache.store(key, result)
+            response = {"id": request_id, "result": result}
+        except InferenceQueueFull as e:
+            response = {"id": request_id, "error": str(e), "queue_full": True}
+        except Exception as e:
+            response = {"id": request_id, "result": {"error": str(e)}}
+        write_message(writer, response)
+        await writer.drain()
+
+    try:
+        while True:
+            header, payload = await read_message(reader)
+            if header.get("op") == "score":
+                task = asyncio.create_task(answer(header.get("id"), payload))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            elif header.get("op") == "ping":
+                write_message(writer, {"id": header.get("id"), "ready": service.ready, "pending": service.pending})
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    except ValueError as e:
+        logger.warning(f"Message invalide d'une passerelle: {e}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        writer.close()
+
+
+async def serve(socket_path: str):
+    service = EmotionInferenceService()
+    cache = EmotionResultCache(perceptual=True)
+    # Les modèles sont chargés avant d'ouvrir le socket: une passerelle connectée est servie tout de suite
+    await service.start()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(lambda r, w: handle_connection(service, cache, r, w), path=socket_path)
+    logger.info(f"Processus d'inférence prêt sur {socket_path}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Processus d'inférence émotionnelle")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET, help="chemin du socket Unix")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,21 @@
 # main.py
+import dotenv
+
+dotenv.load_dotenv()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import api, websocket
+from app.routes import api, websocket, metrics
+from app.services.inference import emotion_service
+from app.services.xrp import xrpl_gateway
+from app.services.state import state_backend
+from app.services.images import image_store
+from app.services.ai import synthesize_google
+from app.services.tts_cache import DEFAULT_PREWARM
+from app.services.metrics import MetricsMiddleware
 from app.utils.logger import logger_init
-import dotenv
+import asyncio
 import logging
 import os
 
@@ -11,11 +23,35 @@ import os
 logger_init()
 logger = logging.getLogger(__name__)
 
-dotenv.load_dotenv()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # État partagé entre workers (registre des joueurs, manche en cours)
+    await state_backend.start()
+    await websocket.manager.start()
+    await api.round_scheduler.restore()
+    api.scoreboard.start()
+    # Charge les modèles avant d'accepter les premières requêtes
+    await emotion_service.start()
+    api.balance_cache.start()
+    api.wallet_pool.start()
+    phrases = [p for p in os.environ.get("TTS_PREWARM", DEFAULT_PREWARM).split("|") if p]
+    prewarm = asyncio.create_task(api.tts_cache.prewarm(phrases, "google", "fr", "com", synthesize_google))
+    yield
+    prewarm.cancel()
+    await api.scoring_jobs.stop()
+    await api.wallet_pool.stop()
+    await api.balance_cache.stop()
+    await emotion_service.stop()
+    await xrpl_gateway.stop()
+    await state_backend.stop()
+    image_store.close()
+
 
 app = FastAPI(title="AIcebreaker Backend",
              description="Backend pour l'application de compte à rebours en temps réel",
-             version="1.0.0")
+             version="1.0.0",
+             lifespan=lifespan)
 
 # Configuration CORS
 FRONTEND_ADDR = os.environ.get('FRONTEND_ADDR')
@@ -25,8 +61,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # En-têtes lisibles par le frontend (clé audio, revalidation, délai après un 429)
+    expose_headers=["X-TTS-Key", "ETag", "Retry-After"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Include routersx
 app.include_router(api.router, prefix="/api", tags=["api"])
-app.include_router(websocket.router, tags=["websocket"])
\ No newline at end of file
+app.include_router(websocket.router, tags=["websocket"])
+app.include_router(metrics.router, tags=["metrics"])
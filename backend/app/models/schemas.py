@@ -18,10 +18,19 @@ class Client(BaseModel):
     wallet_seed: str
     xrp_balance: float
     is_connected: bool
+    round_id: Optional[str] = None  # dernière manche jouée
 
-# Modèle pour la liste des clients connectés
+# Modèle pour la liste des clients connectés (une page)
 class ClientList(BaseModel):
-    clients: List[Client] 
+    clients: List[Client]
+    total: int
+    offset: int
+    limit: int
+    version: int
 
 class GameResultRequest(BaseModel):
-    game_result: str
\ No newline at end of file
+    game_result: str
+
+# Modèle pour la lecture groupée des soldes
+class BalancesRequest(BaseModel):
+    wallets: List[str]
@@ -1,14 +1,28 @@
-import json
-import asyncio
 import logging
 from app.utils.logger import logger_init
-from fastapi import APIRouter, HTTPException, Form, File, UploadFile, Query, Body
-from app.models.schemas import Countdown, ClientList, Client
+from fastapi import APIRouter, HTTPException, Form, File, UploadFile, Query, Body, Request
+from app.models.schemas import Countdown, ClientList, BalancesRequest
 from app.routes.websocket import manager
-from app.services.xrp import create_wallet, get_xrp_balance
-from fastapi.responses import JSONResponse
-from app.services.ai import fer_score, tts_google, tts_x3
+from app.services.messages import encode
+from app.services.rounds import RoundScheduler, RoundError, RoundNotFound
+from app.services.state import state_backend
+from app.services.scoreboard import RoundAggregator, GESTURES, game_outcome, normalize_gesture
+from app.services.xrp import xrpl_gateway
+from app.services.wallet_pool import WalletPool
+from app.services.balances import BalanceCache
+from fastapi.responses import JSONResponse, Response
+from app.services.ai import synthesize_google, synthesize_x3
+from app.services.tts_cache import TTSCache, ClosingStreamingResponse, audio_response
+from app.services.tts_offline import offline_tts
+from app.services.tts_stream import stream_chunks
+from app.services.inference import emotion_service, InferenceQueueFull
+from app.services.fer_cache import fer_cache
+from app.services.images import image_store, image_message, image_response, ImageTooLarge
+from app.services.jobs import ScoringFailed, ScoringJob, ScoringJobs, SCORING_MODE
+from app.services.admission import (admission, AdmissionRejected, DeadlineExceeded,
+                                    PRIORITY_ROUND, PRIORITY_SCORING, PRIORITY_TTS)
 from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel
 
@@ -16,68 +30,225 @@ logger = logging.getLogger(__name__)
 logger_init()
 
 router = APIRouter()
-global last_result# 0: pierre, 1: feuille, 2: ciseaux
+round_scheduler = RoundScheduler(manager)
+scoreboard = RoundAggregator(manager)
+round_scheduler.on_finished.append(scoreboard.round_finished)
+manager.on_connect.append(round_scheduler.state_message)
+balance_cache = BalanceCache(xrpl_gateway, manager)
+wallet_pool = WalletPool(xrpl_gateway)
+tts_cache = TTSCache()
 
-# Route POST /api/broadcast
-# Cette route est appelée par l'interface master pour démarrer un compte à rebours
+MAX_BULK_BALANCES = 1000
+MAX_CLIENTS_PAGE = 1000
+
+# Route POST /api/broadcast_countdown
+# Cette route est appelée par l'interface master pour démarrer une manche
 # Paramètres:
 #   - countdown: Objet Countdown contenant la durée en secondes (duration)
-# Retourne:
-#   - Un message de confirmation que le compte à rebours a démarré
+# Retourne immédiatement l'identifiant de la manche; le compte à rebours est
+# ensuite diffusé par le RoundScheduler (round_start, que les clients décomptent localement,
+# puis countdown de resynchronisation toutes les COUNTDOWN_RESYNC_INTERVAL secondes)
 # Exemple d'appel:
-#   POST /api/broadcast
+#   POST /api/broadcast_countdown
 #   Body: {"duration": 10}
 @router.post("/broadcast_countdown")
 async def broadcast_message(countdown: Countdown):
     """Lance un compte à rebours pour tous les clients."""
-    for i in range(countdown.duration, -1, -1):
-        message = json.dumps({"type": "countdown", "value": i})
-        await manager.broadcast_countdown(message)
-        await asyncio.sleep(1)
-    return {"message": "Countdown started"}
+    try:
+        current = await round_scheduler.start(countdown.duration)
+    except RoundError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"message": "Countdown started", "round_id": current.round_id, "ends_at": current.ends_at}
+
+@router.get("/rounds/current")
+async def get_current_round():
+    if round_scheduler.current is None:
+        raise HTTPException(status_code=404, detail="Aucune manche")
+    return round_scheduler.current.to_dict(round_scheduler.now())
+
+@router.post("/rounds/{round_id}/{action}")
+async def control_round(round_id: str, action: str):
+    """Met en pause, reprend ou annule une manche (action: pause, resume, cancel)."""
+    handlers = {
+        "pause": round_scheduler.pause,
+        "resume": round_scheduler.resume,
+        "cancel": round_scheduler.cancel,
+    }
+    if action not in handlers:
+        raise HTTPException(status_code=404, detail="Action inconnue")
+    try:
+        current = await handlers[action](round_id)
+    except RoundNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RoundError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return current.to_dict(round_scheduler.now())
 
 class GameResultRequest(BaseModel):
     game_result: str
 
 @router.post("/broadcast_game_result")
 async def broadcast_game_result(req: GameResultRequest):
-    message = json.dumps({"type": "game_result", "value": req.game_result})
+    message = encode({"type": "game_result", "value": req.game_result})
+    if round_scheduler.current is not None:
+        # Le geste du master départage les joueurs de la manche
+        await scoreboard.set_master_gesture(round_scheduler.current.round_id, req.game_result)
     await manager.broadcast_game_result(message)
     return {"message": "Game result broadcasted"}
 
 
 # Route GET /api/clients
-# Retourne la liste de tous les clients enregistrés et leur état de connexion
-# Cette route est utilisée par l'interface master pour afficher l'état des clients
-# Retourne:
-#   - Un objet ClientList contenant un tableau de clients
+# Retourne une page des clients enregistrés, sérialisée directement depuis le registre
+# Paramètres (query):
+#   - offset, limit: pagination (limit <= MAX_CLIENTS_PAGE)
+#   - connected: filtre sur l'état de connexion
+#   - username, round_id: filtre sur le nom ou la dernière manche jouée
+# L'ETag suit la version du registre: un If-None-Match identique renvoie 304
 # Exemple de réponse:
 #   {
 #     "clients": [
-#       {"client_id": "a1b2c3d4", "is_connected": true},
-#       {"client_id": "e5f6g7h8", "is_connected": false}
-#     ]
+#       {"wallet_address": "rXXX", "username": "bob", "is_connected": true, ...}
+#     ],
+#     "total": 1, "offset": 0, "limit": 100, "version": 42
 #   }
 @router.get("/clients", response_model=ClientList)
-async def get_clients():
-    """Récupère la liste des clients."""
-    clients = [
-        Client(wallet_address=wallet_address, is_connected=wallet_address in manager.active_connections)
-        for wallet_address in manager.registered_clients
-    ]
-    return ClientList(clients=clients) 
+async def get_clients(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_CLIENTS_PAGE),
+    connected: Optional[bool] = None,
+    username: Optional[str] = None,
+    round_id: Optional[str] = None,
+):
+    """Récupère une page de la liste des clients."""
+    players = manager.players
+    # Les versions sont propres à chaque worker
+    etag = f'"{state_backend.worker_id}-{players.version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    total, page = players.page(offset, limit, connected=connected, username=username, round_id=round_id)
+    body = encode({
+        "clients": [player.to_dict() for player in page],
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "version": players.version,
+    })
+    return Response(body, media_type="application/json", headers=headers)
+
+def _too_busy(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def _client_key(request: Request) -> str:
+    """Clé du contrôle d'admission pour les routes sans wallet: l'adresse du client."""
+    return request.client.host if request.client is not None else None
+
+def _tts_admission(request: Request):
+    """Prise de place (priorité TTS) appelée par le cache seulement si l'audio doit être synthétisé."""
+    async def admit():
+        ticket = await admission.acquire(PRIORITY_TTS, _client_key(request))
+        return lambda: admission.release(ticket)
+    return admit
+
+def _round_deadline(round_id: Optional[str]) -> Optional[float]:
+    """
+    Échéance (horloge de la boucle) d'un résultat de manche: fin du compte à rebours plus le
+    délai de grâce du classement final. 0 si la manche est annulée ou remplacée, None sans manche.
+    """
+    if round_id is None:
+        return None
+    current = round_scheduler.current
+    if current is None or current.round_id != round_id or current.state == "cancelled":
+        return 0.0
+    if current.state == "paused" or current.deadline is None:
+        return None
+    return current.deadline + scoreboard.grace
+
+async def _score(data: bytes, priority: int, client_key: str = None, deadline: float = None) -> dict:
+    """Analyse émotionnelle: résultat en cache pour une image identique ou quasi identique, sinon le modèle."""
+    emotion_result, digest = fer_cache.exact(data)
+    if emotion_result is not None:
+        return emotion_result
+    async with admission.admit(priority, client_key, deadline):
+        # Le décodage de l'empreinte perceptuelle occupe la place admise (aucun en mode remote)
+        emotion_result, cache_key = await fer_cache.nearest(data, digest)
+        if emotion_result is None:
+            emotion_result = await emotion_service.score(data)
+    fer_cache.store(cache_key, emotion_result)
+    return emotion_result
+
+async def _score_game_result(job: ScoringJob, data: bytes) -> dict:
+    """Analyse émotionnelle d'un résultat puis transmission aux masters (classement de la manche ou message direct)."""
+    # Résultats de manche prioritaires; abandonnés si la manche est terminée avant leur tour
+    priority = PRIORITY_ROUND if job.round_id is not None else PRIORITY_SCORING
+    emotion_result = await _score(data, priority, job.wallet_address, _round_deadline(job.round_id))
+    logger.debug(f"Analyse émotionnelle pour {job.username}: {emotion_result}")
+    error = emotion_result.get("error")
+    if error is not None:
+        # Le geste compte quand même, sans score émotionnel (score 0 dans la réponse, comme avant)
+        outcome = None
+        if job.round_id is not None:
+            outcome = scoreboard.record(job.round_id, job.wallet_address, username=job.username,
+                                        gesture=job.gesture, image_id=job.image_id).outcome
+        else:
+            await manager.broadcast_masters(encode({
+                "type": "game_result",
+                "wallet": job.wallet_address,
+                "username": job.username,
+                "gesture": job.gesture,
+                "emotions": {},
+                "emotion_score": 0,
+                "error": error,
+                "timestamp": datetime.now().isoformat(),
+                **image_message(job.image_id)
+            }))
+        return {"emotions": {}, "emotion_score": 0, "outcome": outcome, "error": error}
+    emotions, emotion_score = emotion_result.get("emotions", {}), emotion_result.get("score", 0)
+
+    outcome = None
+    if job.round_id is not None:
+        # Les masters reçoivent le classement de la manche par mises à jour groupées
+        result = scoreboard.record(job.round_id, job.wallet_address, username=job.username, gesture=job.gesture,
+                                   emotion_score=emotion_score, image_id=job.image_id)
+        outcome = result.outcome
+    else:
+        # Hors manche: notifier directement les masters
+        await manager.broadcast_masters(encode({
+            "type": "game_result",
+            "wallet": job.wallet_address,
+            "username": job.username,
+            "gesture": job.gesture,
+            "emotions": emotions,
+            "emotion_score": emotion_score,
+            "timestamp": datetime.now().isoformat(),
+            **image_message(job.image_id)
+        }))
+    return {"emotions": emotions, "emotion_score": emotion_score, "outcome": outcome}
+
+async def _score_game_job(job: ScoringJob, data: bytes) -> dict:
+    """Tâche asynchrone: une analyse en erreur (aucun visage...) fait échouer la tâche."""
+    result = await _score_game_result(job, data)
+    if result.get("error") is not None:
+        raise ScoringFailed(result["error"])
+    return result
+
+scoring_jobs = ScoringJobs(manager, _score_game_job)
 
 @router.post("/game-result")
 async def submit_game_result(
     wallet_address: str = Form(...),
     gesture: str = Form(...),
-    image: UploadFile = File(...)
+    image: UploadFile = File(...),
+    mode: Optional[str] = Query(None, pattern="^(sync|async)$")
 ):
     """
     Reçoit le résultat d'une partie de pierre-feuille-ciseaux
     - wallet_address: l'adresse du wallet du joueur
     - gesture: le geste détecté (pierre, feuille, ciseaux)
     - image: capture d'écran du moment du geste
+    - mode: "sync" (réponse après l'analyse émotionnelle) ou "async" (HTTP 202 avec l'identifiant
+      de la tâche, résultat poussé sur /ws/{wallet_address}); SCORING_MODE par défaut
     """
     try:
         # Vérifier que le client est enregistré
@@ -85,54 +256,108 @@ async def submit_game_result(
             raise HTTPException(status_code=404, detail="Client non trouvé")
 
         # Récupérer le username du client
-        username = manager.registered_clients[wallet_address]["username"]
-        logger.info(f"Résultat reçu de {username} ({wallet_address})")
-
-        # Analyse émotionnelle de l'image
-        emotion_result = fer_score(image)
-        logger.info(f"Analyse émotionnelle pour {username}: {emotion_result}")
-        
-        # Réinitialiser le pointeur du fichier pour la lecture suivante
-        await image.seek(0)
-        image_content = await image.read()
-        
+        username = manager.players.get(wallet_address).username
+        logger.debug(f"Résultat reçu de {username} ({wallet_address})")
+
+        # Participation à la manche en cours (index par manche du registre)
+        round_id = round_scheduler.current.round_id if round_scheduler.current is not None else None
+        asynchronous = (mode or SCORING_MODE) == "async"
+
+        job = None
+        if asynchronous:
+            # Envoi répété pour la même manche: pas de seconde analyse
+            job = scoring_jobs.find(wallet_address, round_id)
+            if job is not None:
+                return JSONResponse(status_code=202, content={"duplicate": True, **job.to_dict()})
+            # Refus immédiat (429) plutôt qu'une tâche vouée à être délestée
+            admission.check(PRIORITY_ROUND if round_id is not None else PRIORITY_SCORING, wallet_address)
+            # Réservée avant la lecture de l'image: un envoi simultané trouve cette tâche
+            job = scoring_jobs.reserve(wallet_address, username, gesture, round_id)
+
+        if round_id is not None:
+            manager.update_client(wallet_address, round_id=round_id)
+
+        # Image lue une seule fois, dans le tampon conservé pour les masters et analysé
+        try:
+            data = await image_store.read_upload(image)
+            image_id = image_store.put(data, image.content_type or "image/jpeg", wallet_address, round_id)
+        except BaseException:
+            if job is not None:
+                scoring_jobs.cancel(job)
+            raise
+
         # Log du résultat
         logger.info(f"Résultat du client {username} ({wallet_address}): {gesture}")
 
-        # Notifier les masters via WebSocket
-        message = json.dumps({
-            "type": "game_result",
-            "wallet": wallet_address,
-            "username": username,
-            "gesture": gesture,
-            "emotions": emotion_result.get("emotions", {}),
-            "emotion_score": emotion_result.get("score", 0),
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        for master in manager.master_connections:
-            try:
-                await master.send_text(message)
-            except Exception as e:
-                logger.error(f"Erreur d'envoi au master: {e}")
+        if asynchronous:
+            if round_id is not None:
+                # Le geste compte tout de suite dans le classement, le score émotionnel suivra
+                scoreboard.record(round_id, wallet_address, username=username, gesture=gesture, image_id=image_id)
+            scoring_jobs.start(job, data, image_id)
+            return JSONResponse(status_code=202, content={
+                "duplicate": False,
+                "status_url": f"/api/jobs/{job.job_id}",
+                "image_size": len(data),
+                **job.to_dict()
+            })
 
+        result = await _score_game_result(ScoringJob(wallet_address, username, gesture, round_id, image_id), data)
         return {
             "status": "success",
             "wallet_address": wallet_address,
             "username": username,
             "gesture": gesture,
-            "emotions": emotion_result.get("emotions", {}),
-            "emotion_score": emotion_result.get("score", 0),
-            "image_size": len(image_content)
+            "emotions": result["emotions"],
+            "emotion_score": result["emotion_score"],
+            "image_size": len(data),
+            "image_id": image_id,
+            "round_id": round_id,
+            "outcome": result["outcome"]
         }
+    except HTTPException:
+        raise
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+    except DeadlineExceeded:
+        raise HTTPException(status_code=408, detail="Manche terminée, résultat non analysé")
+    except InferenceQueueFull as e:
+        logger.warning(f"File d'inférence pleine: {e}")
+        raise HTTPException(status_code=503, detail="Analyse émotionnelle saturée, réessayez")
     except Exception as e:
         logger.error(f"Erreur lors du traitement du résultat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Route GET /api/jobs/{job_id}
+# Statut d'une analyse soumise en mode asynchrone (secours si le WebSocket du joueur est fermé)
+@router.get("/jobs/{job_id}")
+async def get_scoring_job(job_id: str):
+    job = scoring_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Tâche inconnue ou expirée")
+    return job.to_dict()
+
+@router.get("/jobs")
+async def get_scoring_jobs_stats():
+    return scoring_jobs.stats()
+
+# Route GET /api/fer_cache
+# Cache des analyses émotionnelles (entrées, succès exacts et approchés, absences)
+@router.get("/fer_cache")
+async def get_fer_cache_stats():
+    return fer_cache.stats()
+
+# Route GET /api/admission
+# État du contrôle d'admission (traitements en cours, en attente, Retry-After courant)
+@router.get("/admission")
+async def get_admission_stats():
+    return admission.stats()
+
 # Création utilisateur
 @router.get("/create_user/{username}", response_class=JSONResponse)
-def create_user(username: str):
-    wallet = create_wallet()
+async def create_user(username: str):
+    wallet = await wallet_pool.acquire()
     # Enregistre le client dans le manager
     manager.register_client(username, wallet)
     return {
@@ -143,68 +368,214 @@ def create_user(username: str):
         "is_connected": False
     }
 
+# Route GET /api/wallet_pool
+# État de la réserve de wallets pré-approvisionnés (profondeur, latence de remplissage)
+@router.get("/wallet_pool", response_class=JSONResponse)
+async def get_wallet_pool():
+    return wallet_pool.stats()
+
 # Route GET /api/get_username/{wallet_address}
 @router.get("/get_username/{wallet_address}", response_class=JSONResponse)
 def get_username(wallet_address: str):
-    client = manager.registered_clients.get(wallet_address)
-    if client:
-        logger.info(f"Username de {wallet_address}: {client['username']}")
-        return {"username": client["username"]}
+    player = manager.players.get(wallet_address)
+    if player:
+        logger.debug(f"Username de {wallet_address}: {player.username}")
+        return {"username": player.username}
     raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
 
 @router.get("/get_balance/{wallet_address}", response_class=JSONResponse)
-def get_balance(wallet_address: str):
-    balance = get_xrp_balance(wallet_address)
+async def get_balance(wallet_address: str):
+    balance = await balance_cache.get(wallet_address)
     if balance:
-        logger.info(f"Balance de {wallet_address}: {balance}")
+        logger.debug(f"Balance de {wallet_address}: {balance}")
         return {"xrp_balance": balance}
     raise HTTPException(status_code=404, detail="Balance non trouvée")
 
+# Route POST /api/balances
+# Retourne les soldes de plusieurs wallets en une seule requête
+# Exemple d'appel:
+#   POST /api/balances
+#   Body: {"wallets": ["rXXX...", "rYYY..."]}
+# Exemple de réponse:
+#   {"balances": {"rXXX...": 100.0, "rYYY...": null}}
+@router.post("/balances", response_class=JSONResponse)
+async def get_balances(req: BalancesRequest):
+    if len(req.wallets) > MAX_BULK_BALANCES:
+        raise HTTPException(status_code=400, detail=f"Au plus {MAX_BULK_BALANCES} wallets par requête")
+    balances = await balance_cache.get_many(req.wallets)
+    return {"balances": {w: float(b) if b is not None else None for w, b in balances.items()}}
+
 @router.post("/fer_score/")
-async def fer_score_endpoint(file: UploadFile = File(...)):
-    return fer_score(file)
+async def fer_score_endpoint(request: Request, file: UploadFile = File(...)):
+    try:
+        # Taille vérifiée avant la lecture, lue en une passe
+        return await _score(await image_store.read_upload(file), PRIORITY_SCORING, _client_key(request))
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+    except InferenceQueueFull:
+        raise HTTPException(status_code=503, detail="Analyse émotionnelle saturée, réessayez")
 
 @router.post("/tts_google/")
-def tts_google_endpoint(data: dict = Body(...)):
+async def tts_google_endpoint(request: Request, data: dict = Body(...)):
     text = data.get("text")
     lang = data.get("lang", "fr")
+    voice = data.get("voice") or "com"
     if not text:
         return {"error": "Missing 'text'"}
-    logger.info(f"TTS Google: {text} - {lang}")
-    return tts_google(text=text, lang=lang)
+    # Synthèse soumise au contrôle d'admission (priorité la plus basse), pas la lecture du cache
+    try:
+        key, audio = await tts_cache.get_or_synthesize("google", lang, voice, text, synthesize_google,
+                                                       admit=_tts_admission(request))
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+    return audio_response(request, key, audio)
 
 @router.post("/tts_x3/")
-def tts_x3_endpoint(data: dict = Body(...)):
+async def tts_x3_endpoint(request: Request, data: dict = Body(...)):
+    text = data.get("text")
+    lang = data.get("lang", "fr")
+    voice = data.get("voice")
+    if not text:
+        return {"error": "Missing 'text'"}
+    # Absent du cache: l'audio est envoyé au fil de l'encodage, puis mis en cache
+    try:
+        key, audio, stream = await tts_cache.stream("x3", lang, voice, text, offline_tts.stream_mp3,
+                                                    admit=_tts_admission(request))
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+    if audio is not None:
+        return audio_response(request, key, audio)
+    return ClosingStreamingResponse(stream, on_close=stream.close, media_type="audio/mpeg",
+                                    headers={"X-TTS-Key": key})
+
+# Route POST /api/tts_stream/
+# Synthèse découpée en phrases, envoyée au fil de l'eau: le premier son arrive dès que
+# la première phrase est synthétisée, sans attendre la fin du texte
+# Exemple d'appel:
+#   POST /api/tts_stream/
+#   Body: {"text": "Bravo Pierre! Tu gagnes la manche.", "lang": "fr", "engine": "google"}
+@router.post("/tts_stream/")
+async def tts_stream_endpoint(request: Request, data: dict = Body(...)):
     text = data.get("text")
     lang = data.get("lang", "fr")
+    engine = data.get("engine", "google")
     if not text:
         return {"error": "Missing 'text'"}
-    logger.info(f"TTS X3: {text} - {lang}")
-    return tts_x3(text=text, lang=lang)
+    if engine == "google":
+        voice, synthesize = data.get("voice") or "com", synthesize_google
+    elif engine == "x3":
+        voice, synthesize = data.get("voice"), synthesize_x3
+    else:
+        raise HTTPException(status_code=400, detail="Moteur inconnu (google ou x3)")
+    try:
+        ticket = await admission.acquire(PRIORITY_TTS, _client_key(request))
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+    # La place est rendue à la fin de l'envoi, y compris si le client part avant le premier morceau
+    return ClosingStreamingResponse(stream_chunks(tts_cache, engine, lang, voice, text, synthesize),
+                                    on_close=lambda: admission.release(ticket), media_type="audio/mpeg")
+
+# Route GET /api/tts/{key}
+# Relit un audio déjà synthétisé par sa clé (en-tête X-TTS-Key des routes TTS),
+# ce qui permet la mise en cache navigateur et la lecture par plages (Range)
+@router.get("/tts/{key}")
+async def tts_cached_endpoint(key: str, request: Request):
+    audio = await tts_cache.lookup(key)
+    if audio is None:
+        raise HTTPException(status_code=404, detail="Audio non trouvé")
+    return audio_response(request, key, audio)
+
+# Route GET /api/images/{image_id}
+# Image envoyée par un joueur (annoncée aux masters par son identifiant)
+@router.get("/images/{image_id}")
+async def get_image(image_id: str, request: Request):
+    image = image_store.get(image_id)
+    data = image_store.original(image_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Image non trouvée")
+    return image_response(request, image_id, data, image.content_type)
+
+# Route GET /api/images/{image_id}/thumbnail
+@router.get("/images/{image_id}/thumbnail")
+async def get_image_thumbnail(image_id: str, request: Request):
+    try:
+        thumbnail = await image_store.thumbnail(image_id)
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    if thumbnail is None:
+        raise HTTPException(status_code=404, detail="Image non trouvée")
+    return image_response(request, f"{image_id}-thumbnail", thumbnail, "image/jpeg")
+
+# Route GET /api/rounds/{round_id}/images
+# Images reçues pendant une manche (identifiants et URLs)
+@router.get("/rounds/{round_id}/images")
+async def get_round_images(round_id: str):
+    return {"round_id": round_id, "images": [image.to_dict() for image in image_store.for_round(round_id)]}
+
+# Route GET /api/images
+# État du stockage d'images (taille, évictions)
+@router.get("/images")
+async def get_image_store_stats():
+    return image_store.stats()
+
+def _current_round_id() -> str:
+    if round_scheduler.current is None:
+        raise HTTPException(status_code=404, detail="Aucune manche")
+    return round_scheduler.current.round_id
 
 @router.post("/save-last-result")
 async def save_last_result(result: int = Body(...)):
     """
-    Sauvegarde le dernier résultat du master (0: pierre, 1: feuille, 2: ciseaux)
+    Enregistre le geste du master pour la manche en cours (0: pierre, 1: feuille, 2: ciseaux).
+    L'issue de chaque joueur de la manche est recalculée côté serveur.
     """
     if result not in [0, 1, 2]:
         raise HTTPException(status_code=400, detail="Le geste doit être 0 (pierre), 1 (feuille) ou 2 (ciseaux)")
-    last_result = result
-    logger.info(f"Dernier résultat du master: {last_result}")
-    return {"status": "success", "last_result": last_result}
+    round_id = _current_round_id()
+    await scoreboard.set_master_gesture(round_id, result)
+    logger.info(f"Geste du master pour la manche {round_id}: {result}")
+    return {"status": "success", "last_result": result, "round_id": round_id}
 
 @router.get("/last-result")
-async def get_last_result():
-    return {"last_result": last_result}
+async def get_last_result(round_id: Optional[str] = None):
+    round_id = round_id or _current_round_id()
+    results = scoreboard.get(round_id)
+    gesture = results.master_gesture if results is not None else None
+    return {"last_result": GESTURES.index(gesture) if gesture in GESTURES else None, "round_id": round_id}
 
 @router.post("/has-won")
-async def hasWon(result: int = Body(...)):
+async def hasWon(result: int = Body(...), round_id: Optional[str] = Query(None)):
     """
-    Retourne True si le résultat reçu est égal à last_result, sinon False
+    Issue du geste result (0: pierre, 1: feuille, 2: ciseaux) contre le geste du master de la manche
+    (manche en cours par défaut), avec la même règle que le classement.
     """
-    if last_result is None:
+    round_id = round_id or _current_round_id()
+    results = scoreboard.get(round_id)
+    if results is None or results.master_gesture is None:
         raise HTTPException(status_code=400, detail="Aucun résultat master enregistré")
-    return {"hasWon": result == last_result}
+    outcome = game_outcome(normalize_gesture(result), results.master_gesture)
+    return {"hasWon": outcome == "gagné", "outcome": outcome, "round_id": round_id}
+
+# Route GET /api/rounds/{round_id}/results
+# Classement de la manche (limit: nombre d'entrées, toutes par défaut)
+@router.get("/rounds/{round_id}/results")
+async def get_round_results(round_id: str, limit: Optional[int] = Query(None, ge=1)):
+    results = scoreboard.get(round_id)
+    if results is None:
+        raise HTTPException(status_code=404, detail="Aucun résultat pour cette manche")
+    return {**results.summary(), "completed": results.completed, "leaderboard": results.leaderboard(limit)}
+
+# Route GET /api/rounds/{round_id}/results/{wallet_address}
+# Résultat d'un joueur: geste, score émotionnel, issue et rang
+@router.get("/rounds/{round_id}/results/{wallet_address}")
+async def get_player_result(round_id: str, wallet_address: str):
+    results = scoreboard.get(round_id)
+    result = results.results.get(wallet_address) if results is not None else None
+    if result is None:
+        raise HTTPException(status_code=404, detail="Aucun résultat pour ce joueur")
+    return {**result.to_dict(), "rank": results.rank(wallet_address), "round_id": round_id}
 
 @router.post("/countdown-response")
 async def submit_countdown_response(wallet_address: str = Form(...), value: int = Form(...), image: UploadFile = File(...)):
@@ -219,32 +590,36 @@ async def submit_countdown_response(wallet_address: str = Form(...), value: int
         if not manager.is_client_registered(wallet_address):
             raise HTTPException(status_code=404, detail="Client non trouvé")
 
-        # Lire l'image
-        image_content = await image.read()
-        
         # Log de la réponse
-        logger.info(f"Réponse du client {wallet_address}: {value}")
+        logger.debug(f"Réponse du client {wallet_address}: {value}")
 
-        # Notifier les masters via WebSocket
-        message = json.dumps({
-            "type": "countdown_response",
-            "wallet": wallet_address,
-            "value": value,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        for master in manager.master_connections:
-            try:
-                await master.send_text(message)
-            except Exception as e:
-                logger.error(f"Erreur d'envoi au master: {e}")
+        round_id = round_scheduler.current.round_id if round_scheduler.current is not None else None
+        data = await image_store.read_upload(image)
+        image_id = image_store.put(data, image.content_type or "image/jpeg", wallet_address, round_id)
+
+        if round_id is not None:
+            scoreboard.record(round_id, wallet_address, countdown_value=value, image_id=image_id)
+        else:
+            # Hors manche: notifier directement les masters
+            await manager.broadcast_masters(encode({
+                "type": "countdown_response",
+                "wallet": wallet_address,
+                "value": value,
+                "timestamp": datetime.now().isoformat(),
+                **image_message(image_id)
+            }))
 
         return {
             "status": "success",
             "wallet_address": wallet_address,
             "value": value,
-            "image_size": len(image_content)
+            "image_size": len(data),
+            "image_id": image_id
         }
+    except HTTPException:
+        raise
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Erreur lors du traitement de la réponse: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.routes.websocket import manager
+from app.routes import api
+from app.services.inference import emotion_service
+from app.services.admission import admission
+from app.services.fer_cache import fer_cache
+from app.services.metrics import Gauge, CounterFunction, render
+
+router = APIRouter()
+
+# Valeurs lues à la demande sur les objets existants, au moment de la collecte
+Gauge("ws_active_connections", "Clients connectés en WebSocket", function=lambda: len(manager.active_connections))
+Gauge("ws_master_connections", "Masters connectés en WebSocket", function=lambda: len(manager.master_connections))
+Gauge("registered_clients", "Clients enregistrés", function=lambda: len(manager.players))
+Gauge("connected_clients", "Clients connectés (tous workers)", function=lambda: manager.players.connected_count)
+Gauge("fer_queue_depth", "Analyses émotionnelles en cours ou en attente", function=lambda: emotion_service.pending)
+Gauge("wallet_pool_depth", "Wallets disponibles dans la réserve", function=lambda: api.wallet_pool.depth)
+Gauge("tts_cache_bytes", "Taille du cache TTS en mémoire", function=lambda: api.tts_cache.size)
+CounterFunction("tts_cache_hits_total", "Audios TTS servis depuis le cache", lambda: api.tts_cache.hits)
+CounterFunction("tts_cache_misses_total", "Audios TTS synthétisés", lambda: api.tts_cache.misses)
+CounterFunction("tts_cache_coalesced_total", "Demandes TTS jointes à une synthèse en cours",
+                lambda: api.tts_cache.coalesced)
+Gauge("fer_cache_entries", "Analyses émotionnelles en cache", function=lambda: len(fer_cache))
+CounterFunction("fer_cache_hits_total", "Analyses servies depuis le cache (image identique)", lambda: fer_cache.hits)
+CounterFunction("fer_cache_near_hits_total", "Analyses servies depuis le cache (image proche)", lambda: fer_cache.near_hits)
+CounterFunction("fer_cache_misses_total", "Analyses absentes du cache", lambda: fer_cache.misses)
+Gauge("admission_active", "Traitements lourds admis en cours", function=lambda: admission.active)
+Gauge("admission_queued", "Traitements lourds en attente d'admission", function=lambda: admission.queued)
+
+
+# Route GET /metrics
+# Expose les métriques au format texte Prometheus
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
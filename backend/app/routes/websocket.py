@@ -1,5 +1,8 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from app.services.connections import ConnectionManager
+from app.services.images import image_store, image_message, ImageTooLarge
+from app.services.messages import encode, decode_frame, FRAME_GAME_RESULT
+import base64
 import logging
 import json
 
@@ -14,14 +17,21 @@ async def websocket_manager_endpoint(websocket: WebSocket):
     """
     Endpoint WebSocket pour les connexions manager.
     - Permet à l'interface manager de recevoir en temps réel la liste des clients connectés/déconnectés.
-    - Chaque fois qu'un client se connecte ou se déconnecte, la liste est envoyée à tous les managers connectés.
+    - À la connexion, le master reçoit la liste complète (clients_update), puis uniquement les
+      changements (clients_delta) numérotés par seq.
+    - Le master peut envoyer {"type": "resync"} pour recevoir à nouveau la liste complète.
     - Peut être étendu pour recevoir des commandes du manager (ex: démarrer un jeu, envoyer un message à tous, etc.).
     """
     await manager.connect_master(websocket)
     try:
         while True:
-            # Pour l'instant, on attend simplement les messages du manager (non utilisé, mais extensible)
-            await websocket.receive_text()
+            data = await websocket.receive_text()
+            try:
+                command = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(command, dict) and command.get("type") == "resync":
+                await manager.send_client_list(websocket)
     except WebSocketDisconnect:
         # Si le master se déconnecte, on le retire de la liste
         manager.disconnect_master(websocket)
@@ -34,41 +44,51 @@ async def websocket_endpoint(websocket: WebSocket, wallet_address: str):
     - Permet à chaque client de recevoir les messages du serveur (ex: début du compte à rebours, notifications).
     - Le client doit fournir son wallet_address pour s'authentifier.
     - Si l'adresse n'est pas reconnue, la connexion est refusée.
-    - Reçoit les résultats du jeu (geste, image) à la fin du compte à rebours.
+    - Reçoit les résultats du jeu (geste, image) à la fin du compte à rebours:
+      - de préférence en trame binaire FRAME_GAME_RESULT: en-tête {"gesture": ...} puis le JPEG brut;
+      - ou en JSON {"type": "game_result", "gesture": ..., "image": <base64>} (ancien format).
+      L'image est stockée une seule fois; les masters reçoivent son identifiant et ses URLs.
     """
-    logger.info(f"Tentative de connexion WebSocket pour le wallet: {wallet_address}")
-    
-    # Vérifier si le client est enregistré
-    is_registered = manager.is_client_registered(wallet_address)
-    logger.info(f"Client {wallet_address} est enregistré: {is_registered}")
-    
+    logger.debug(f"Tentative de connexion WebSocket pour le wallet: {wallet_address}")
+
     connection_successful = await manager.connect(websocket, wallet_address)
     if not connection_successful:
         logger.warning(f"Connexion refusée pour le wallet: {wallet_address}")
         return
 
-    logger.info(f"Client {wallet_address} connecté avec succès")
+    logger.debug(f"Client {wallet_address} connecté avec succès")
 
     try:
         while True:
-            # Attendre les messages du client
-            data = await websocket.receive_text()
+            # Attendre les messages du client (texte ou binaire)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
             try:
-                game_data = json.loads(data)
-                if game_data["type"] == "game_result":
-                    # Log les données reçues
-                    logger.info(f"Résultat reçu du client {wallet_address}: {game_data['gesture']}")
-                    # Envoyer les résultats aux masters
-                    for master in manager.master_connections:
-                        await master.send_text(json.dumps({
-                            "type": "game_result",
-                            "wallet": wallet_address,
-                            "gesture": game_data["gesture"],
-                            "image": game_data["image"]
-                        }))
+                if message.get("bytes") is not None:
+                    frame_type, header, payload = decode_frame(message["bytes"])
+                    if frame_type == FRAME_GAME_RESULT:
+                        await relay_game_result(wallet_address, header.get("gesture"), payload)
+                elif message.get("text") is not None:
+                    game_data = json.loads(message["text"])
+                    if game_data["type"] == "game_result":
+                        image = base64.b64decode(game_data["image"].split(",")[-1]) if game_data.get("image") else None
+                        await relay_game_result(wallet_address, game_data["gesture"], image)
             except json.JSONDecodeError:
                 logger.error(f"Erreur de décodage JSON pour le client {wallet_address}")
+            except (ValueError, KeyError, ImageTooLarge) as e:
+                logger.warning(f"Message invalide du client {wallet_address}: {e}")
+                await manager.send_personal_message(encode({"type": "error", "detail": str(e)}), wallet_address)
     except WebSocketDisconnect:
         logger.info(f"Client {wallet_address} déconnecté")
-        manager.disconnect(wallet_address)
+        manager.disconnect(wallet_address, websocket)
         await manager.broadcast(f"Client #{wallet_address} left the chat")
+
+
+async def relay_game_result(wallet_address: str, gesture, image):
+    """Stocke l'image une fois et annonce le résultat aux masters avec une référence à l'image."""
+    logger.debug(f"Résultat reçu du client {wallet_address}: {gesture}")
+    result = {"type": "game_result", "wallet": wallet_address, "gesture": gesture}
+    if image:
+        result.update(image_message(image_store.put(image, wallet_address=wallet_address)))
+    await manager.broadcast_masters(encode(result))
@@ -0,0 +1,212 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+from contextlib import asynccontextmanager
+
+from app.services.metrics import ADMISSION_DECISIONS, ADMISSION_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Nombre de traitements lourds (analyse émotionnelle, synthèse vocale) exécutés en même temps
+ADMISSION_CONCURRENCY = int(os.environ.get("ADMISSION_CONCURRENCY", 8))
+# Traitements en cours ou en attente par client (wallet, ou adresse IP pour les routes anonymes)
+ADMISSION_PER_CLIENT = int(os.environ.get("ADMISSION_PER_CLIENT", 2))
+# Taille maximale de la file d'attente (résultats de manche)
+ADMISSION_QUEUE_DEPTH = int(os.environ.get("ADMISSION_QUEUE_DEPTH", 256))
+# Au-delà de cette longueur de file, les requêtes moins prioritaires sont refusées
+ADMISSION_LOW_QUEUE_DEPTH = int(os.environ.get("ADMISSION_LOW_QUEUE_DEPTH", 16))
+
+# Classes de priorité (la plus petite valeur passe en premier)
+PRIORITY_ROUND = 0  # résultats de la manche en cours
+PRIORITY_SCORING = 1  # analyses émotionnelles ponctuelles (/api/fer_score/, hors manche)
+PRIORITY_TTS = 2  # synthèse vocale
+PRIORITY_NAMES = ("round", "scoring", "tts")
+
+WAITING, RUNNING, DONE = "waiting", "running", "done"
+
+
+class AdmissionRejected(Exception):
+    """Levée quand une requête est refusée faute de capacité (HTTP 429)."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Levée quand l'échéance d'une requête (fin de sa manche) est passée avant son traitement."""
+
+
+class Ticket:
+    __slots__ = ("priority", "key", "deadline", "seq", "future", "state", "enqueued", "started")
+
+    def __init__(self, priority: int, key: str, deadline: float, seq: int, now: float):
+        self.priority = priority
+        self.key = key
+        self.deadline = deadline  # horloge monotone de la boucle, None = sans échéance
+        self.seq = seq
+        self.future: asyncio.Future = None
+        self.state = WAITING
+        self.enqueued = now
+        self.started: float = None
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """
+    Contrôle d'admission des traitements lourds.
+    - Limite globale (concurrency) et par client (per_client, en cours + en attente).
+    - File d'attente par priorité: les résultats de manche passent avant les analyses ponctuelles
+      et la synthèse vocale. Quand la file dépasse low_queue_depth, seuls les résultats de manche
+      sont encore acceptés; quand elle est pleine, un résultat de manche prend la place de la
+      requête moins prioritaire la plus récente.
+    - Refus immédiat (AdmissionRejected, avec un délai Retry-After estimé) plutôt qu'une attente
+      sans fin.
+    - Échéance: une requête dont l'échéance passe pendant l'attente est abandonnée
+      (DeadlineExceeded) au lieu d'être traitée.
+    """
+
+    def __init__(self, concurrency: int = ADMISSION_CONCURRENCY, per_client: int = ADMISSION_PER_CLIENT,
+                 queue_depth: int = ADMISSION_QUEUE_DEPTH, low_queue_depth: int = ADMISSION_LOW_QUEUE_DEPTH):
+        self.concurrency = concurrency
+        self.per_client = per_client
+        self.queue_depth = queue_depth
+        self.low_queue_depth = low_queue_depth
+        self.active = 0
+        self.queued = 0
+        self.service_time = 0.5  # moyenne glissante (secondes) d'un traitement, pour Retry-After
+        self._heap = []
+        self._clients = {}  # clé client -> requêtes en cours ou en attente
+        self._seq = itertools.count()
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil((self.queued + 1) * self.service_time / self.concurrency))
+
+    def _reject(self, priority: int, reason: str, message: str):
+        ADMISSION_DECISIONS.inc(priority=PRIORITY_NAMES[priority], decision=reason)
+        raise AdmissionRejected(message, self.retry_after())
+
+    def check(self, priority: int, key: str = None):
+        """Lève AdmissionRejected si une requête de cette priorité serait refusée maintenant."""
+        if key is not None and self._clients.get(key, 0) >= self.per_client:
+            self._reject(priority, "client_limit", "Trop de requêtes en cours pour ce client")
+        if self.active < self.concurrency and not self.queued:
+            return
+        limit = self.queue_depth if priority == PRIORITY_ROUND else self.low_queue_depth
+        if self.queued >= limit and (priority != PRIORITY_ROUND or self._victim(priority) is None):
+            self._reject(priority, "shed", "Serveur saturé, réessayez plus tard")
+
+    def _victim(self, priority: int) -> Ticket:
+        """Requête en attente moins prioritaire la plus récente (évincée au profit d'une plus prioritaire)."""
+        candidates = [t for t in self._heap if t.state == WAITING and t.priority > priority]
+        return max(candidates, key=lambda t: (t.priority, t.seq)) if candidates else None
+
+    async def acquire(self, priority: int, key: str = None, deadline: float = None) -> Ticket:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if deadline is not None and deadline <= now:
+            ADMISSION_DECISIONS.inc(priority=PRIORITY_NAMES[priority], decision="expired")
+            raise DeadlineExceeded("Échéance dépassée")
+        self.check(priority, key)
+        ticket = Ticket(priority, key, deadline, next(self._seq), now)
+        if key is not None:
+            self._clients[key] = self._clients.get(key, 0) + 1
+        if self.active < self.concurrency and not self.queued:
+            self._start(ticket, now)
+            return ticket
+
+        if self.queued >= self.queue_depth:
+            victim = self._victim(priority)
+            self._finish(victim)
+            ADMISSION_DECISIONS.inc(priority=PRIORITY_NAMES[victim.priority], decision="shed")
+            victim.future.set_exception(AdmissionRejected("Serveur saturé, réessayez plus tard", self.retry_after()))
+        ticket.future = loop.create_future()
+        heapq.heappush(self._heap, ticket)
+        self.queued += 1
+        try:
+            timeout = deadline - now if deadline is not None else None
+            await asyncio.wait_for(ticket.future, timeout)
+        except asyncio.TimeoutError:
+            self._abandon(ticket)
+            ADMISSION_DECISIONS.inc(priority=PRIORITY_NAMES[priority], decision="expired")
+            raise DeadlineExceeded("Échéance dépassée pendant l'attente")
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        return ticket
+
+    def _start(self, ticket: Ticket, now: float):
+        ticket.state = RUNNING
+        ticket.started = now
+        self.active += 1
+        ADMISSION_WAIT_SECONDS.observe(now - ticket.enqueued, priority=PRIORITY_NAMES[ticket.priority])
+        ADMISSION_DECISIONS.inc(priority=PRIORITY_NAMES[ticket.priority], decision="admitted")
+
+    def _finish(self, ticket: Ticket):
+        if ticket.state == WAITING:
+            self.queued -= 1
+        elif ticket.state == RUNNING:
+            self.active -= 1
+            duration = asyncio.get_running_loop().time() - ticket.started
+            self.service_time = 0.8 * self.service_time + 0.2 * duration
+        else:
+            return
+        ticket.state = DONE
+        if ticket.key is not None:
+            remaining = self._clients[ticket.key] - 1
+            if remaining:
+                self._clients[ticket.key] = remaining
+            else:
+                del self._clients[ticket.key]
+
+    def _abandon(self, ticket: Ticket):
+        self._finish(ticket)
+        self._wake()
+
+    def release(self, ticket: Ticket):
+        """Libère la place d'une requête; sans effet si elle l'est déjà (appels multiples permis)."""
+        if ticket.state == DONE:
+            return
+        self._finish(ticket)
+        self._wake()
+
+    def _wake(self):
+        now = asyncio.get_running_loop().time()
+        while self.active < self.concurrency and self._heap:
+            ticket = heapq.heappop(self._heap)
+            if ticket.state != WAITING:
+                continue  # abandonnée ou évincée
+            if ticket.deadline is not None and ticket.deadline <= now:
+                self._finish(ticket)
+                ADMISSION_DECISIONS.inc(priority=PRIORITY_NAMES[ticket.priority], decision="expired")
+                ticket.future.set_exception(DeadlineExceeded("Échéance dépassée pendant l'attente"))
+                continue
+            self.queued -= 1
+            self._start(ticket, now)
+            ticket.future.set_result(None)
+
+    @asynccontextmanager
+    async def admit(self, priority: int, key: str = None, deadline: float = None):
+        ticket = await self.acquire(priority, key, deadline)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "concurrency": self.concurrency,
+            "clients": len(self._clients),
+            "service_time": round(self.service_time, 3),
+            "retry_after": self.retry_after(),
+        }
+
+
+admission = AdmissionController()
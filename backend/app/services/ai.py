@@ -1,14 +1,11 @@
+# DeepFace (TensorFlow), OpenCV, PIL et gTTS sont importés à la première utilisation:
+# la passerelle démarre sans charger les modèles (voir INFERENCE_MODE dans inference.py)
 from fastapi import UploadFile
-from deepface import DeepFace
-from PIL import Image
 import numpy as np
 import io
-import uuid
 import os
-from fastapi.responses import FileResponse, StreamingResponse
-from gtts import gTTS
-import pyttsx3
-from pydub import AudioSegment
+import threading
+from app.services.tts_offline import offline_tts
 from app.utils.logger import logger_init
 import logging
 
@@ -16,80 +13,182 @@ logger = logging.getLogger(__name__)
 logger_init()
 
 
-def fer_score(file: UploadFile) -> dict:
+# Pondération de chaque émotion dans le score final
+EMOTION_WEIGHTS = {
+    "happy": 1.0,
+    "neutral": 0.5,
+    "surprise": 0.3,
+    "sad": -1.0,
+    "angry": -0.8,
+    "fear": -0.6,
+    "disgust": -0.7
+}
+
+
+def emotion_score(emotions: dict) -> float:
+    """Convertit une distribution d'émotions (en %) en score 0-100."""
+    raw_score = sum(emotions.get(emotion, 0) * EMOTION_WEIGHTS.get(emotion, 0) for emotion in emotions)
+    return float(np.clip(((raw_score + 100) / 200) * 100, 0, 100))  # Assure que c'est bien un float natif
+
+
+def fer_analyze(np_image: np.ndarray, detector_backend: str = "opencv") -> dict:
+    """Analyse émotionnelle d'une image déjà décodée."""
+    from deepface import DeepFace
+
+    result = DeepFace.analyze(np_image, actions=['emotion'], enforce_detection=True,
+                              detector_backend=detector_backend, silent=True)
+    emotions_raw = result[0]['emotion'] if isinstance(result, list) else result['emotion']
+
+    # Convertir tous les scores en float natif (pas numpy.float32)
+    emotions = {emotion: float(score) for emotion, score in emotions_raw.items()}
+
+    return {
+        "emotions": emotions,
+        "score": emotion_score(emotions)
+    }
+
+
+# Limite de pixels acceptée pour une image uploadée
+MAX_IMAGE_PIXELS = int(os.environ.get("FER_MAX_PIXELS", 24_000_000))
+# Petit côté visé au décodage: au-delà, l'image est réduite par 2, 4 ou 8 pendant le décodage JPEG
+DECODE_MIN_SIDE = int(os.environ.get("FER_DECODE_MIN_SIDE", 480))
+
+_REDUCED_FLAGS = {
+    1: "IMREAD_COLOR",
+    2: "IMREAD_REDUCED_COLOR_2",
+    4: "IMREAD_REDUCED_COLOR_4",
+    8: "IMREAD_REDUCED_COLOR_8",
+}
+
+# Un tampon de lecture réutilisable par thread du pool d'inférence
+_read_buffers = threading.local()
+
+
+def upload_size(file: UploadFile) -> int:
+    """Taille de l'upload sans relire son contenu."""
+    if file.size is not None:
+        return file.size
+    position = file.file.tell()
+    size = file.file.seek(0, os.SEEK_END)
+    file.file.seek(position)
+    return size
+
+
+def read_upload(file: UploadFile) -> memoryview:
+    """Lit l'upload en une passe dans le tampon du thread courant."""
+    size = upload_size(file)
+    buffer = getattr(_read_buffers, "buffer", None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(max(size, 1 << 20))
+        _read_buffers.buffer = buffer
+    view = memoryview(buffer)[:size]
+    file.file.seek(0)
+    read = file.file.readinto(view)
+    return view[:read]
+
+
+def image_dimensions(data) -> tuple:
+    """Lit (largeur, hauteur) dans l'en-tête PNG ou JPEG, sans décoder l'image."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker == 0xFF:
+                i += 1
+            elif marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+                i += 2
+            elif 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height = int.from_bytes(data[i + 5:i + 7], "big")
+                width = int.from_bytes(data[i + 7:i + 9], "big")
+                return width, height
+            else:
+                i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as pil_image:
+        return pil_image.size
+
+
+def decode_bytes(data) -> np.ndarray:
+    """
+    Décode une image (BGR, comme attendu par DeepFace) directement depuis le tampon.
+    - Refuse les images de plus de MAX_IMAGE_PIXELS.
+    - Réduit les grandes images pendant le décodage plutôt qu'après.
+    """
+    import cv2
+
+    width, height = image_dimensions(data)
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"Image trop grande: {width}x{height}")
+    reduction = 1
+    while reduction < 8 and min(width, height) // (reduction * 2) >= DECODE_MIN_SIDE:
+        reduction *= 2
+    np_image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), getattr(cv2, _REDUCED_FLAGS[reduction]))
+    if np_image is None:
+        raise ValueError("Image illisible")
+    return np_image
+
+
+def decode_image(file: UploadFile) -> np.ndarray:
+    return decode_bytes(read_upload(file))
+
+
+def fer_face(np_image: np.ndarray, detector_backend: str = "opencv") -> np.ndarray:
+    """
+    Détecte le visage principal et le prépare pour le classifieur d'émotions.
+    Reproduit le prétraitement de DeepFace.analyze: visage recadré, mis à 224x224
+    avec bordures noires, passé en niveaux de gris puis réduit en 48x48.
+    """
+    from app.services.fer_backends import deepface_face, detect_face, native_detector
+
+    if native_detector(detector_backend):
+        return detect_face(np_image)
+    return deepface_face(np_image, detector_backend)
+
+
+def fer_classify_batch(faces: list) -> list:
+    """Classe un lot de visages 48x48 en une seule passe du modèle d'émotion (moteur FER_BACKEND)."""
+    from app.services.fer_backends import emotion_classifier
+
+    batch = np.stack(faces).astype(np.float32)[..., np.newaxis]
+    return emotion_results(emotion_classifier().predict(batch))
+
+
+def emotion_results(predictions: np.ndarray) -> list:
+    """Sorties du classifieur -> [{"emotions": {...} en %, "score": 0-100}]."""
+    from app.services.fer_backends import EMOTION_LABELS
+
+    results = []
+    for prediction in predictions:
+        total = prediction.sum()
+        emotions = {label: float(100 * p / total) for label, p in zip(EMOTION_LABELS, prediction)}
+        results.append({"emotions": emotions, "score": emotion_score(emotions)})
+    return results
+
+
+def fer_score(file: UploadFile, detector_backend: str = "opencv") -> dict:
     try:
-        import numpy as np
-        from PIL import Image
-        import io
-        from deepface import DeepFace
-
-        image_bytes = file.file.read()
-        pil_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        np_image = np.array(pil_image)
-
-        result = DeepFace.analyze(np_image, actions=['emotion'], enforce_detection=True)
-        emotions_raw = result[0]['emotion'] if isinstance(result, list) else result['emotion']
-
-        # Convertir tous les scores en float natif (pas numpy.float32)
-        emotions = {emotion: float(score) for emotion, score in emotions_raw.items()}
-
-        weights = {
-            "happy": 1.0,
-            "neutral": 0.5,
-            "surprise": 0.3,
-            "sad": -1.0,
-            "angry": -0.8,
-            "fear": -0.6,
-            "disgust": -0.7
-        }
-
-        raw_score = sum(emotions.get(emotion, 0) * weights.get(emotion, 0) for emotion in emotions)
-        score = float(np.clip(((raw_score + 100) / 200) * 100, 0, 100))  # Assure que c'est bien un float natif
-
-        return {
-            "emotions": emotions,
-            "score": score
-        }
+        return fer_analyze(decode_image(file), detector_backend)
 
     except Exception as e:
         return {"error": str(e)}
 
-def tts_google(text: str, lang: str = "fr"):
-    filename = f"tts_{uuid.uuid4().hex}.mp3"
-    tts = gTTS(text=text, lang=lang)
-    tts.save(filename)
-
-    def iterfile():
-        with open(filename, mode="rb") as file_like:
-            yield from file_like
-        os.remove(filename)  # Supprime après lecture
-
-    logger.info(f"TTS Google: {text} - {lang}")
-    return StreamingResponse(iterfile(), media_type="audio/mpeg")
-
-def tts_x3(text: str, lang: str = "fr"):
-    wav_filename = f"tts_{uuid.uuid4().hex}.wav"
-    mp3_filename = wav_filename.replace(".wav", ".mp3")
-
-    engine = pyttsx3.init()
-    voices = engine.getProperty('voices')
-    if lang == "fr":
-        fr_voice = next((v for v in voices if "fr" in v.languages or "French" in v.name), None)
-        if fr_voice:
-            engine.setProperty('voice', fr_voice.id)
-    
-    engine.save_to_file(text, wav_filename)
-    engine.runAndWait()
-
-    # Convert WAV to MP3
-    sound = AudioSegment.from_wav(wav_filename)
-    sound.export(mp3_filename, format="mp3")
-    os.remove(wav_filename)
-
-    def iterfile():
-        with open(mp3_filename, mode="rb") as file_like:
-            yield from file_like
-        os.remove(mp3_filename)
-
-    logger.info(f"TTS X3: {text} - {lang}")
-    return StreamingResponse(iterfile(), media_type="audio/mpeg")
\ No newline at end of file
+def synthesize_google(text: str, lang: str = "fr", voice: str = "com") -> bytes:
+    """Synthèse gTTS en mémoire; voice est le domaine Google utilisé (accent)."""
+    from gtts import gTTS
+
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang, tld=voice).write_to_fp(buffer)
+    logger.info(f"TTS Google: {len(text)} caractères - {lang}")
+    return buffer.getvalue()
+
+def synthesize_x3(text: str, lang: str = "fr", voice: str = None) -> bytes:
+    """Synthèse hors-ligne pyttsx3, encodée en MP3 (moteur partagé, voir tts_offline)."""
+    mp3 = offline_tts.synthesize_mp3(text, lang, voice)
+    logger.info(f"TTS X3: {len(text)} caractères - {lang}")
+    return mp3
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import os
+import time
+from decimal import Decimal
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class BalanceEntry:
+    __slots__ = ("balance", "fetched_at", "ledger_index")
+
+    def __init__(self, balance: Decimal, fetched_at: float, ledger_index: int):
+        self.balance = balance
+        self.fetched_at = fetched_at
+        self.ledger_index = ledger_index
+
+
+class BalanceCache:
+    """
+    Cache des soldes XRP par wallet.
+    - Une entrée reste valide BALANCE_TTL secondes et tant qu'aucun ledger plus récent
+      que le sien n'a été validé (un ledger est validé toutes les ~4s).
+    - Les lectures simultanées d'un même wallet partagent un seul appel au ledger.
+    - Une tâche de fond suit les ledgers validés et rafraîchit les soldes des clients
+      connectés; les soldes modifiés sont poussés dans le registre et vers les masters.
+      Sans client connecté, elle n'interroge pas le ledger.
+    """
+
+    def __init__(self, gateway, manager, ttl: float = None, refresh_interval: float = None,
+                 concurrency: int = None):
+        self.gateway = gateway
+        self.manager = manager
+        self.ttl = ttl or float(os.environ.get("BALANCE_TTL", 4))
+        self.refresh_interval = refresh_interval or float(os.environ.get("BALANCE_REFRESH_INTERVAL", 4))
+        self.concurrency = concurrency or int(os.environ.get("BALANCE_CONCURRENCY", 8))
+        self.validated_ledger: int = None
+        self._entries: Dict[str, BalanceEntry] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._refresh_task: asyncio.Task = None
+
+    def start(self):
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    def _is_fresh(self, entry: BalanceEntry) -> bool:
+        if time.monotonic() - entry.fetched_at >= self.ttl:
+            return False
+        return self.validated_ledger is None or entry.ledger_index is None \
+            or entry.ledger_index >= self.validated_ledger
+
+    async def get(self, wallet_address: str) -> Decimal:
+        """Solde d'un wallet, depuis le cache s'il est encore valide."""
+        entry = self._entries.get(wallet_address)
+        if entry is not None and self._is_fresh(entry):
+            return entry.balance
+        return await self._fetch(wallet_address)
+
+    async def get_many(self, wallet_addresses: List[str]) -> Dict[str, Decimal]:
+        """Soldes de plusieurs wallets, avec au plus `concurrency` appels au ledger simultanés."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(wallet_address):
+            async with semaphore:
+                try:
+                    return await self.get(wallet_address)
+                except Exception as e:
+                    logger.error(f"Solde de {wallet_address} indisponible: {e}")
+                    return None
+
+        unique = list(dict.fromkeys(wallet_addresses))
+        balances = await asyncio.gather(*(one(w) for w in unique))
+        return dict(zip(unique, balances))
+
+    async def _fetch(self, wallet_address: str) -> Decimal:
+        task = self._inflight.get(wallet_address)
+        if task is None:
+            task = asyncio.create_task(self._load(wallet_address))
+            self._inflight[wallet_address] = task
+            task.add_done_callback(lambda _: self._inflight.pop(wallet_address, None))
+        # shield: l'annulation d'un appelant n'annule pas l'appel partagé
+        return await asyncio.shield(task)
+
+    async def _load(self, wallet_address: str) -> Decimal:
+        balance, ledger_index = await self.gateway.get_account_balance(wallet_address)
+        if balance is None:
+            self._entries.pop(wallet_address, None)
+            return None
+        self._entries[wallet_address] = BalanceEntry(balance, time.monotonic(), ledger_index)
+        if ledger_index is not None and (self.validated_ledger is None or ledger_index > self.validated_ledger):
+            self.validated_ledger = ledger_index
+        self.manager.update_client(wallet_address, xrp_balance=float(balance))
+        return balance
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            wallets = list(self.manager.active_connections.keys())
+            if not wallets:
+                # Aucun client connecté: pas de solde à rafraîchir, pas d'appel au ledger
+                continue
+            try:
+                ledger_index = await self.gateway.get_validated_ledger_index()
+            except Exception as e:
+                logger.error(f"Index du ledger validé indisponible: {e}")
+                continue
+            if self.validated_ledger is not None and ledger_index <= self.validated_ledger:
+                continue
+            self.validated_ledger = ledger_index
+            # Nouveau ledger: seuls les clients connectés sont rafraîchis
+            await self.get_many(wallets)
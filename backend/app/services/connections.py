@@ -3,108 +3,277 @@ from fastapi import WebSocket
 from typing import Dict, List, Set
 import asyncio
 import uuid
-import json
+import os
+from app.services.messages import encode
+from app.services.metrics import WS_BROADCAST_SECONDS
+from app.services.outbound import OutboundChannel
+from app.services.registry import PlayerRegistry
+from app.services.state import state_backend
 
 logger = logging.getLogger(__name__)
 
+# Fenêtre (secondes) de regroupement des changements de la liste des clients
+CLIENTS_DELTA_INTERVAL = float(os.environ.get("CLIENTS_DELTA_INTERVAL", 0.05))
+# Période (secondes) d'envoi d'une liste complète aux masters pour resynchronisation
+CLIENTS_SNAPSHOT_INTERVAL = float(os.environ.get("CLIENTS_SNAPSHOT_INTERVAL", 30))
+
 class ConnectionManager:
-    def __init__(self):
+    """
+    Sockets des clients et des masters de ce worker, et copie locale du registre des joueurs.
+    Les changements du registre et les diffusions sont aussi publiés sur le backend d'état
+    partagé: les autres workers les appliquent à leur copie et à leurs propres sockets.
+    """
+
+    def __init__(self, backend=state_backend):
+        self.backend = backend
         self.active_connections: Dict[str, WebSocket] = {}
-        self.registered_clients: Dict[str, dict] = {}  # clé = wallet_address
+        self.players = PlayerRegistry()  # joueurs inscrits, état de connexion compris
         self.master_connections: List[WebSocket] = []
+        self.channels: Dict[WebSocket, OutboundChannel] = {}  # file d'envoi de chaque socket
+        self.clients_seq = 0  # numéro de séquence de la liste des clients
+        self._pending_changes: Dict[str, dict] = {}
+        self._flush_handle: asyncio.TimerHandle = None
+        self._snapshot_task: asyncio.Task = None
+        # Fonctions appelées à chaque connexion (client ou master): message à lui envoyer, ou None
+        self.on_connect = []
+
+    async def start(self):
+        """Charge le registre partagé et s'abonne aux événements des autres workers."""
+        self.backend.subscribe("client", self._on_remote_client)
+        self.backend.subscribe("broadcast", self._on_remote_broadcast)
+        self.backend.subscribe("personal", self._on_remote_personal)
+        for wallet_address, record in (await self.backend.load_clients()).items():
+            if wallet_address not in self.players:
+                self.players.add(wallet_address, record)
 
     def register_client(self, username: str, wallet):
         wallet_address = wallet.address
-        self.registered_clients[wallet_address] = {
+        player = self.players.add(wallet_address, {
             "username": username,
-            "wallet_address": wallet_address,
             "wallet_seed": wallet.seed,
             "xrp_balance": getattr(wallet, "balance", 0.0),
-            "is_connected": False
-        }
+        })
+        self._store_client(wallet_address, player.to_dict())
         logger.info(f"Client enregistré: {username} - {wallet_address}")
-        logger.info(f"Liste des clients enregistrés: {list(self.registered_clients.keys())}")
 
     def is_client_registered(self, wallet_address: str) -> bool:
-        is_registered = wallet_address in self.registered_clients
-        logger.info(f"Vérification d'enregistrement pour {wallet_address}: {is_registered}")
+        is_registered = wallet_address in self.players
+        logger.debug(f"Vérification d'enregistrement pour {wallet_address}: {is_registered}")
         return is_registered
 
     async def connect_master(self, websocket: WebSocket):
         """Connecte un master WebSocket."""
         await websocket.accept()
         self.master_connections.append(websocket)
-        await self.broadcast_client_list()
+        self._open_channel(websocket)
+        self._greet(websocket)
+        await self.send_client_list(websocket)
+        if self._snapshot_task is None or self._snapshot_task.done():
+            self._snapshot_task = asyncio.create_task(self._snapshot_loop())
 
     def disconnect_master(self, websocket: WebSocket):
         """Déconnecte un master WebSocket."""
         if websocket in self.master_connections:
             self.master_connections.remove(websocket)
+        self._close_channel(websocket)
 
     async def connect(self, websocket: WebSocket, wallet_address: str) -> bool:
         """Connecte un client WebSocket."""
+        if wallet_address not in self.players:
+            # Inscrit par un autre worker dont l'événement n'est pas encore arrivé
+            record = await self.backend.load_client(wallet_address)
+            if record is not None:
+                self.players.add(wallet_address, record)
         if not self.is_client_registered(wallet_address):
             logger.warning(f"Tentative de connexion d'un client non enregistré: {wallet_address}")
             await websocket.close(code=4001, reason="Wallet address non reconnu")
             return False
             
         await websocket.accept()
+        previous = self.active_connections.get(wallet_address)
+        if previous is not None:
+            self._close_channel(previous)
         self.active_connections[wallet_address] = websocket
-        # Marque le client comme connecté
-        if wallet_address in self.registered_clients:
-            self.registered_clients[wallet_address]["is_connected"] = True
-            logger.info(f"Client {wallet_address} marqué comme connecté")
-            
-        await self.broadcast_client_list()
-        logger.info(f"Clients actifs après connexion: {list(self.active_connections.keys())}")
+        self._open_channel(websocket)
+        self._greet(websocket)
+        self.update_client(wallet_address, is_connected=True)
+
+        logger.debug(f"Clients actifs après connexion: {len(self.active_connections)}")
         return True
 
-    def disconnect(self, wallet_address: str):
+    def disconnect(self, wallet_address: str, websocket: WebSocket = None):
         """Déconnecte un client."""
+        if websocket is not None and self.active_connections.get(wallet_address) is not websocket:
+            # Ancienne socket d'un client déjà reconnecté: rien à faire
+            return
         logger.info(f"Déconnexion du client: {wallet_address}")
-        self.active_connections.pop(wallet_address, None)
-        # Marque le client comme déconnecté
-        if wallet_address in self.registered_clients:
-            self.registered_clients[wallet_address]["is_connected"] = False
-            logger.info(f"Client {wallet_address} marqué comme déconnecté")
-        asyncio.create_task(self.broadcast_client_list())
+        websocket = self.active_connections.pop(wallet_address, None)
+        if websocket is not None:
+            self._close_channel(websocket)
+        self.update_client(wallet_address, is_connected=False)
+
+    def update_client(self, wallet_address: str, **fields):
+        """Met à jour les champs d'un client enregistré et notifie les masters."""
+        changed = self.players.update(wallet_address, fields)
+        if changed:
+            self._store_client(wallet_address, changed)
+
+    def _store_client(self, wallet_address: str, fields: dict):
+        """Enregistre un changement déjà appliqué localement et le publie aux autres workers."""
+        self.backend.save_client(wallet_address, fields)
+        self.backend.publish("client", {"wallet_address": wallet_address, "fields": fields})
+        self._client_changed(wallet_address, fields)
+
+    def _on_remote_client(self, payload: dict):
+        wallet_address = payload["wallet_address"]
+        if wallet_address in self.players:
+            self.players.update(wallet_address, payload["fields"])
+        else:
+            self.players.add(wallet_address, payload["fields"])
+        self._client_changed(wallet_address, payload["fields"])
+
+    def _client_changed(self, wallet_address: str, fields: dict):
+        """Accumule un changement; les changements proches sont envoyés en un seul message."""
+        patch = self._pending_changes.setdefault(wallet_address, {"wallet_address": wallet_address})
+        patch.update(fields)
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(CLIENTS_DELTA_INTERVAL, self._flush_client_changes)
+
+    def _flush_client_changes(self):
+        self._flush_handle = None
+        if not self._pending_changes:
+            return
+        changes = list(self._pending_changes.values())
+        self._pending_changes.clear()
+        self.clients_seq += 1
+        if not self.master_connections:
+            return
+        message = encode({
+            "type": "clients_delta",
+            "seq": self.clients_seq,
+            "changes": changes
+        })
+        for master in list(self.master_connections):
+            self._send(master, message)
+
+    def _open_channel(self, websocket: WebSocket):
+        self.channels[websocket] = OutboundChannel(websocket, on_evict=self._evict)
+
+    def _greet(self, websocket: WebSocket):
+        """Messages d'accueil d'une nouvelle connexion (ex: manche en cours pour un retardataire)."""
+        for callback in self.on_connect:
+            try:
+                message = callback()
+            except Exception as e:
+                logger.error(f"Erreur du message d'accueil: {e}")
+                continue
+            if message is not None:
+                self._send(websocket, message)
+
+    def _close_channel(self, websocket: WebSocket):
+        channel = self.channels.pop(websocket, None)
+        if channel is not None:
+            channel.close()
+
+    def _evict(self, channel: OutboundChannel):
+        """Retire une connexion trop lente ou morte et ferme sa socket."""
+        websocket = channel.websocket
+        if websocket in self.master_connections:
+            self.disconnect_master(websocket)
+        else:
+            wallet_address = next((w for w, ws in self.active_connections.items() if ws is websocket), None)
+            if wallet_address is not None:
+                self.disconnect(wallet_address)
+        asyncio.create_task(self._close_socket(websocket))
+
+    async def _close_socket(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1008, reason="Connexion trop lente")
+        except Exception:
+            pass
+
+    def _send(self, websocket: WebSocket, message: str, coalesce_key: str = None):
+        channel = self.channels.get(websocket)
+        if channel is not None:
+            channel.send(message, coalesce_key)
 
     async def send_personal_message(self, message: str, wallet_address: str):
-        """Envoie un message à un client spécifique."""
+        """Envoie un message à un client spécifique, connecté à ce worker ou à un autre."""
         if wallet_address in self.active_connections:
-            await self.active_connections[wallet_address].send_text(message)
+            self._send(self.active_connections[wallet_address], message)
+        else:
+            self.backend.publish("personal", {"wallet_address": wallet_address, "message": message})
 
-    async def broadcast(self, message: str):
+    def _on_remote_personal(self, payload: dict):
+        websocket = self.active_connections.get(payload["wallet_address"])
+        if websocket is not None:
+            self._send(websocket, payload["message"])
+
+    async def broadcast(self, message: str, coalesce_key: str = None):
         """Diffuse un message à tous les clients."""
-        for connection in self.active_connections.values():
-            await connection.send_text(message)
-    
+        self.backend.publish("broadcast", {"target": "clients", "message": message, "coalesce_key": coalesce_key})
+        self.broadcast_local("clients", message, coalesce_key)
+
+    async def broadcast_masters(self, message: str, coalesce_key: str = None):
+        """Diffuse un message à tous les masters."""
+        self.backend.publish("broadcast", {"target": "masters", "message": message, "coalesce_key": coalesce_key})
+        self.broadcast_local("masters", message, coalesce_key)
+
+    def _on_remote_broadcast(self, payload: dict):
+        self.broadcast_local(payload["target"], payload["message"], payload["coalesce_key"])
+
+    def broadcast_local(self, target: str, message: str, coalesce_key: str = None):
+        """Met le message en file pour les sockets de ce worker uniquement (sans publication)."""
+        with WS_BROADCAST_SECONDS.time(target=target):
+            if target == "clients":
+                connections = list(self.active_connections.values())
+            else:
+                connections = list(self.master_connections)
+            for connection in connections:
+                self._send(connection, message, coalesce_key)
+
     async def broadcast_countdown(self, message: str):
         """Diffuse un message de compte à rebours à tous les clients."""
-        for connection in self.active_connections.values():
-            await connection.send_text(message)
-        for master in self.master_connections:
-            await master.send_text(message)
-    
+        # Seule la valeur la plus récente du compte à rebours compte
+        await self.broadcast(message, coalesce_key="countdown")
+        await self.broadcast_masters(message, coalesce_key="countdown")
+
     async def broadcast_game_result(self, message: str):
         """Diffuse un message de résultat de jeu à tous les clients."""
-        for connection in self.active_connections.values():
-            await connection.send_text(message)
-        for master in self.master_connections:
-            await master.send_text(message)
+        await self.broadcast(message)
+        await self.broadcast_masters(message)
+
+    def _client_list_message(self) -> str:
+        # Les changements en attente sont inclus dans la liste complète
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending_changes:
+            self._pending_changes.clear()
+            self.clients_seq += 1
+        return encode({
+            "type": "clients_update",
+            "seq": self.clients_seq,
+            "clients": self.players.snapshot()
+        })
+
+    async def send_client_list(self, websocket: WebSocket):
+        """Envoie la liste complète des clients à un master (connexion ou resynchronisation)."""
+        if self._pending_changes:
+            # Les autres masters reçoivent d'abord les changements, le nouveau la liste complète
+            self._flush_client_changes()
+        self._send(websocket, self._client_list_message(), coalesce_key="clients_update")
 
     async def broadcast_client_list(self):
-        """Envoie la liste mise à jour des clients à tous les masters."""
+        """Envoie la liste complète des clients aux masters de ce worker."""
         if not self.master_connections:
             return
-        clients = list(self.registered_clients.values())
-        message = json.dumps({
-            "type": "clients_update",
-            "clients": clients
-        })
-        for master in self.master_connections:
-            try:
-                await master.send_text(message)
-            except Exception as e:
-                logger.error(f"Erreur lors de l'envoi au master: {e}")
-                pass 
\ No newline at end of file
+        # Chaque worker envoie sa propre copie du registre: les numéros de séquence lui sont propres
+        self.broadcast_local("masters", self._client_list_message(), coalesce_key="clients_update")
+
+    async def _snapshot_loop(self):
+        """Liste complète périodique pour les masters qui auraient manqué un changement."""
+        while self.master_connections:
+            await asyncio.sleep(CLIENTS_SNAPSHOT_INTERVAL)
+            await self.broadcast_client_list()
@@ -0,0 +1,241 @@
+"""
+Moteurs d'exécution du classifieur d'émotions (CNN 48x48 de DeepFace).
+
+FER_BACKEND=keras (défaut): modèle Keras de DeepFace (TensorFlow, float32).
+FER_BACKEND=tflite: modèle exporté en TFLite (XNNPACK), via ai_edge_litert, tflite_runtime ou tensorflow.
+FER_BACKEND=onnx: modèle exporté en ONNX, exécuté par ONNX Runtime.
+FER_PRECISION=int8 choisit le modèle quantifié (emotion-int8.tflite / .onnx) plutôt que float32.
+
+Les modèles sont produits par `python -m bench.fer_runtime export` et comparés au modèle Keras
+par `python -m bench.fer_runtime validate`. Avec tflite/onnx et FER_DETECTOR=opencv, la détection
+de visage utilise directement les cascades OpenCV: ni DeepFace ni TensorFlow ne sont importés.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FER_BACKEND = os.environ.get("FER_BACKEND", "keras").lower()
+FER_PRECISION = os.environ.get("FER_PRECISION", "float32").lower()
+# Dossier des modèles exportés, et chemin explicite d'un modèle (prioritaire)
+FER_MODEL_DIR = os.environ.get("FER_MODEL_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "models"))
+FER_MODEL_PATH = os.environ.get("FER_MODEL_PATH", "")
+# Threads par exécution du modèle (les lots sont déjà répartis sur les FER_WORKERS threads)
+FER_THREADS = int(os.environ.get("FER_THREADS", 1))
+
+# Ordre des sorties du modèle d'émotion de DeepFace (deepface.models.demography.Emotion.labels)
+EMOTION_LABELS = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+INPUT_SHAPE = (48, 48, 1)
+FACE_SIZE = 224  # taille intermédiaire du prétraitement de DeepFace
+
+_EXTENSIONS = {"tflite": "tflite", "onnx": "onnx"}
+
+
+def model_path(backend: str = FER_BACKEND, precision: str = FER_PRECISION) -> str:
+    if FER_MODEL_PATH:
+        return FER_MODEL_PATH
+    suffix = "-int8" if precision == "int8" else ""
+    return os.path.join(FER_MODEL_DIR, f"emotion{suffix}.{_EXTENSIONS[backend]}")
+
+
+class KerasEmotionClassifier:
+    name = "keras"
+
+    def __init__(self):
+        from deepface import DeepFace
+
+        self.model = DeepFace.build_model(task="facial_attribute", model_name="Emotion").model
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.model(batch, training=False).numpy()
+
+
+class TFLiteEmotionClassifier:
+    """Interpréteur TFLite (délégué XNNPACK par défaut sur CPU), un par thread: il n'est pas partagé."""
+    name = "tflite"
+
+    def __init__(self, path: str, threads: int = FER_THREADS):
+        self.path = path
+        self.threads = threads
+        self._local = threading.local()
+        self._interpreter()  # échoue tout de suite si le modèle est absent
+
+    @staticmethod
+    def _interpreter_class():
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                from tensorflow.lite import Interpreter
+        return Interpreter
+
+    def _interpreter(self):
+        interpreter = getattr(self._local, "interpreter", None)
+        if interpreter is None:
+            interpreter = self._interpreter_class()(model_path=self.path, num_threads=self.threads)
+            interpreter.allocate_tensors()
+            self._local.interpreter = interpreter
+            self._local.batch_size = None
+        return interpreter
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        interpreter = self._interpreter()
+        input_index = interpreter.get_input_details()[0]["index"]
+        if self._local.batch_size != len(batch):
+            # Redimensionner l'entrée réalloue les tenseurs: seulement quand la taille du lot change
+            interpreter.resize_tensor_input(input_index, [len(batch), *INPUT_SHAPE])
+            interpreter.allocate_tensors()
+            self._local.batch_size = len(batch)
+        interpreter.set_tensor(input_index, batch.astype(np.float32, copy=False))
+        interpreter.invoke()
+        return interpreter.get_tensor(interpreter.get_output_details()[0]["index"])
+
+
+class OnnxEmotionClassifier:
+    name = "onnx"
+
+    def __init__(self, path: str, threads: int = FER_THREADS):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+def create_classifier(backend: str = FER_BACKEND, path: str = None, threads: int = FER_THREADS):
+    if backend == "keras":
+        return KerasEmotionClassifier()
+    if backend == "tflite":
+        return TFLiteEmotionClassifier(path or model_path(backend), threads)
+    if backend == "onnx":
+        return OnnxEmotionClassifier(path or model_path(backend), threads)
+    raise ValueError(f"FER_BACKEND inconnu: {backend} (keras, tflite ou onnx)")
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def emotion_classifier():
+    """Classifieur du processus, créé au premier appel (FER_BACKEND)."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = create_classifier()
+                logger.info(f"Classifieur d'émotions: {FER_BACKEND} ({FER_PRECISION})")
+    return _classifier
+
+
+def native_detector(detector_backend: str, backend: str = FER_BACKEND) -> bool:
+    """Détection par les cascades OpenCV sans DeepFace (évite de charger TensorFlow)."""
+    return backend != "keras" and detector_backend == "opencv"
+
+
+_cascades = threading.local()
+
+
+def cascade_classifiers() -> tuple:
+    import cv2
+
+    if getattr(_cascades, "face", None) is None:
+        _cascades.face = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+        _cascades.eye = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_eye.xml"))
+    return _cascades.face, _cascades.eye
+
+
+def pad_resize(face: np.ndarray, size: int = FACE_SIZE) -> np.ndarray:
+    """Même mise à l'échelle que deepface preprocessing.resize_image: proportions gardées, bordures noires."""
+    import cv2
+
+    factor = min(size / face.shape[0], size / face.shape[1])
+    face = cv2.resize(face, (int(face.shape[1] * factor), int(face.shape[0] * factor)))
+    diff_0, diff_1 = size - face.shape[0], size - face.shape[1]
+    face = np.pad(face, ((diff_0 // 2, diff_0 - diff_0 // 2), (diff_1 // 2, diff_1 - diff_1 // 2), (0, 0)), "constant")
+    if face.shape[:2] != (size, size):
+        face = cv2.resize(face, (size, size))
+    return face
+
+
+def _project_box(box: tuple, angle: float, height: int, width: int) -> tuple:
+    """
+    Boîte (x1, y1, x2, y2) après rotation de l'image autour de son centre: le centre de la boîte
+    tourne, sa taille est gardée (deepface.modules.detection.project_facial_area).
+    """
+    direction = 1 if angle >= 0 else -1
+    angle = abs(angle) % 360
+    if angle == 0:
+        return box
+    angle = angle * np.pi / 180
+    x = (box[0] + box[2]) / 2 - width / 2
+    y = (box[1] + box[3]) / 2 - height / 2
+    x_new = x * np.cos(angle) + y * direction * np.sin(angle) + width / 2
+    y_new = -x * direction * np.sin(angle) + y * np.cos(angle) + height / 2
+    half_w, half_h = (box[2] - box[0]) / 2, (box[3] - box[1]) / 2
+    return (max(int(x_new - half_w), 0), max(int(y_new - half_h), 0),
+            min(int(x_new + half_w), width), min(int(y_new + half_h), height))
+
+
+def detect_face(np_image: np.ndarray) -> np.ndarray:
+    """
+    Visage principal prêt pour le classifieur (48x48, niveaux de gris, 0-1), comme fer_face:
+    mêmes étapes que le détecteur "opencv" de DeepFace avec align=True, sans DeepFace.
+    - Bordure noire d'une demi-image de chaque côté, puis détection: le premier visage est gardé.
+    - Yeux cherchés dans le visage; l'image entière tourne autour de son centre pour les mettre
+      à l'horizontale, puis le visage est découpé à sa position après rotation.
+    """
+    import cv2
+
+    face_cascade, eye_cascade = cascade_classifiers()
+    border_y, border_x = int(0.5 * np_image.shape[0]), int(0.5 * np_image.shape[1])
+    img = cv2.copyMakeBorder(np_image, border_y, border_y, border_x, border_x, cv2.BORDER_CONSTANT, value=[0, 0, 0])
+    faces, _, _ = face_cascade.detectMultiScale3(img, 1.1, 10, outputRejectLevels=True)
+    if len(faces) == 0:
+        raise ValueError("Face could not be detected in numpy array.")
+    x, y, w, h = (int(v) for v in faces[0])
+    face = img[y:y + h, x:x + w]
+
+    eyes = eye_cascade.detectMultiScale(cv2.cvtColor(face, cv2.COLOR_BGR2GRAY), 1.1, 10)
+    eyes = sorted(eyes, key=lambda e: abs(e[2] * e[3]), reverse=True)
+    if len(eyes) >= 2:
+        # L'œil droit de la personne est à gauche dans l'image
+        right, left = (eyes[0], eyes[1]) if eyes[0][0] < eyes[1][0] else (eyes[1], eyes[0])
+        rx, ry = int(right[0] + right[2] / 2), int(right[1] + right[3] / 2)
+        lx, ly = int(left[0] + left[2] / 2), int(left[1] + left[3] / 2)
+        angle = float(np.degrees(np.arctan2(ly - ry, lx - rx)))
+        rows, cols = img.shape[:2]
+        rotation = cv2.getRotationMatrix2D((cols // 2, rows // 2), angle, 1.0)
+        img = cv2.warpAffine(img, rotation, (cols, rows), flags=cv2.INTER_CUBIC,
+                             borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+        x1, y1, x2, y2 = _project_box((x, y, x + w, y + h), angle, rows, cols)
+        face = img[y1:y2, x1:x2]
+    if face.shape[0] == 0 or face.shape[1] == 0:
+        raise ValueError("Visage détecté vide")
+
+    face = pad_resize(face.astype(np.float32) / 255)
+    return cv2.resize(cv2.cvtColor(face, cv2.COLOR_BGR2GRAY), (48, 48))
+
+
+def deepface_face(np_image: np.ndarray, detector_backend: str = "opencv") -> np.ndarray:
+    """Visage principal préparé par la détection et le prétraitement de DeepFace (référence de detect_face)."""
+    import cv2
+    from deepface.modules import detection, preprocessing
+
+    img_objs = detection.extract_faces(img_path=np_image, detector_backend=detector_backend,
+                                       enforce_detection=True, grayscale=False, align=True)
+    face = img_objs[0]["face"]
+    if face.shape[0] == 0 or face.shape[1] == 0:
+        raise ValueError("Visage détecté vide")
+    face = preprocessing.resize_image(img=face[:, :, ::-1], target_size=(FACE_SIZE, FACE_SIZE))[0]
+    face_gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(face_gray, (48, 48))
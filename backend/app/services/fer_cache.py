@@ -0,0 +1,201 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.services.ai import MAX_IMAGE_PIXELS, image_dimensions
+from app.services.inference import INFERENCE_MODE
+
+logger = logging.getLogger(__name__)
+
+# Nombre de résultats d'analyse émotionnelle gardés en cache (0 = cache désactivé)
+FER_CACHE_SIZE = int(os.environ.get("FER_CACHE_SIZE", 2048))
+# Durée de validité (secondes) d'un résultat en cache
+FER_CACHE_TTL = float(os.environ.get("FER_CACHE_TTL", 300))
+# Distance de Hamming maximale (sur 64 bits) entre deux images considérées identiques
+FER_CACHE_DISTANCE = int(os.environ.get("FER_CACHE_DISTANCE", 4))
+
+
+def dhash(data) -> int:
+    """
+    Empreinte perceptuelle (dHash, 64 bits) d'une image: niveaux de gris réduits en 9x8,
+    un bit par comparaison de deux pixels voisins. Insensible à la recompression et aux
+    petites variations de luminosité. None si l'image est illisible.
+    """
+    import cv2
+
+    width, height = image_dimensions(data)
+    if width * height > MAX_IMAGE_PIXELS:
+        return None
+    # Décodage réduit au 1/8: une empreinte 9x8 n'a pas besoin de la pleine résolution
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class CacheEntry:
+    __slots__ = ("digest", "phash", "result", "expires")
+
+    def __init__(self, digest: bytes, phash: int, result: dict, expires: float):
+        self.digest = digest
+        self.phash = phash
+        self.result = result
+        self.expires = expires
+
+
+class EmotionResultCache:
+    """
+    Résultats d'analyse émotionnelle déjà calculés, retrouvés par image.
+    - Chemin rapide (exact): empreinte exacte (blake2b) des octets reçus, sans décodage.
+    - Sinon (nearest) empreinte perceptuelle (dHash): une image à au plus `distance` bits d'une
+      image déjà analysée (même capture renvoyée, recompressée...) reprend son résultat.
+      Elle demande un décodage: l'appelant la fait sous contrôle d'admission. Sans perceptual
+      (passerelle en INFERENCE_MODE=remote), seul le chemin exact est utilisé, et c'est le
+      processus d'inférence qui tient le cache perceptuel.
+    - Recherche des voisins par bandes: les 64 bits sont découpés en distance + 1 bandes;
+      deux empreintes à moins de distance + 1 bits ont au moins une bande identique.
+    - Taille bornée (LRU) et durée de validité (ttl).
+    """
+
+    def __init__(self, max_entries: int = FER_CACHE_SIZE, ttl: float = FER_CACHE_TTL,
+                 distance: int = FER_CACHE_DISTANCE, perceptual: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.distance = distance
+        self.perceptual = perceptual
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()  # digest -> CacheEntry
+        width, extra = divmod(64, distance + 1)
+        self._bands = []  # (décalage, masque) de chaque bande
+        shift = 0
+        for band in range(distance + 1):
+            size = width + (1 if band < extra else 0)
+            self._bands.append((shift, (1 << size) - 1))
+            shift += size
+        self._index = [{} for _ in self._bands]  # bande -> valeur -> digests
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def lookup(self, data) -> tuple:
+        """Retourne (résultat ou None, clé à passer à store() après l'analyse)."""
+        result, digest = self.exact(data)
+        if result is not None:
+            return result, None
+        return await self.nearest(data, digest)
+
+    def exact(self, data) -> tuple:
+        """Chemin rapide, sans décodage: (résultat ou None, empreinte exacte à passer à nearest())."""
+        if not self.enabled:
+            return None, None
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        entry = self._get(digest)
+        if entry is not None:
+            self.hits += 1
+            return entry.result, digest
+        return None, digest
+
+    async def nearest(self, data, digest: bytes) -> tuple:
+        """
+        Image quasi identique (décodage réduit dans le pool de threads), après un échec de exact():
+        (résultat ou None, clé à passer à store() après l'analyse).
+        """
+        if not self.enabled:
+            return None, None
+        phash = None
+        if self.perceptual:
+            try:
+                phash = await run_in_threadpool(dhash, data)
+            except Exception as e:
+                logger.debug(f"Empreinte perceptuelle impossible: {e}")
+        if phash is not None:
+            entry = self._nearest(phash)
+            if entry is not None:
+                self.near_hits += 1
+                # La copie devient accessible par le chemin rapide
+                self._insert(CacheEntry(digest, phash, entry.result, entry.expires))
+                return entry.result, None
+        self.misses += 1
+        return None, (digest, phash)
+
+    def store(self, key: tuple, result: dict):
+        """Garde le résultat d'une analyse réussie (les erreurs ne sont pas mises en cache)."""
+        if key is None or "error" in result:
+            return
+        digest, phash = key
+        self._insert(CacheEntry(digest, phash, result, time.monotonic() + self.ttl))
+
+    def _get(self, digest: bytes) -> CacheEntry:
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        if entry.expires <= time.monotonic():
+            self._remove(entry)
+            return None
+        self._entries.move_to_end(digest)
+        return entry
+
+    def _nearest(self, phash: int) -> CacheEntry:
+        best, best_distance = None, self.distance + 1
+        for (shift, mask), index in zip(self._bands, self._index):
+            for digest in list(index.get((phash >> shift) & mask, ())):
+                entry = self._get(digest)
+                if entry is None:
+                    continue
+                distance = (entry.phash ^ phash).bit_count()
+                if distance < best_distance:
+                    best, best_distance = entry, distance
+        if best is not None:
+            self._entries.move_to_end(best.digest)
+        return best
+
+    def _insert(self, entry: CacheEntry):
+        previous = self._entries.get(entry.digest)
+        if previous is not None:
+            self._remove(previous)
+        self._entries[entry.digest] = entry
+        if entry.phash is not None:
+            for (shift, mask), index in zip(self._bands, self._index):
+                index.setdefault((entry.phash >> shift) & mask, set()).add(entry.digest)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries.values())))
+
+    def _remove(self, entry: CacheEntry):
+        del self._entries[entry.digest]
+        if entry.phash is None:
+            return
+        for (shift, mask), index in zip(self._bands, self._index):
+            value = (entry.phash >> shift) & mask
+            digests = index.get(value)
+            if digests is not None:
+                digests.discard(entry.digest)
+                if not digests:
+                    del index[value]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "distance": self.distance,
+            "perceptual": self.perceptual,
+        }
+
+
+# En mode remote, la passerelle ne décode pas les images (pas d'OpenCV): chemin exact seulement
+fer_cache = EmotionResultCache(perceptual=INFERENCE_MODE != "remote")
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import mmap
+import os
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import Request, Response, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.services.ai import upload_size
+
+logger = logging.getLogger(__name__)
+
+# Taille maximale des images gardées en mémoire (originaux et miniatures), en octets
+IMAGE_STORE_MAX_BYTES = int(os.environ.get("IMAGE_STORE_MAX_BYTES", 64 * 1024 * 1024))
+# Taille maximale d'une image reçue (octets)
+IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", 5 * 1024 * 1024))
+# Segment disque projeté en mémoire pour les originaux évincés (vide = désactivé)
+IMAGE_SPILL_PATH = os.environ.get("IMAGE_SPILL_PATH", "")
+IMAGE_SPILL_BYTES = int(os.environ.get("IMAGE_SPILL_BYTES", 256 * 1024 * 1024))
+THUMBNAIL_WIDTH = int(os.environ.get("THUMBNAIL_WIDTH", 160))
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", 1))
+
+
+class ImageTooLarge(Exception):
+    """Levée quand une image dépasse IMAGE_MAX_BYTES."""
+
+
+class StoredImage:
+    __slots__ = ("image_id", "data", "content_type", "wallet_address", "round_id",
+                 "thumbnail", "thumbnail_future", "spill_start", "size")
+
+    def __init__(self, image_id: str, data: bytes, content_type: str, wallet_address: str, round_id: str):
+        self.image_id = image_id
+        self.data = data  # None une fois l'original déplacé dans le segment disque
+        self.content_type = content_type
+        self.wallet_address = wallet_address
+        self.round_id = round_id
+        self.thumbnail: bytes = None
+        self.thumbnail_future: asyncio.Future = None
+        self.spill_start: int = None  # position absolue dans le segment disque
+        self.size = len(data)
+
+    def to_dict(self) -> dict:
+        return {"wallet_address": self.wallet_address, "round_id": self.round_id, **image_message(self.image_id)}
+
+
+class SpillSegment:
+    """
+    Fichier de taille fixe projeté en mémoire, écrit en anneau.
+    Les positions sont absolues (toujours croissantes): une image est lisible tant que
+    l'anneau n'a pas fait un tour complet depuis son écriture.
+    """
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self.head = 0
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            os.ftruncate(fd, capacity)
+            self._map = mmap.mmap(fd, capacity)
+        finally:
+            os.close(fd)
+
+    def write(self, data: bytes) -> int:
+        size = len(data)
+        if size > self.capacity:
+            return None
+        offset = self.head % self.capacity
+        if offset + size > self.capacity:
+            # Pas de découpage: l'image repart au début de l'anneau
+            self.head += self.capacity - offset
+            offset = 0
+        start = self.head
+        self._map[offset:offset + size] = data
+        self.head += size
+        return start
+
+    def read(self, start: int, size: int) -> bytes:
+        if start is None or self.head - start > self.capacity:
+            return None  # écrasée depuis
+        offset = start % self.capacity
+        return self._map[offset:offset + size]
+
+    def close(self):
+        self._map.close()
+
+
+class ImageStore:
+    """
+    Images des joueurs, stockées une seule fois et désignées par un identifiant.
+    - Les masters reçoivent l'identifiant et récupèrent l'image ou sa miniature à la demande
+      (GET /api/images/{image_id}, /api/images/{image_id}/thumbnail).
+    - Mémoire bornée (max_bytes, originaux et miniatures): les images les moins récemment
+      utilisées sont évincées, ou leurs originaux déplacés dans un segment disque projeté en
+      mémoire si spill_path est défini.
+    - La miniature est calculée une seule fois, dans un pool de threads, dès la réception.
+    - Images indexées par manche.
+    """
+
+    def __init__(self, max_bytes: int = IMAGE_STORE_MAX_BYTES, max_image_bytes: int = IMAGE_MAX_BYTES,
+                 spill_path: str = IMAGE_SPILL_PATH, spill_bytes: int = IMAGE_SPILL_BYTES,
+                 thumbnail_width: int = THUMBNAIL_WIDTH, thumbnail_workers: int = THUMBNAIL_WORKERS):
+        self.max_bytes = max_bytes
+        self.max_image_bytes = max_image_bytes
+        self.spill_path = spill_path
+        self.spill_bytes = spill_bytes
+        self.thumbnail_width = thumbnail_width
+        self.size = 0  # octets en mémoire
+        self.evictions = 0
+        self._images: OrderedDict = OrderedDict()
+        self._by_round = {}
+        self._spill: SpillSegment = None
+        self._executor = ThreadPoolExecutor(max_workers=thumbnail_workers, thread_name_prefix="thumbnail")
+
+    async def read_upload(self, file: UploadFile) -> bytearray:
+        """
+        Lit un upload en une passe dans un tampon à sa taille, que put() garde sans copie.
+        La taille est vérifiée avant toute lecture.
+        """
+        size = upload_size(file)
+        if size > self.max_image_bytes:
+            raise ImageTooLarge(f"Image de {size} octets (max {self.max_image_bytes})")
+        return await run_in_threadpool(_read_into, file.file, size)
+
+    def put(self, data, content_type: str = "image/jpeg", wallet_address: str = None, round_id: str = None) -> str:
+        if len(data) > self.max_image_bytes:
+            raise ImageTooLarge(f"Image de {len(data)} octets (max {self.max_image_bytes})")
+        image_id = uuid.uuid4().hex
+        # bytes et bytearray (read_upload) sont gardés tels quels; une vue est copiée
+        data = data if isinstance(data, (bytes, bytearray)) else bytes(data)
+        image = StoredImage(image_id, data, content_type, wallet_address, round_id)
+        self._images[image_id] = image
+        if round_id is not None:
+            self._by_round.setdefault(round_id, []).append(image_id)
+        self.size += image.size
+        self._schedule_thumbnail(image)
+        self._shrink()
+        return image_id
+
+    def _schedule_thumbnail(self, image: StoredImage):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # hors boucle: miniature calculée à la première demande
+        image.thumbnail_future = loop.run_in_executor(self._executor, make_thumbnail, image.data, self.thumbnail_width)
+        image.thumbnail_future.add_done_callback(lambda future: self._thumbnail_done(image, future))
+
+    def _thumbnail_done(self, image: StoredImage, future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        if self._images.get(image.image_id) is image:
+            image.thumbnail = future.result()
+            self.size += len(image.thumbnail)
+            self._shrink()
+
+    def _shrink(self):
+        for image in list(self._images.values()):
+            if self.size <= self.max_bytes:
+                break
+            self._evict(image)
+
+    def _evict(self, image: StoredImage):
+        if image.data is not None:
+            self.size -= image.size
+            if self.spill_path:
+                if self._spill is None:
+                    self._spill = SpillSegment(self.spill_path, self.spill_bytes)
+                image.spill_start = self._spill.write(image.data)
+            image.data = None
+            if image.spill_start is not None:
+                # La miniature reste en mémoire, l'original est lu depuis le disque
+                self._images.move_to_end(image.image_id)
+                return
+        self._images.pop(image.image_id, None)
+        if image.thumbnail is not None:
+            self.size -= len(image.thumbnail)
+        if image.round_id in self._by_round:
+            ids = self._by_round[image.round_id]
+            ids.remove(image.image_id)
+            if not ids:
+                del self._by_round[image.round_id]
+        self.evictions += 1
+
+    def get(self, image_id: str) -> StoredImage:
+        image = self._images.get(image_id)
+        if image is not None:
+            self._images.move_to_end(image_id)
+        return image
+
+    def original(self, image_id: str) -> bytes:
+        """Contenu de l'image (mémoire ou segment disque), None si elle a été oubliée."""
+        image = self.get(image_id)
+        if image is None:
+            return None
+        if image.data is not None:
+            return image.data
+        data = self._spill.read(image.spill_start, image.size) if self._spill is not None else None
+        if data is None:
+            self._evict(image)
+        return data
+
+    async def thumbnail(self, image_id: str) -> bytes:
+        """Miniature JPEG, attendue si elle est en cours de calcul. None si l'image est inconnue."""
+        image = self.get(image_id)
+        if image is None:
+            return None
+        if image.thumbnail is None:
+            if image.thumbnail_future is None or image.thumbnail_future.cancelled():
+                data = self.original(image_id)
+                if data is None:
+                    return None
+                loop = asyncio.get_running_loop()
+                image.thumbnail_future = loop.run_in_executor(self._executor, make_thumbnail, data, self.thumbnail_width)
+                image.thumbnail_future.add_done_callback(lambda future: self._thumbnail_done(image, future))
+            thumbnail = await asyncio.shield(image.thumbnail_future)
+            return image.thumbnail or thumbnail
+        return image.thumbnail
+
+    def for_round(self, round_id: str) -> list:
+        return [self._images[image_id] for image_id in self._by_round.get(round_id, ())]
+
+    def stats(self) -> dict:
+        return {
+            "images": len(self._images),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "spill": self._spill is not None,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+
+def make_thumbnail(data: bytes, width: int) -> bytes:
+    import cv2
+    import numpy as np
+
+    # Décodage réduit: inutile de décoder en pleine résolution pour une miniature
+    np_image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+    if np_image is None:
+        raise ValueError("Image illisible")
+    height, original_width = np_image.shape[:2]
+    if original_width > width:
+        np_image = cv2.resize(np_image, (width, max(1, round(height * width / original_width))),
+                              interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", np_image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    if not ok:
+        raise ValueError("Encodage de la miniature impossible")
+    return encoded.tobytes()
+
+
+def image_message(image_id: str) -> dict:
+    """Champs ajoutés aux messages des masters à la place de l'image encodée."""
+    return {
+        "image_id": image_id,
+        "image_url": f"/api/images/{image_id}",
+        "thumbnail_url": f"/api/images/{image_id}/thumbnail",
+    }
+
+
+def _read_into(source, size: int) -> bytearray:
+    buffer = bytearray(size)
+    source.seek(0)
+    read = source.readinto(buffer)
+    if read < size:
+        del buffer[read:]
+    return buffer
+
+
+def image_response(request: Request, etag: str, data: bytes, media_type: str) -> Response:
+    """Réponse d'image immuable (un identifiant ne change jamais de contenu) avec ETag."""
+    etag = f'"{etag}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    # Les originaux reçus par upload sont des bytearray: envoyés sans copie par une vue
+    content = memoryview(data) if isinstance(data, bytearray) else data
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+image_store = ImageStore()
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.services.ai import decode_bytes, decode_image, fer_face, fer_classify_batch
+from app.services.metrics import FER_STAGE_SECONDS, FER_BATCH_SIZE
+from app.utils.logger import logger_init
+
+logger = logging.getLogger(__name__)
+logger_init()
+
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "local").lower()
+
+
+class InferenceQueueFull(Exception):
+    """Levée quand la file d'attente d'inférence est pleine."""
+
+
+class EmotionBatcher:
+    """
+    Regroupe les visages arrivant dans une courte fenêtre pour les classer en un seul lot.
+    - Un lot part dès qu'il atteint max_batch_size, ou max_wait secondes après son premier élément.
+    - Chaque appelant récupère uniquement son propre résultat.
+    """
+
+    def __init__(self, run_batch, max_batch_size: int, max_wait: float):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: asyncio.Queue = None
+        self._task: asyncio.Task = None
+        self._inflight = set()
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._collect())
+        future = loop.create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Le lot suivant peut se constituer pendant que celui-ci est calculé
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class EmotionInferenceService:
+    """
+    Service d'inférence émotionnelle.
+    - Charge le modèle d'émotion et le détecteur de visage une seule fois au démarrage.
+    - Décode et détecte les visages dans un pool de threads dédié pour ne pas bloquer la boucle asyncio.
+    - Classe les visages par micro-lots (FER_BATCH_SIZE, FER_BATCH_WAIT_MS).
+    - Limite le nombre de requêtes en attente (workers + profondeur de file).
+    """
+
+    def __init__(self, workers: int = None, queue_depth: int = None, detector_backend: str = None,
+                 max_batch_size: int = None, max_batch_wait_ms: float = None):
+        self.workers = workers or int(os.environ.get("FER_WORKERS", 2))
+        self.queue_depth = queue_depth if queue_depth is not None else int(os.environ.get("FER_QUEUE_DEPTH", 64))
+        self.detector_backend = detector_backend or os.environ.get("FER_DETECTOR", "opencv")
+        max_batch_size = max_batch_size or int(os.environ.get("FER_BATCH_SIZE", 32))
+        max_batch_wait_ms = max_batch_wait_ms if max_batch_wait_ms is not None else float(os.environ.get("FER_BATCH_WAIT_MS", 20))
+        self.batcher = EmotionBatcher(self._classify, max_batch_size, max_batch_wait_ms / 1000)
+        self.pending = 0
+        self.ready = False
+        self._executor = None
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        """Crée le pool de workers et préchauffe les modèles."""
+        async with self._start_lock:
+            if self._executor is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fer")
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, self._load_models)
+            self.ready = True
+            logger.info(f"Modèle d'émotion prêt ({self.workers} workers, file de {self.queue_depth})")
+
+    def _load_models(self):
+        from app.services.fer_backends import cascade_classifiers, emotion_classifier, native_detector
+
+        emotion_classifier()
+        if not native_detector(self.detector_backend):
+            from deepface import DeepFace
+
+            DeepFace.build_model(task="face_detector", model_name=self.detector_backend)
+        else:
+            # OpenCV importé ici, avant les analyses: importé en même temps par plusieurs workers,
+            # le module peut être vu à moitié initialisé (cv2.data absent)
+            cascade_classifiers()
+        # Un premier lot à vide initialise le moteur du classifieur (graphe TensorFlow, tenseurs TFLite...)
+        fer_classify_batch([np.zeros((48, 48), dtype=np.float32)])
+
+    async def stop(self):
+        await self.batcher.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self.ready = False
+
+    async def _classify(self, faces: list) -> list:
+        loop = asyncio.get_running_loop()
+        FER_BATCH_SIZE.observe(len(faces))
+        return await loop.run_in_executor(self._executor, self._classify_batch, faces)
+
+    def _classify_batch(self, faces: list) -> list:
+        with FER_STAGE_SECONDS.time(stage="classify"):
+            return fer_classify_batch(faces)
+
+    def _prepare(self, source) -> np.ndarray:
+        with FER_STAGE_SECONDS.time(stage="decode"):
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                np_image = decode_bytes(source)
+            else:
+                np_image = decode_image(source)
+        with FER_STAGE_SECONDS.time(stage="detect"):
+            return fer_face(np_image, self.detector_backend)
+
+    async def score(self, file) -> dict:
+        """
+        Analyse émotionnelle d'une image, sans bloquer la boucle d'événements.
+        file: UploadFile, ou les octets de l'image s'ils ont déjà été lus (ex: pour être stockés).
+        """
+        if self.pending >= self.workers + self.queue_depth:
+            raise InferenceQueueFull(f"{self.pending} analyses en cours")
+        if self._executor is None:
+            await self.start()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            face = await loop.run_in_executor(self._executor, self._prepare, file)
+            return await self.batcher.submit(face)
+        except Exception as e:
+            return {"error": str(e)}
+        finally:
+            self.pending -= 1
+
+
+def create_emotion_service():
+    """
+    INFERENCE_MODE=local (défaut): modèles chargés dans ce processus.
+    INFERENCE_MODE=remote: analyses déléguées au processus d'inférence (python -m app.inference_worker),
+    la passerelle n'importe ni DeepFace ni TensorFlow.
+    """
+    if INFERENCE_MODE == "remote":
+        from app.services.inference_client import RemoteEmotionService
+
+        return RemoteEmotionService()
+    return EmotionInferenceService()
+
+
+emotion_service = create_emotion_service()
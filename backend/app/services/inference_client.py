@@ -0,0 +1,102 @@
+import asyncio
+import itertools
+import logging
+import os
+
+from app.services.ipc import read_message, write_message
+
+logger = logging.getLogger(__name__)
+
+# Socket Unix du processus d'inférence (python -m app.inference_worker)
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET", "/tmp/aib-inference.sock")
+# Délai maximum (secondes) d'une analyse à distance
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", 30))
+
+
+class RemoteEmotionService:
+    """
+    Même interface que EmotionInferenceService, mais l'analyse est faite par le processus
+    d'inférence, joint par une connexion persistante sur un socket Unix.
+    - Les requêtes sont multiplexées sur la connexion (identifiant par requête).
+    - La connexion est rétablie à la demande si le processus d'inférence redémarre.
+    """
+
+    def __init__(self, socket_path: str = INFERENCE_SOCKET, timeout: float = INFERENCE_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.pending = 0
+        self.ready = False
+        self._ids = itertools.count()
+        self._waiters = {}
+        self._writer: asyncio.StreamWriter = None
+        self._reader_task: asyncio.Task = None
+        self._connect_lock = asyncio.Lock()
+
+    async def start(self):
+        """Se connecte au processus d'inférence; un échec n'empêche pas la passerelle de démarrer."""
+        try:
+            await self._connect()
+        except OSError as e:
+            logger.warning(f"Processus d'inférence injoignable ({self.socket_path}): {e}")
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+            self._reader_task = asyncio.create_task(self._read(reader, self._writer))
+            self.ready = True
+            logger.info(f"Connecté au processus d'inférence: {self.socket_path}")
+
+    async def _read(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header, _ = await read_message(reader)
+                future = self._waiters.pop(header.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(header)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            logger.warning(f"Connexion au processus d'inférence perdue: {e}")
+        finally:
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+                self.ready = False
+            for future in self._waiters.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Processus d'inférence déconnecté"))
+            self._waiters.clear()
+
+    async def stop(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self.ready = False
+
+    async def score(self, file) -> dict:
+        """Analyse émotionnelle d'une image (UploadFile ou octets) par le processus d'inférence."""
+        from app.services.inference import InferenceQueueFull
+
+        data = file if isinstance(file, (bytes, bytearray, memoryview)) else await file.read()
+        self.pending += 1
+        try:
+            await self._connect()
+            request_id = next(self._ids)
+            future = asyncio.get_running_loop().create_future()
+            self._waiters[request_id] = future
+            write_message(self._writer, {"id": request_id, "op": "score"}, data)
+            await self._writer.drain()
+            try:
+                response = await asyncio.wait_for(future, self.timeout)
+            finally:
+                self._waiters.pop(request_id, None)
+        except (OSError, asyncio.TimeoutError) as e:
+            return {"error": f"Processus d'inférence indisponible: {str(e) or 'délai dépassé'}"}
+        finally:
+            self.pending -= 1
+        if response.get("queue_full"):
+            raise InferenceQueueFull(response.get("error", ""))
+        return response["result"]
@@ -0,0 +1,31 @@
+"""
+Canal local entre la passerelle et le processus d'inférence (socket Unix).
+
+Chaque message: 4 octets (big-endian) taille de l'en-tête | 4 octets taille des données |
+en-tête JSON | données brutes (ex: l'image à analyser, sans encodage base64).
+Les requêtes portent un identifiant: plusieurs analyses circulent en même temps sur une connexion.
+"""
+import asyncio
+import json
+import struct
+
+_PREFIX = struct.Struct("!II")
+# Taille maximale des données d'un message (une image)
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple:
+    """Lit un message complet: (en-tête, données). Lève IncompleteReadError si la connexion est fermée."""
+    header_size, payload_size = _PREFIX.unpack(await reader.readexactly(_PREFIX.size))
+    if payload_size > MAX_PAYLOAD:
+        raise ValueError(f"Message trop grand: {payload_size} octets")
+    header = json.loads(await reader.readexactly(header_size))
+    payload = await reader.readexactly(payload_size) if payload_size else b""
+    return header, payload
+
+
+def write_message(writer: asyncio.StreamWriter, header: dict, payload=b""):
+    raw_header = json.dumps(header, separators=(",", ":")).encode()
+    writer.write(_PREFIX.pack(len(raw_header), len(payload)) + raw_header)
+    if payload:
+        writer.write(payload)
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from app.services.admission import AdmissionRejected, DeadlineExceeded
+from app.services.inference import InferenceQueueFull
+from app.services.messages import encode
+
+logger = logging.getLogger(__name__)
+
+# Mode par défaut de /api/game-result: "sync" (réponse après l'analyse) ou "async" (202 + tâche)
+SCORING_MODE = os.environ.get("SCORING_MODE", "sync").lower()
+# Durée (secondes) de conservation d'une tâche terminée
+SCORING_JOB_TTL = float(os.environ.get("SCORING_JOB_TTL", 600))
+# Nombre maximum de tâches conservées
+SCORING_JOBS_MAX = int(os.environ.get("SCORING_JOBS_MAX", 10000))
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "error"
+
+
+class ScoringFailed(Exception):
+    """Levée quand l'analyse d'une image échoue (aucun visage détecté, image illisible...)."""
+
+
+class ScoringJob:
+    __slots__ = ("job_id", "wallet_address", "username", "gesture", "round_id", "image_id",
+                 "status", "result", "error", "created", "finished")
+
+    def __init__(self, wallet_address: str, username: str, gesture: str, round_id: str, image_id: str = None):
+        self.job_id = uuid.uuid4().hex
+        self.wallet_address = wallet_address
+        self.username = username
+        self.gesture = gesture
+        self.round_id = round_id
+        self.image_id = image_id
+        self.status = PENDING
+        self.result: dict = None
+        self.error: str = None
+        self.created = time.time()
+        self.finished: float = None
+
+    def to_dict(self) -> dict:
+        job = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "wallet_address": self.wallet_address,
+            "username": self.username,
+            "gesture": self.gesture,
+            "round_id": self.round_id,
+            "image_id": self.image_id,
+            "created": self.created,
+        }
+        if self.status == DONE:
+            job.update(self.result)
+        elif self.status == FAILED:
+            job["error"] = self.error
+        return job
+
+
+class ScoringJobs:
+    """
+    Analyses émotionnelles exécutées en tâche de fond.
+    - start() rend la main tout de suite: le client reçoit l'identifiant de la tâche (HTTP 202).
+    - Le résultat est poussé au joueur sur son WebSocket ("score_result"); process() se charge de
+      le transmettre aux masters. GET /api/jobs/{job_id} reste disponible en secours.
+    - Une seule tâche par joueur et par manche: un envoi répété renvoie la tâche existante
+      (sauf si elle a échoué). La tâche est réservée (reserve) avant la lecture de l'image,
+      puis lancée (start): deux envois simultanés ne peuvent pas passer tous les deux.
+    - Les tâches terminées sont oubliées après SCORING_JOB_TTL secondes (ou au-delà de SCORING_JOBS_MAX).
+    """
+
+    def __init__(self, manager, process, ttl: float = SCORING_JOB_TTL, max_jobs: int = SCORING_JOBS_MAX):
+        self.manager = manager
+        self.process = process  # async (job, data) -> résultat (dict)
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict = OrderedDict()
+        self._by_round = {}  # (wallet_address, round_id) -> job_id
+        self._tasks = set()
+
+    def get(self, job_id: str) -> ScoringJob:
+        return self._jobs.get(job_id)
+
+    def find(self, wallet_address: str, round_id: str) -> ScoringJob:
+        """Tâche déjà soumise par ce joueur pour cette manche (None si aucune, ou si elle a échoué)."""
+        if round_id is None:
+            return None
+        job = self._jobs.get(self._by_round.get((wallet_address, round_id)))
+        return job if job is not None and job.status != FAILED else None
+
+    def reserve(self, wallet_address: str, username: str, gesture: str, round_id: str) -> ScoringJob:
+        """Enregistre une tâche en attente de son image (find() la retrouve dès maintenant)."""
+        self._expire()
+        job = ScoringJob(wallet_address, username, gesture, round_id)
+        self._jobs[job.job_id] = job
+        if round_id is not None:
+            self._by_round[(wallet_address, round_id)] = job.job_id
+        return job
+
+    def start(self, job: ScoringJob, data: bytes, image_id: str) -> ScoringJob:
+        job.image_id = image_id
+        task = asyncio.create_task(self._run(job, data))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def cancel(self, job: ScoringJob):
+        """Oublie une tâche réservée qui ne sera pas lancée (image illisible, trop grande...)."""
+        if self._jobs.get(job.job_id) is job:
+            self._forget(job)
+
+    async def _run(self, job: ScoringJob, data: bytes):
+        job.status = RUNNING
+        try:
+            job.result = await self.process(job, data)
+            job.status = DONE
+        except (InferenceQueueFull, AdmissionRejected) as e:
+            logger.warning(f"Analyse saturée (tâche {job.job_id}): {e}")
+            job.error, job.status = "Analyse émotionnelle saturée, réessayez", FAILED
+        except DeadlineExceeded:
+            logger.debug(f"Tâche {job.job_id} abandonnée: manche {job.round_id} terminée")
+            job.error, job.status = "Manche terminée, résultat non analysé", FAILED
+        except ScoringFailed as e:
+            logger.info(f"Analyse impossible (tâche {job.job_id}): {e}")
+            job.error, job.status = str(e), FAILED
+        except Exception as e:
+            logger.error(f"Erreur de la tâche d'analyse {job.job_id}: {e}")
+            job.error, job.status = str(e), FAILED
+        job.finished = time.time()
+        await self.manager.send_personal_message(encode({"type": "score_result", **job.to_dict()}),
+                                                 job.wallet_address)
+
+    def _expire(self):
+        now = time.time()
+        for job in list(self._jobs.values()):
+            full = len(self._jobs) >= self.max_jobs
+            if job.finished is None:
+                if not full:
+                    break
+                continue  # une tâche en cours n'est jamais oubliée
+            if not full and now - job.finished < self.ttl:
+                break
+            self._forget(job)
+
+    def _forget(self, job: ScoringJob):
+        del self._jobs[job.job_id]
+        key = (job.wallet_address, job.round_id)
+        if self._by_round.get(key) == job.job_id:
+            del self._by_round[key]
+
+    def stats(self) -> dict:
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {"jobs": len(self._jobs), **counts}
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
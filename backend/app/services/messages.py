@@ -0,0 +1,44 @@
+import json
+import struct
+
+try:
+    import orjson
+except ImportError:  # orjson est optionnel, json standard sinon
+    orjson = None
+
+
+def encode(payload: dict) -> str:
+    """
+    Sérialise un message sortant une seule fois.
+    La chaîne obtenue est partagée par tous les destinataires.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+# Trames binaires envoyées par les clients sur la WebSocket:
+#   1 octet: type de trame | 2 octets (big-endian): taille de l'en-tête | en-tête JSON (utf-8) | données brutes
+FRAME_GAME_RESULT = 1
+_FRAME_PREFIX = struct.Struct("!BH")
+
+
+def decode_frame(data: bytes) -> tuple:
+    """Découpe une trame binaire en (type, en-tête, données) sans copier les données."""
+    if len(data) < _FRAME_PREFIX.size:
+        raise ValueError("Trame trop courte")
+    frame_type, header_size = _FRAME_PREFIX.unpack_from(data)
+    header_end = _FRAME_PREFIX.size + header_size
+    if len(data) < header_end:
+        raise ValueError("En-tête de trame tronqué")
+    view = memoryview(data)
+    header = json.loads(bytes(view[_FRAME_PREFIX.size:header_end])) if header_size else {}
+    if not isinstance(header, dict):
+        raise ValueError("En-tête de trame invalide")
+    return frame_type, header, view[header_end:]
+
+
+def encode_frame(frame_type: int, header: dict, payload: bytes) -> bytes:
+    """Construit une trame binaire (utilisé par les outils de test et de charge)."""
+    raw_header = json.dumps(header, separators=(",", ":")).encode()
+    return _FRAME_PREFIX.pack(frame_type, len(raw_header)) + raw_header + payload
@@ -0,0 +1,209 @@
+"""
+Métriques au format texte Prometheus.
+Chaque thread écrit dans sa propre partition (aucun verrou à l'enregistrement d'un échantillon);
+les partitions sont additionnées uniquement à la lecture de /metrics.
+"""
+
+import time
+from bisect import bisect_left
+from threading import get_ident
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY = []
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._shards = {}
+        REGISTRY.append(self)
+
+    def _shard(self) -> dict:
+        ident = get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            shard = self._shards.setdefault(ident, {})
+        return shard
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0.0) + amount
+
+    def collect(self) -> list:
+        totals = {}
+        for shard in list(self._shards.values()):
+            for key, value in shard.copy().items():
+                totals[key] = totals.get(key, 0.0) + value
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in totals.items()]
+
+
+class Gauge(_Metric):
+    """Jauge écrite depuis la boucle asyncio, ou calculée à la lecture via function."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self._values = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def collect(self) -> list:
+        if self.function is not None:
+            return self.header() + [f"{self.name} {float(self.function())}"]
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}"
+                                for k, v in self._values.copy().items()]
+
+
+class CounterFunction(_Metric):
+    """Compteur dont la valeur est lue à la demande sur un objet existant."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, function):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def collect(self) -> list:
+        return self.header() + [f"{self.name} {float(self.function())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # compteurs par intervalle (+Inf compris), somme, nombre
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def collect(self) -> list:
+        totals = {}
+        for shard in list(self._shards.values()):
+            for key, state in shard.copy().items():
+                total = totals.setdefault(key, [0] * len(state))
+                for i, value in enumerate(list(state)):
+                    total[i] += value
+        lines = self.header()
+        for key, state in totals.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+# Requêtes HTTP
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Durée des requêtes HTTP par route",
+                                 ("method", "route", "status"))
+# Analyse émotionnelle
+FER_STAGE_SECONDS = Histogram("fer_stage_duration_seconds", "Durée des étapes de fer_score",
+                              ("stage",))
+FER_BATCH_SIZE = Histogram("fer_batch_size", "Nombre de visages par lot du classifieur",
+                           buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+# Synthèse vocale
+TTS_SYNTHESIS_SECONDS = Histogram("tts_synthesis_duration_seconds", "Durée de synthèse TTS", ("engine",))
+# XRPL
+XRPL_REQUEST_SECONDS = Histogram("xrpl_request_duration_seconds", "Durée des appels XRPL", ("method",))
+XRPL_ERRORS = Counter("xrpl_errors_total", "Erreurs des appels XRPL", ("method", "kind"))
+# WebSockets
+WS_BROADCAST_SECONDS = Histogram("ws_broadcast_fanout_seconds", "Durée de mise en file d'une diffusion",
+                                 ("target",))
+WS_SEND_SECONDS = Histogram("ws_send_duration_seconds", "Durée d'envoi d'un message à une socket")
+WS_EVICTIONS = Counter("ws_evictions_total", "Connexions évincées (trop lentes ou mortes)")
+# Contrôle d'admission
+ADMISSION_DECISIONS = Counter("admission_decisions_total", "Décisions du contrôle d'admission",
+                              ("priority", "decision"))
+ADMISSION_WAIT_SECONDS = Histogram("admission_wait_seconds", "Attente avant admission", ("priority",))
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: mesure la durée de chaque requête HTTP, par modèle de route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=scope["method"],
+                                         route=route.path if route is not None else "unmatched",
+                                         status=status)
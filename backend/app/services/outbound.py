@@ -0,0 +1,84 @@
+import asyncio
+import itertools
+import logging
+import os
+from collections import OrderedDict
+
+from fastapi import WebSocket
+
+from app.services.metrics import WS_SEND_SECONDS, WS_EVICTIONS
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximum de messages en attente par connexion avant éviction
+OUTBOUND_QUEUE_SIZE = int(os.environ.get("WS_OUTBOUND_QUEUE", 64))
+# Délai maximum (secondes) pour envoyer un message à une connexion
+SEND_TIMEOUT = float(os.environ.get("WS_SEND_TIMEOUT", 5))
+
+
+class OutboundChannel:
+    """
+    File d'envoi bornée d'une WebSocket, vidée par une tâche d'écriture dédiée.
+    - send() ne bloque jamais: le message est mis en file et l'appelant continue.
+    - Un message avec une coalesce_key remplace le message en attente de même clé
+      (ex: une ancienne valeur de compte à rebours n'a plus d'intérêt).
+    - La connexion est évincée si sa file déborde ou si un envoi dépasse send_timeout.
+    """
+
+    def __init__(self, websocket: WebSocket, on_evict=None,
+                 max_queue: int = OUTBOUND_QUEUE_SIZE, send_timeout: float = SEND_TIMEOUT):
+        self.websocket = websocket
+        self.on_evict = on_evict
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.closed = False
+        self._pending: OrderedDict = OrderedDict()
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._writer())
+
+    def send(self, message: str, coalesce_key: str = None) -> bool:
+        """Met un message en file. Retourne False si la connexion est fermée ou évincée."""
+        if self.closed:
+            return False
+        if coalesce_key is not None and coalesce_key in self._pending:
+            self._pending[coalesce_key] = message
+            return True
+        if len(self._pending) >= self.max_queue:
+            self.evict(f"file d'envoi pleine ({self.max_queue} messages)")
+            return False
+        key = coalesce_key if coalesce_key is not None else (None, next(self._sequence))
+        self._pending[key] = message
+        self._wakeup.set()
+        return True
+
+    async def _writer(self):
+        while not self.closed:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            _, message = self._pending.popitem(last=False)
+            try:
+                with WS_SEND_SECONDS.time():
+                    await asyncio.wait_for(self.websocket.send_text(message), self.send_timeout)
+            except asyncio.TimeoutError:
+                self.evict(f"envoi plus long que {self.send_timeout}s")
+            except Exception as e:
+                self.evict(f"erreur d'envoi: {e}")
+
+    def evict(self, reason: str):
+        if self.closed:
+            return
+        logger.warning(f"Connexion évincée: {reason}")
+        WS_EVICTIONS.inc()
+        self.close()
+        if self.on_evict is not None:
+            self.on_evict(self)
+
+    def close(self):
+        """Arrête la tâche d'écriture et abandonne les messages en attente."""
+        self.closed = True
+        self._pending.clear()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
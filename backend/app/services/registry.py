@@ -0,0 +1,142 @@
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+
+
+class Player:
+    """Un joueur inscrit. __slots__: pas de dict par instance."""
+
+    __slots__ = ("wallet_address", "username", "wallet_seed", "xrp_balance", "is_connected", "round_id")
+
+    def __init__(self, wallet_address: str, username: str = "", wallet_seed: str = "",
+                 xrp_balance: float = 0.0, is_connected: bool = False, round_id: str = None):
+        self.wallet_address = wallet_address
+        self.username = username
+        self.wallet_seed = wallet_seed
+        self.xrp_balance = xrp_balance
+        self.is_connected = is_connected
+        self.round_id = round_id
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+FIELDS = frozenset(Player.__slots__)
+
+
+class PlayerRegistry:
+    """
+    Registre des joueurs inscrits, indexé par wallet.
+    - Index secondaires: par username, par état de connexion et par manche jouée.
+      Les index sont des dict (ordre d'inscription conservé, ajout et retrait en O(1)).
+    - version est incrémentée à chaque modification: détection de changement sans comparer les données.
+    - Les champs ne se modifient que par add() / update() pour garder les index cohérents.
+    """
+
+    def __init__(self):
+        self._players: Dict[str, Player] = {}
+        self._by_username: Dict[str, Dict[str, None]] = {}
+        self._by_round: Dict[str, Dict[str, None]] = {}
+        self._connected: Dict[str, Player] = {}
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def __contains__(self, wallet_address: str) -> bool:
+        return wallet_address in self._players
+
+    def __iter__(self) -> Iterator[Player]:
+        return iter(self._players.values())
+
+    def get(self, wallet_address: str) -> Optional[Player]:
+        return self._players.get(wallet_address)
+
+    @property
+    def connected_count(self) -> int:
+        return len(self._connected)
+
+    def connected(self) -> Iterator[Player]:
+        return iter(self._connected.values())
+
+    def by_username(self, username: str) -> List[Player]:
+        return [self._players[w] for w in self._by_username.get(username, ())]
+
+    def in_round(self, round_id: str) -> List[Player]:
+        return [self._players[w] for w in self._by_round.get(round_id, ())]
+
+    def add(self, wallet_address: str, fields: dict) -> Player:
+        """Inscrit (ou réinscrit) un joueur."""
+        self.remove(wallet_address)
+        player = Player(wallet_address)
+        self._players[wallet_address] = player
+        self._index(player)
+        self.update(wallet_address, fields)
+        self.version += 1
+        return player
+
+    def remove(self, wallet_address: str):
+        player = self._players.pop(wallet_address, None)
+        if player is None:
+            return
+        self._unindex(player)
+        self.version += 1
+
+    def update(self, wallet_address: str, fields: dict) -> dict:
+        """Modifie un joueur inscrit; retourne les champs réellement changés."""
+        player = self._players.get(wallet_address)
+        if player is None:
+            return {}
+        changed = {key: value for key, value in fields.items()
+                   if key in FIELDS and key != "wallet_address" and getattr(player, key) != value}
+        if changed:
+            self._unindex(player)
+            for key, value in changed.items():
+                setattr(player, key, value)
+            self._index(player)
+            self.version += 1
+        return changed
+
+    def _index(self, player: Player):
+        self._by_username.setdefault(player.username, {})[player.wallet_address] = None
+        if player.round_id is not None:
+            self._by_round.setdefault(player.round_id, {})[player.wallet_address] = None
+        if player.is_connected:
+            self._connected[player.wallet_address] = player
+
+    def _unindex(self, player: Player):
+        for index, key in ((self._by_username, player.username), (self._by_round, player.round_id)):
+            wallets = index.get(key)
+            if wallets is not None:
+                wallets.pop(player.wallet_address, None)
+                if not wallets:
+                    del index[key]
+        self._connected.pop(player.wallet_address, None)
+
+    def snapshot(self) -> List[dict]:
+        return [player.to_dict() for player in self._players.values()]
+
+    def page(self, offset: int = 0, limit: int = 100, connected: bool = None,
+             username: str = None, round_id: str = None) -> tuple:
+        """
+        Retourne (total, joueurs de la page) pour les filtres donnés.
+        Part de l'index le plus sélectif, puis applique les autres filtres en un seul passage.
+        """
+        if username is not None:
+            candidates = self.by_username(username)
+        elif round_id is not None:
+            candidates = self.in_round(round_id)
+        elif connected:
+            candidates = self._connected.values()
+        else:
+            candidates = self._players.values()
+
+        filters = []
+        if connected is not None:
+            filters.append(lambda p: p.is_connected == connected)
+        if round_id is not None and username is not None:
+            filters.append(lambda p: p.round_id == round_id)
+        if not filters or (connected and username is None and round_id is None):
+            # L'index choisi suffit: total connu sans parcourir les joueurs
+            return len(candidates), list(islice(candidates, offset, offset + limit))
+        matching = [p for p in candidates if all(f(p) for f in filters)]
+        return len(matching), matching[offset:offset + limit]
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import math
+import os
+import time
+import uuid
+
+from app.services.messages import encode
+from app.services.state import state_backend
+
+logger = logging.getLogger(__name__)
+
+# Intervalle (secondes) des messages de resynchronisation du compte à rebours: les clients
+# décomptent localement depuis round_start, ces messages ne corrigent que la dérive
+COUNTDOWN_RESYNC_INTERVAL = float(os.environ.get("COUNTDOWN_RESYNC_INTERVAL", 5))
+
+
+class RoundError(Exception):
+    """Opération impossible dans l'état actuel de la manche."""
+
+
+class RoundNotFound(RoundError):
+    """Identifiant de manche inconnu."""
+
+
+class Round:
+    """Une manche: un compte à rebours de duration secondes."""
+
+    def __init__(self, duration: int, round_id: str = None):
+        self.round_id = round_id or uuid.uuid4().hex[:12]
+        self.duration = duration
+        self.state = "running"  # running, paused, cancelled, finished
+        self.remaining = float(duration)  # secondes restantes au moment de la pause
+        self.deadline = None  # fin de la manche, horloge monotone de la boucle
+        self.ends_at = None  # fin de la manche, horloge murale (secondes epoch)
+
+    def time_left(self, now: float) -> float:
+        if self.state == "running":
+            return max(0.0, self.deadline - now)
+        if self.state == "paused":
+            return self.remaining
+        return 0.0
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "round_id": self.round_id,
+            "duration": self.duration,
+            "state": self.state,
+            "remaining": round(self.time_left(now), 3),
+            "ends_at": self.ends_at,
+        }
+
+    def to_state(self) -> dict:
+        """État partagé entre workers (sans l'échéance monotone, propre à chaque processus)."""
+        return {
+            "round_id": self.round_id,
+            "duration": self.duration,
+            "state": self.state,
+            "remaining": self.remaining,
+            "ends_at": self.ends_at,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict, now: float) -> "Round":
+        current = cls(state["duration"], state["round_id"])
+        current.state = state["state"]
+        current.remaining = state["remaining"]
+        current.ends_at = state["ends_at"]
+        if current.ends_at is not None:
+            current.deadline = now + (current.ends_at - time.time())
+        return current
+
+
+class RoundScheduler:
+    """
+    Planifie les manches côté serveur.
+    - Une seule manche active à la fois.
+    - Au démarrage, un message round_start donne l'heure de fin: les clients décomptent localement.
+    - Des messages countdown de resynchronisation sont envoyés à échéances fixes de l'horloge
+      monotone (pas de dérive cumulée), la valeur 0 est toujours envoyée en fin de manche.
+    - Une connexion arrivée pendant la manche (retardataire, reconnexion) reçoit son état
+      (state_message, à brancher sur ConnectionManager.on_connect).
+    - Avec plusieurs workers, la manche est réservée et enregistrée sur le backend d'état partagé;
+      le worker qui démarre ou reprend la manche envoie les resynchronisations, les autres
+      suivent son état via les événements "round".
+    """
+
+    def __init__(self, manager, resync_interval: float = COUNTDOWN_RESYNC_INTERVAL, backend=state_backend):
+        self.manager = manager
+        self.backend = backend
+        self.resync_interval = resync_interval
+        self.current: Round = None
+        self._task: asyncio.Task = None
+        self.on_finished = []  # fonctions appelées avec la manche à la fin du compte à rebours
+
+    async def restore(self):
+        """Reprend la manche enregistrée et suit les changements faits par les autres workers."""
+        self.backend.subscribe("round", self._on_remote_round)
+        state = await self.backend.load_round()
+        if state is not None:
+            self.current = Round.from_state(state, self.now())
+
+    def _on_remote_round(self, state: dict):
+        # Un autre worker a changé l'état de la manche: c'est lui qui la fait avancer désormais
+        self._stop_task()
+        previous = self.current
+        self.current = Round.from_state(state, self.now())
+        if self.current.state == "finished" and (previous is None or previous.round_id != self.current.round_id
+                                                 or previous.state != "finished"):
+            self._finished(self.current)
+
+    def _finished(self, current: Round):
+        for callback in self.on_finished:
+            try:
+                callback(current)
+            except Exception as e:
+                logger.error(f"Erreur en fin de manche {current.round_id}: {e}")
+
+    async def _sync(self, current: Round):
+        state = current.to_state()
+        await self.backend.save_round(state)
+        self.backend.publish("round", state)
+
+    def now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    @property
+    def active(self) -> bool:
+        return self.current is not None and self.current.state in ("running", "paused")
+
+    def get(self, round_id: str) -> Round:
+        if self.current is None or self.current.round_id != round_id:
+            raise RoundNotFound("Manche inconnue")
+        return self.current
+
+    async def start(self, duration: int) -> Round:
+        candidate = Round(duration)
+        candidate.ends_at = time.time() + duration
+        if not await self.backend.claim_round(candidate.to_state()):
+            # La manche en cours peut appartenir à un autre worker: l'état partagé fait foi
+            state = await self.backend.load_round()
+            raise RoundError(f"Une manche est déjà en cours: {state['round_id'] if state else '?'}")
+        self._stop_task()
+        self.current = candidate
+        await self._launch(self.current)
+        logger.info(f"Manche {self.current.round_id} démarrée ({duration}s)")
+        return self.current
+
+    async def pause(self, round_id: str) -> Round:
+        current = self.get(round_id)
+        if current.state != "running":
+            raise RoundError("La manche n'est pas en cours")
+        current.remaining = current.time_left(self.now())
+        current.state = "paused"
+        self._stop_task()
+        await self._sync(current)
+        await self._broadcast({"type": "round_paused", "round_id": round_id,
+                               "remaining": round(current.remaining, 3)})
+        return current
+
+    async def resume(self, round_id: str) -> Round:
+        current = self.get(round_id)
+        if current.state != "paused":
+            raise RoundError("La manche n'est pas en pause")
+        current.state = "running"
+        await self._launch(current)
+        return current
+
+    async def cancel(self, round_id: str) -> Round:
+        current = self.get(round_id)
+        if not self.active:
+            raise RoundError("La manche est déjà terminée")
+        current.state = "cancelled"
+        self._stop_task()
+        await self._sync(current)
+        await self._broadcast({"type": "round_cancelled", "round_id": round_id})
+        return current
+
+    async def _launch(self, current: Round):
+        current.deadline = self.now() + current.remaining
+        current.ends_at = time.time() + current.remaining
+        await self._sync(current)
+        await self._broadcast(self._start_payload(current))
+        self._task = asyncio.create_task(self._run(current))
+
+    def _start_payload(self, current: Round) -> dict:
+        return {
+            "type": "round_start",
+            "round_id": current.round_id,
+            "duration": current.duration,
+            "remaining": round(current.time_left(self.now()), 3),
+            "ends_at": current.ends_at,
+            "server_time": time.time(),
+        }
+
+    def state_message(self) -> str:
+        """Manche en cours pour une nouvelle connexion: round_start ou round_paused (None sinon)."""
+        current = self.current
+        if current is None or not self.active:
+            return None
+        if current.state == "paused":
+            return encode({"type": "round_paused", "round_id": current.round_id,
+                           "remaining": round(current.remaining, 3)})
+        return encode(self._start_payload(current))
+
+    def _stop_task(self):
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self, current: Round):
+        """Envoie les resynchronisations aux échéances deadline - k * intervalle."""
+        loop = asyncio.get_running_loop()
+        while True:
+            left = current.deadline - loop.time()
+            value = max(0, math.ceil(left - 1e-3))
+            await self.manager.broadcast_countdown(encode({
+                "type": "countdown", "value": value, "round_id": current.round_id
+            }))
+            if value == 0:
+                break
+            # Prochaine échéance: la seconde entière suivante alignée sur la fin de manche
+            steps = max(1, math.ceil(self.resync_interval))
+            next_value = max(0, value - steps)
+            await asyncio.sleep(max(0.0, current.deadline - next_value - loop.time()))
+        current.state = "finished"
+        await self._sync(current)
+        self._finished(current)
+        logger.info(f"Manche {current.round_id} terminée")
+
+    async def _broadcast(self, payload: dict):
+        message = encode(payload)
+        await self.manager.broadcast(message)
+        await self.manager.broadcast_masters(message)
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from app.services.messages import encode
+from app.services.state import state_backend
+
+logger = logging.getLogger(__name__)
+
+# Intervalle minimum (secondes) entre deux mises à jour du classement envoyées aux masters
+SCOREBOARD_INTERVAL = float(os.environ.get("SCOREBOARD_INTERVAL", 0.1))
+# Nombre d'entrées du haut du classement jointes à chaque mise à jour
+SCOREBOARD_TOP = int(os.environ.get("SCOREBOARD_TOP", 20))
+# Délai (secondes) après la fin du compte à rebours avant le classement final
+ROUND_RESULTS_GRACE = float(os.environ.get("ROUND_RESULTS_GRACE", 3))
+# Nombre de manches dont les résultats sont conservés
+ROUND_HISTORY = int(os.environ.get("ROUND_HISTORY", 10))
+
+GESTURES = ("pierre", "feuille", "ciseau")  # indices utilisés par /save-last-result
+BEATS = {"ciseau": "feuille", "feuille": "pierre", "pierre": "ciseau"}
+
+
+def normalize_gesture(gesture) -> str:
+    """0/1/2, "Pierre", "Ciseaux"... -> "pierre", "feuille", "ciseau" (sinon la valeur en minuscules)."""
+    if isinstance(gesture, int):
+        return GESTURES[gesture] if 0 <= gesture < len(GESTURES) else str(gesture)
+    gesture = str(gesture).strip().lower()
+    return "ciseau" if gesture == "ciseaux" else gesture
+
+
+def game_outcome(player_gesture: str, master_gesture: str) -> str:
+    """Même règle que le client (lib/gestures.ts): reproduire ou battre le geste du master gagne."""
+    player, master = normalize_gesture(player_gesture), normalize_gesture(master_gesture)
+    if player not in BEATS or master not in BEATS:
+        return "invalide"
+    if player == master or BEATS[player] == master:
+        return "gagné"
+    return "perdu"
+
+
+class PlayerResult:
+    __slots__ = ("wallet_address", "username", "gesture", "emotion_score", "countdown_value",
+                 "image_id", "outcome", "order")
+
+    def __init__(self, wallet_address: str, order: int):
+        self.wallet_address = wallet_address
+        self.username = None
+        self.gesture = None
+        self.emotion_score = 0.0
+        self.countdown_value = None
+        self.image_id = None
+        self.outcome = None
+        self.order = order  # ordre d'arrivée, départage les égalités
+
+    def sort_key(self) -> tuple:
+        return (self.outcome != "gagné", -(self.emotion_score or 0.0), self.order, self.wallet_address)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__ if field != "order"}
+
+
+FIELDS = frozenset(PlayerResult.__slots__) - {"wallet_address", "outcome", "order"}
+
+
+class RoundResults:
+    """Résultats d'une manche et classement maintenu trié à chaque résultat."""
+
+    def __init__(self, round_id: str):
+        self.round_id = round_id
+        self.master_gesture: str = None
+        self.completed = False
+        self.results = {}
+        self._ranking = []  # clés de tri, triées
+        self.wins = 0
+
+    def record(self, wallet_address: str, fields: dict) -> PlayerResult:
+        result = self.results.get(wallet_address)
+        if result is None:
+            result = self.results[wallet_address] = PlayerResult(wallet_address, len(self.results))
+        else:
+            self._unrank(result)
+        for key, value in fields.items():
+            if key in FIELDS:
+                setattr(result, key, value)
+        if self.master_gesture is not None and result.gesture is not None:
+            result.outcome = game_outcome(result.gesture, self.master_gesture)
+        self._rank(result)
+        return result
+
+    def set_master_gesture(self, gesture: str):
+        """Recalcule l'issue de chaque joueur (une fois par manche) et reconstruit le classement."""
+        self.master_gesture = normalize_gesture(gesture)
+        self.wins = 0
+        for result in self.results.values():
+            if result.gesture is not None:
+                result.outcome = game_outcome(result.gesture, self.master_gesture)
+            self.wins += result.outcome == "gagné"
+        self._ranking = sorted(result.sort_key() for result in self.results.values())
+
+    def _rank(self, result: PlayerResult):
+        insort(self._ranking, result.sort_key())
+        self.wins += result.outcome == "gagné"
+
+    def _unrank(self, result: PlayerResult):
+        key = result.sort_key()
+        index = bisect_left(self._ranking, key)
+        if index < len(self._ranking) and self._ranking[index] == key:
+            del self._ranking[index]
+        self.wins -= result.outcome == "gagné"
+
+    def rank(self, wallet_address: str) -> int:
+        result = self.results.get(wallet_address)
+        if result is None:
+            return None
+        return bisect_left(self._ranking, result.sort_key()) + 1
+
+    def leaderboard(self, limit: int = None) -> list:
+        keys = self._ranking if limit is None else self._ranking[:limit]
+        return [{**self.results[key[-1]].to_dict(), "rank": rank} for rank, key in enumerate(keys, 1)]
+
+    def summary(self) -> dict:
+        return {
+            "round_id": self.round_id,
+            "master_gesture": self.master_gesture,
+            "results": len(self.results),
+            "wins": self.wins,
+        }
+
+
+class RoundAggregator:
+    """
+    Agrège les résultats des joueurs par manche et envoie aux masters des mises à jour groupées.
+    - Les résultats arrivant dans un même intervalle (SCOREBOARD_INTERVAL) partent en un seul
+      message "scoreboard": les changements et le haut du classement.
+    - Un message "round_complete" donne le classement complet ROUND_RESULTS_GRACE secondes après
+      la fin du compte à rebours, puis à nouveau si le geste du master arrive plus tard.
+    - L'issue de chaque joueur (gagné / perdu) est calculée côté serveur contre le geste du master.
+    - Avec plusieurs workers, chaque résultat est publié: chaque worker tient le même classement
+      et l'envoie à ses propres masters.
+    """
+
+    def __init__(self, manager, backend=state_backend, interval: float = SCOREBOARD_INTERVAL,
+                 grace: float = ROUND_RESULTS_GRACE, history: int = ROUND_HISTORY):
+        self.manager = manager
+        self.backend = backend
+        self.interval = interval
+        self.grace = grace
+        self.history = history
+        self.rounds: OrderedDict = OrderedDict()
+        self.seq = 0
+        self._pending = {}  # round_id -> {wallet_address: résultat modifié}
+        self._flush_handle: asyncio.TimerHandle = None
+        self._last_flush = 0.0
+
+    def start(self):
+        self.backend.subscribe("round_result", self._on_remote_result)
+        self.backend.subscribe("round_master", self._on_remote_master)
+
+    def get(self, round_id: str) -> RoundResults:
+        return self.rounds.get(round_id)
+
+    def _round(self, round_id: str) -> RoundResults:
+        results = self.rounds.get(round_id)
+        if results is None:
+            results = self.rounds[round_id] = RoundResults(round_id)
+            while len(self.rounds) > self.history:
+                old_id, _ = self.rounds.popitem(last=False)
+                self._pending.pop(old_id, None)
+        return results
+
+    def record(self, round_id: str, wallet_address: str, **fields) -> PlayerResult:
+        """Enregistre (ou complète) le résultat d'un joueur pour une manche."""
+        self.backend.publish("round_result", {"round_id": round_id, "wallet_address": wallet_address,
+                                              "fields": fields})
+        return self._record(round_id, wallet_address, fields)
+
+    def _record(self, round_id: str, wallet_address: str, fields: dict) -> PlayerResult:
+        result = self._round(round_id).record(wallet_address, fields)
+        self._pending.setdefault(round_id, {})[wallet_address] = result
+        self._schedule_flush()
+        return result
+
+    def _on_remote_result(self, payload: dict):
+        self._record(payload["round_id"], payload["wallet_address"], payload["fields"])
+
+    async def set_master_gesture(self, round_id: str, gesture) -> RoundResults:
+        self.backend.publish("round_master", {"round_id": round_id, "gesture": gesture})
+        return await self._set_master_gesture(round_id, gesture)
+
+    async def _set_master_gesture(self, round_id: str, gesture) -> RoundResults:
+        results = self._round(round_id)
+        results.set_master_gesture(gesture)
+        if results.completed:
+            await self.complete(round_id)
+        else:
+            # Toutes les issues ont changé: seul le haut du classement est renvoyé
+            self._pending.setdefault(round_id, {})
+            self._schedule_flush()
+        return results
+
+    def _on_remote_master(self, payload: dict):
+        asyncio.create_task(self._set_master_gesture(payload["round_id"], payload["gesture"]))
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        delay = max(0.0, self._last_flush + self.interval - loop.time())
+        self._flush_handle = loop.call_later(delay, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        self._last_flush = asyncio.get_running_loop().time()
+        pending, self._pending = self._pending, {}
+        for round_id, changed in pending.items():
+            results = self.rounds.get(round_id)
+            if results is None:
+                continue
+            self.seq += 1
+            self.manager.broadcast_local("masters", encode({
+                "type": "scoreboard",
+                "seq": self.seq,
+                **results.summary(),
+                "changes": [{**result.to_dict(), "rank": results.rank(wallet_address)}
+                            for wallet_address, result in changed.items()],
+                "top": results.leaderboard(SCOREBOARD_TOP),
+            }))
+
+    def round_finished(self, current):
+        """Appelé à la fin du compte à rebours: le classement final part après le délai de grâce."""
+        asyncio.get_running_loop().call_later(self.grace, lambda: asyncio.create_task(self.complete(current.round_id)))
+
+    async def complete(self, round_id: str):
+        results = self._round(round_id)
+        results.completed = True
+        self._pending.pop(round_id, None)
+        self.seq += 1
+        self.manager.broadcast_local("masters", encode({
+            "type": "round_complete",
+            "seq": self.seq,
+            **results.summary(),
+            "leaderboard": results.leaderboard(),
+            "timestamp": time.time(),
+        }))
+        logger.info(f"Manche {round_id} terminée: {len(results.results)} résultats, {results.wins} gagnants")
@@ -0,0 +1,204 @@
+"""
+État partagé entre workers et diffusion des événements (pub/sub).
+
+Chaque worker garde une copie locale du registre des joueurs et de la manche en cours, et ses
+propres sockets. Les changements sont appliqués localement puis publiés: les autres workers les
+rejouent sur leur copie et sur leurs sockets.
+- STATE_BACKEND=memory (défaut): un seul processus, rien n'est publié.
+- STATE_BACKEND=redis: état central et pub/sub Redis (REDIS_URL), permet plusieurs workers ou nœuds.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "memory").lower()
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+# Préfixe des clés et du canal Redis (plusieurs déploiements sur un même serveur)
+STATE_PREFIX = os.environ.get("STATE_PREFIX", "aib")
+
+# Réserve la manche seulement si aucune autre n'est en cours (ou en pause)
+_CLAIM_ROUND_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local r = cjson.decode(current)
+    if r.state == 'paused' then return 0 end
+    if r.state == 'running' and tonumber(r.ends_at) > tonumber(ARGV[2]) then return 0 end
+end
+redis.call('SET', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class MemoryStateBackend:
+    """État local à un seul processus: la copie locale de chaque worker fait foi."""
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex[:8]
+        self._handlers = {}
+        self._round: dict = None
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def subscribe(self, kind: str, handler):
+        """handler(payload) est appelé pour chaque événement de ce type publié par un autre worker."""
+        self._handlers[kind] = handler
+
+    def publish(self, kind: str, payload: dict):
+        """Aucun autre worker: rien à relayer."""
+
+    async def load_clients(self) -> dict:
+        return {}
+
+    async def load_client(self, wallet_address: str) -> dict:
+        return None
+
+    def save_client(self, wallet_address: str, fields: dict):
+        pass
+
+    async def load_round(self) -> dict:
+        return self._round
+
+    async def claim_round(self, state: dict) -> bool:
+        current = self._round
+        if current is not None and (current["state"] == "paused" or
+                                    (current["state"] == "running" and current["ends_at"] > time.time())):
+            return False
+        self._round = state
+        return True
+
+    async def save_round(self, state: dict):
+        self._round = state
+
+
+class RedisStateBackend(MemoryStateBackend):
+    """
+    État central dans Redis et relais des événements par pub/sub.
+    - Joueurs: un hash par wallet ({prefix}:client:{wallet}) et l'ensemble {prefix}:clients.
+    - Manche en cours: {prefix}:round (JSON), réservée atomiquement par un script Lua.
+    - Événements: canal {prefix}:events; chaque worker ignore ses propres messages.
+    - Les écritures et publications sont mises en file et envoyées dans l'ordre, par pipeline,
+      par une tâche dédiée: les appelants ne bloquent jamais sur Redis.
+    redis.asyncio n'est importé qu'à l'utilisation; un client déjà construit (ex: fakeredis) peut être fourni.
+    """
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = STATE_PREFIX, client=None):
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self.channel = f"{prefix}:events"
+        self._client = client
+        self._pending: asyncio.Queue = None
+        self._tasks = []
+
+    def _key(self, *parts) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    async def start(self):
+        if self._client is None:
+            import redis.asyncio as redis
+
+            self._client = redis.from_url(self.url, decode_responses=True)
+        self._pending = asyncio.Queue()
+        self._claim_round = self._client.register_script(_CLAIM_ROUND_SCRIPT)
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+        self._tasks = [asyncio.create_task(self._listen(pubsub)), asyncio.create_task(self._writer())]
+        logger.info(f"État partagé Redis: {self.url} (worker {self.worker_id})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _listen(self, pubsub):
+        while True:
+            try:
+                async for message in pubsub.listen():
+                    event = json.loads(message["data"])
+                    if event.get("origin") == self.worker_id:
+                        continue
+                    handler = self._handlers.get(event.get("kind"))
+                    if handler is not None:
+                        handler(event["payload"])
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except Exception as e:
+                logger.error(f"Abonnement Redis interrompu: {e}")
+                await asyncio.sleep(1)
+
+    async def _writer(self):
+        while True:
+            operations = [await self._pending.get()]
+            while not self._pending.empty():
+                operations.append(self._pending.get_nowait())
+            pipe = self._client.pipeline(transaction=False)
+            for operation in operations:
+                operation(pipe)
+            try:
+                await pipe.execute()
+            except Exception as e:
+                logger.error(f"Écriture Redis échouée ({len(operations)} opérations): {e}")
+
+    def publish(self, kind: str, payload: dict):
+        data = json.dumps({"origin": self.worker_id, "kind": kind, "payload": payload})
+        self._pending.put_nowait(lambda pipe: pipe.publish(self.channel, data))
+
+    async def load_clients(self) -> dict:
+        wallets = await self._client.smembers(self._key("clients"))
+        pipe = self._client.pipeline(transaction=False)
+        for wallet_address in wallets:
+            pipe.hgetall(self._key("client", wallet_address))
+        records = await pipe.execute()
+        return {wallet_address: self._decode(record)
+                for wallet_address, record in zip(wallets, records) if record}
+
+    async def load_client(self, wallet_address: str) -> dict:
+        record = await self._client.hgetall(self._key("client", wallet_address))
+        return self._decode(record) if record else None
+
+    def _decode(self, record: dict) -> dict:
+        return {field: json.loads(value) for field, value in record.items()}
+
+    def save_client(self, wallet_address: str, fields: dict):
+        mapping = {field: json.dumps(value) for field, value in fields.items()}
+
+        def write(pipe):
+            pipe.sadd(self._key("clients"), wallet_address)
+            pipe.hset(self._key("client", wallet_address), mapping=mapping)
+        self._pending.put_nowait(write)
+
+    async def load_round(self) -> dict:
+        state = await self._client.get(self._key("round"))
+        return json.loads(state) if state else None
+
+    async def claim_round(self, state: dict) -> bool:
+        claimed = await self._claim_round(keys=[self._key("round")], args=[json.dumps(state), time.time()])
+        return bool(claimed)
+
+    async def save_round(self, state: dict):
+        # Écriture directe (pas de file): une réservation suivante ne doit pas être écrasée
+        await self._client.set(self._key("round"), json.dumps(state))
+
+
+def create_state_backend(kind: str = STATE_BACKEND):
+    if kind == "redis":
+        return RedisStateBackend()
+    if kind != "memory":
+        logger.warning(f"STATE_BACKEND inconnu: {kind}, utilisation de memory")
+    return MemoryStateBackend()
+
+
+state_backend = create_state_backend()
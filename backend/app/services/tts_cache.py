@@ -0,0 +1,312 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.services.metrics import TTS_SYNTHESIS_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Phrases du jeu synthétisées au démarrage
+DEFAULT_PREWARM = "Attention! Le jeu commence !|Préparez-vous!|3|2|1|Pierre!|Feuille!|Ciseaux!"
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TTSCache:
+    """
+    Cache des MP3 synthétisés, adressé par contenu.
+    - Clé: sha256 de (moteur, langue, voix, texte normalisé).
+    - En mémoire: LRU borné en octets (TTS_CACHE_MAX_BYTES).
+    - Sur disque, optionnel (TTS_CACHE_DIR): un fichier <clé>.mp3 par entrée, LRU par date
+      de dernier accès, borné à TTS_CACHE_DISK_MAX_BYTES.
+    - Les synthèses simultanées d'une même clé sont fusionnées, qu'elles soient complètes
+      (get_or_synthesize) ou envoyées au fil de l'encodage (stream).
+    - admit, optionnel: coroutine appelée seulement si l'audio doit être synthétisé, qui retourne
+      la fonction libérant la place obtenue (contrôle d'admission).
+    """
+
+    def __init__(self, max_bytes: int = None, disk_dir: str = None, disk_max_bytes: int = None):
+        self.max_bytes = max_bytes or int(os.environ.get("TTS_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+        self.disk_dir = disk_dir or os.environ.get("TTS_CACHE_DIR")
+        self.disk_max_bytes = disk_max_bytes or int(os.environ.get("TTS_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+        self.size = 0
+        self.hits = 0
+        self.misses = 0  # synthèses lancées
+        self.coalesced = 0  # demandes jointes à une synthèse déjà en cours
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight = {}
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(engine: str, lang: str, voice: str, text: str) -> str:
+        raw = "\x1f".join([engine, lang, voice or "", normalize_text(text)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> bytes:
+        """Entrée en mémoire (sans accès disque), ou None."""
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    async def lookup(self, key: str) -> bytes:
+        """Entrée en mémoire ou sur disque, ou None."""
+        data = self.get(key)
+        if data is None and self.disk_dir:
+            data = await run_in_threadpool(self._read_disk, key)
+            if data is not None:
+                self._remember(key, data)
+        return data
+
+    async def get_or_synthesize(self, engine: str, lang: str, voice: str, text: str, synthesize,
+                                admit=None) -> tuple:
+        """Retourne (clé, mp3), en appelant synthesize(text, lang, voice) en cas d'absence."""
+        key = self.key(engine, lang, voice, text)
+        data = await self.lookup(key)
+        if data is not None:
+            self.hits += 1
+            return key, data
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._synthesize(key, engine, normalize_text(text), lang, voice, synthesize,
+                                                        admit))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return key, await asyncio.shield(task)
+
+    async def _synthesize(self, key, engine, text, lang, voice, synthesize, admit) -> bytes:
+        release = await admit() if admit is not None else None
+        try:
+            with TTS_SYNTHESIS_SECONDS.time(engine=engine):
+                data = await run_in_threadpool(synthesize, text, lang, voice)
+        finally:
+            if release is not None:
+                release()
+        self._remember(key, data)
+        if self.disk_dir:
+            await run_in_threadpool(self._write_disk, key, data)
+        return data
+
+    async def stream(self, engine: str, lang: str, voice: str, text: str, produce, admit=None) -> tuple:
+        """
+        Retourne (clé, mp3, None) si l'audio est disponible, sinon (clé, None, AudioStream) qui relaie
+        les morceaux de produce(text, lang, voice) au fil de l'encodage et met l'audio complet en cache.
+        Une demande identique arrivant pendant le flux attend l'audio complet.
+        Le premier morceau est attendu ici: un échec de synthèse est levé avant l'envoi de la réponse.
+        """
+        key = self.key(engine, lang, voice, text)
+        data = await self.lookup(key)
+        if data is not None:
+            self.hits += 1
+            return key, data, None
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return key, await asyncio.shield(pending), None
+        self.misses += 1
+        stream = AudioStream(self, key, engine)
+        try:
+            if admit is not None:
+                stream.release = await admit()
+            await stream.start(produce(normalize_text(text), lang, voice))
+        except BaseException as e:
+            stream.close(e)
+            raise
+        return key, None, stream
+
+    def store(self, key: str, data: bytes):
+        """Ajoute un audio produit hors de get_or_synthesize."""
+        self._remember(key, data)
+        if self.disk_dir:
+            asyncio.get_running_loop().run_in_executor(None, self._write_disk, key, data)
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.mp3")
+
+    def _read_disk(self, key: str) -> bytes:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # marque l'accès pour l'éviction LRU
+        return data
+
+    def _write_disk(self, key: str, data: bytes):
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        files = [entry for entry in os.scandir(self.disk_dir) if entry.name.endswith(".mp3")]
+        total = sum(entry.stat().st_size for entry in files)
+        for entry in sorted(files, key=lambda e: e.stat().st_mtime):
+            if total <= self.disk_max_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+
+    async def prewarm(self, phrases: list, engine: str, lang: str, voice: str, synthesize):
+        """Synthétise une liste de phrases à l'avance; les erreurs sont seulement journalisées."""
+        for phrase in phrases:
+            try:
+                await self.get_or_synthesize(engine, lang, voice, phrase, synthesize)
+            except Exception as e:
+                logger.warning(f"Préchauffage TTS impossible pour '{phrase}': {e}")
+        logger.info(f"Cache TTS préchauffé: {len(self._entries)} entrées, {self.size} octets")
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses,
+                "coalesced": self.coalesced}
+
+
+class AudioStream:
+    """
+    Synthèse en flux d'une entrée du cache (voir TTSCache.stream).
+    - Tant qu'elle est en cours, les demandes de la même clé attendent son future.
+    - Flux complet: l'audio est mis en cache et le future reçoit le mp3.
+    - close() (idempotent) termine tout flux interrompu: erreur transmise aux demandes en attente,
+      encodeur arrêté, place d'admission libérée. Un flux jamais parcouru doit aussi être fermé.
+    """
+
+    def __init__(self, cache: TTSCache, key: str, engine: str):
+        self.cache = cache
+        self.key = key
+        self.engine = engine
+        self.release = None  # libère la place d'admission
+        self.future = asyncio.get_running_loop().create_future()
+        self._chunks = None
+        self._first: bytes = None
+        self._parts = []
+        self._started = time.perf_counter()
+        cache._inflight[key] = self.future
+
+    async def start(self, chunks):
+        self._chunks = chunks
+        try:
+            self._first = await chunks.__anext__()
+        except StopAsyncIteration:
+            self._first = None
+
+    def __aiter__(self):
+        return self._relay()
+
+    async def _relay(self):
+        try:
+            if self._first is not None:
+                self._parts.append(self._first)
+                yield self._first
+                async for chunk in self._chunks:
+                    self._parts.append(chunk)
+                    yield chunk
+            self._complete()
+        except Exception as e:
+            self.close(e)
+            raise
+        finally:
+            self.close()
+
+    def _complete(self):
+        data = b"".join(self._parts)
+        TTS_SYNTHESIS_SECONDS.observe(time.perf_counter() - self._started, engine=self.engine)
+        self.cache.store(self.key, data)
+        self._forget()
+        self.future.set_result(data)
+
+    def close(self, error: BaseException = None):
+        self._forget()
+        if not self.future.done():
+            self.future.set_exception(error or RuntimeError("Synthèse vocale interrompue"))
+            self.future.exception()  # marquée comme lue, même sans demande en attente
+            if self._chunks is not None:
+                asyncio.ensure_future(_close_quietly(self._chunks))
+        if self.release is not None:
+            release, self.release = self.release, None
+            release()
+
+    def _forget(self):
+        if self.cache._inflight.get(self.key) is self.future:
+            del self.cache._inflight[self.key]
+
+
+async def _close_quietly(chunks):
+    try:
+        await chunks.aclose()
+    except Exception as e:
+        logger.debug(f"Fermeture du flux TTS: {e}")
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse qui appelle on_close() quand l'envoi se termine, quelle qu'en soit la raison:
+    un générateur interrompu avant son premier morceau (client parti) n'exécute jamais son finally.
+    Un générateur laissé en suspens par une déconnexion est aussi fermé.
+    """
+
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+            if hasattr(self.body_iterator, "aclose"):
+                await _close_quietly(self.body_iterator)
+
+
+def audio_response(request: Request, key: str, data: bytes, media_type: str = "audio/mpeg") -> Response:
+    """Réponse audio avec ETag, Cache-Control et prise en charge des requêtes Range."""
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=86400, immutable",
+        "Accept-Ranges": "bytes",
+        "X-TTS-Key": key,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    match = _RANGE_RE.match(request.headers.get("range", "").strip())
+    if match and (match.group(1) or match.group(2)):
+        size = len(data)
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            start = max(0, size - int(match.group(2)))
+            end = size - 1
+        if start > end or start >= size:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(content=data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+    return Response(content=data, media_type=media_type, headers=headers)
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+import uuid
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Binaire ffmpeg utilisé pour l'encodage MP3
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+# Taille des morceaux MP3 envoyés pendant l'encodage
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def _ffmpeg_args() -> list:
+    return [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+            "-f", "wav", "-i", "pipe:0",
+            # Sans en-têtes ID3/Xing, les MP3 produits peuvent être concaténés
+            "-id3v2_version", "0", "-write_xing", "0",
+            "-f", "mp3", "pipe:1"]
+
+
+def transcode_mp3(wav: bytes) -> bytes:
+    """Encode un WAV en MP3 via ffmpeg, par des tubes (sans fichier intermédiaire)."""
+    result = subprocess.run(_ffmpeg_args(), input=wav, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+class OfflineTTSEngine:
+    """
+    Synthèse vocale hors-ligne (pyttsx3).
+    - Un seul moteur pyttsx3, créé et utilisé uniquement par un thread dédié
+      (les moteurs pyttsx3 ne sont pas thread-safe); les demandes passent par une file.
+    - Les voix sont résolues une fois par langue; sans voix pour la langue demandée, la voix par
+      défaut du moteur est rétablie (pas celle de la demande précédente), ainsi que débit et volume.
+    - pyttsx3 ne sait écrire que dans un fichier: le WAV passe par un répertoire privé
+      (en mémoire via /dev/shm si disponible), puis l'encodage MP3 se fait par tubes.
+    """
+
+    def __init__(self):
+        self._requests: queue.Queue = queue.Queue()
+        self._thread: threading.Thread = None
+        self._lock = threading.Lock()
+        self._voices = {}
+        self._workdir: str = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="tts-offline", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        import pyttsx3
+
+        shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        self._workdir = tempfile.mkdtemp(prefix="tts_", dir=shm)
+        engine, init_error = None, None
+        try:
+            engine = pyttsx3.init()
+            voices = engine.getProperty('voices')
+            # Réglages d'un moteur neuf, rétablis avant chaque synthèse (le moteur sert à toutes)
+            defaults = {name: engine.getProperty(name) for name in ('voice', 'rate', 'volume')}
+        except Exception as e:
+            logger.error(f"Moteur TTS hors-ligne indisponible: {e}")
+            init_error = e
+        while True:
+            text, lang, voice, future = self._requests.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            if init_error is not None:
+                future.set_exception(init_error)
+                continue
+            try:
+                voice_id = voice or self._resolve_voice(voices, lang)
+                engine.setProperty('voice', voice_id or defaults['voice'])
+                engine.setProperty('rate', defaults['rate'])
+                engine.setProperty('volume', defaults['volume'])
+                future.set_result(self._synthesize(engine, text))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _resolve_voice(self, voices, lang: str) -> str:
+        if lang not in self._voices:
+            match = None
+            if lang == "fr":
+                match = next((v for v in voices if "fr" in v.languages or "French" in v.name), None)
+            else:
+                match = next((v for v in voices if any(lang in str(l) for l in v.languages)), None)
+            self._voices[lang] = match.id if match else None
+        return self._voices[lang]
+
+    def _synthesize(self, engine, text: str) -> bytes:
+        path = os.path.join(self._workdir, f"{uuid.uuid4().hex}.wav")
+        try:
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def submit(self, text: str, lang: str = "fr", voice: str = None) -> Future:
+        """Met une synthèse WAV en file; retourne un Future."""
+        self._ensure_started()
+        future = Future()
+        self._requests.put((text, lang, voice, future))
+        return future
+
+    def synthesize_mp3(self, text: str, lang: str = "fr", voice: str = None) -> bytes:
+        """Synthèse MP3 bloquante (à appeler hors de la boucle asyncio)."""
+        return transcode_mp3(self.submit(text, lang, voice).result())
+
+    async def stream_mp3(self, text: str, lang: str = "fr", voice: str = None):
+        """
+        Générateur asynchrone de morceaux MP3, envoyés au fil de l'encodage.
+        Lève RuntimeError après le dernier morceau si ffmpeg échoue: l'audio reçu est incomplet.
+        """
+        wav = await asyncio.wrap_future(self.submit(text, lang, voice))
+        process = await asyncio.create_subprocess_exec(
+            *_ffmpeg_args(), stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+
+        async def feed():
+            process.stdin.write(wav)
+            await process.stdin.drain()
+            process.stdin.close()
+
+        feeder = asyncio.create_task(feed())
+        try:
+            while True:
+                chunk = await process.stdout.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+            await feeder
+            if await process.wait() != 0:
+                error = (await process.stderr.read()).decode(errors="replace").strip()
+                logger.error(f"ffmpeg: {error}")
+                raise RuntimeError(f"ffmpeg: {error}")
+        finally:
+            feeder.cancel()
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+
+offline_tts = OfflineTTSEngine()
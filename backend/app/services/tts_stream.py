@@ -0,0 +1,76 @@
+import asyncio
+import os
+import re
+
+# Longueur maximale d'un morceau de texte synthétisé séparément
+CHUNK_MAX_CHARS = int(os.environ.get("TTS_CHUNK_MAX_CHARS", 200))
+# Nombre de morceaux synthétisés en parallèle
+CHUNK_CONCURRENCY = int(os.environ.get("TTS_CHUNK_CONCURRENCY", 4))
+
+_SENTENCE_RE = re.compile(r"[^.!?…;:]+[.!?…;:]*")
+_CLAUSE_RE = re.compile(r"[^,]+,?")
+
+
+def _pack(parts: list, max_chars: int) -> list:
+    """Regroupe des morceaux consécutifs tant qu'ils tiennent dans max_chars."""
+    packed = []
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        if packed and len(packed[-1]) + 1 + len(part) <= max_chars:
+            packed[-1] = f"{packed[-1]} {part}"
+        else:
+            packed.append(part)
+    return packed
+
+
+def split_text(text: str, max_chars: int = CHUNK_MAX_CHARS) -> list:
+    """Découpe un texte en phrases, puis en propositions ou en mots si une phrase est trop longue."""
+    chunks = []
+    for sentence in _SENTENCE_RE.findall(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+            continue
+        for clause in _pack(_CLAUSE_RE.findall(sentence), max_chars):
+            if len(clause) <= max_chars:
+                chunks.append(clause)
+            else:
+                chunks.extend(_pack(clause.split(), max_chars))
+    return chunks
+
+
+def strip_id3(data: bytes) -> bytes:
+    """Retire l'en-tête ID3v2 d'un MP3 pour pouvoir concaténer les trames."""
+    if data[:3] != b"ID3" or len(data) < 10:
+        return data
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    return data[10 + size:]
+
+
+async def stream_chunks(cache, engine: str, lang: str, voice: str, text: str, synthesize,
+                        concurrency: int = CHUNK_CONCURRENCY):
+    """
+    Générateur asynchrone des trames MP3 d'un texte, morceau par morceau.
+    - Les morceaux sont synthétisés en parallèle mais envoyés dans l'ordre: le premier
+      audio part dès que le premier morceau est prêt.
+    - Chaque morceau passe par le cache TTS, une phrase déjà prononcée n'est pas resynthétisée.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def synthesize_chunk(chunk):
+        async with semaphore:
+            _, data = await cache.get_or_synthesize(engine, lang, voice, chunk, synthesize)
+            return data
+
+    tasks = [asyncio.create_task(synthesize_chunk(chunk)) for chunk in split_text(text)]
+    try:
+        for index, task in enumerate(tasks):
+            data = await task
+            yield data if index == 0 else strip_id3(data)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+from xrpl.wallet import Wallet
+
+logger = logging.getLogger(__name__)
+
+
+class WalletPool:
+    """
+    Réserve de wallets déjà créés et approvisionnés par le faucet.
+    - Un wallet est remis immédiatement à l'inscription s'il en reste.
+    - Sous le seuil bas (WALLET_POOL_LOW_WATERMARK), la réserve est complétée en tâche de fond
+      jusqu'à WALLET_POOL_SIZE, avec au plus WALLET_POOL_CONCURRENCY appels au faucet simultanés.
+    - Réserve vide: le wallet est créé à la demande.
+    - Désactivée par défaut (WALLET_POOL_SIZE=0): chaque worker remplit sa propre réserve au
+      démarrage, ce qui multiplie les appels au faucet.
+    """
+
+    def __init__(self, gateway, size: int = None, low_watermark: int = None, concurrency: int = None,
+                 retry_delay: float = None):
+        self.gateway = gateway
+        self.size = size if size is not None else int(os.environ.get("WALLET_POOL_SIZE", 0))
+        self.low_watermark = low_watermark if low_watermark is not None else \
+            int(os.environ.get("WALLET_POOL_LOW_WATERMARK", self.size // 2))
+        self.concurrency = concurrency or int(os.environ.get("WALLET_POOL_CONCURRENCY", 4))
+        self.retry_delay = retry_delay or float(os.environ.get("WALLET_POOL_RETRY_DELAY", 5))
+        self._wallets: deque = deque()
+        self._refills = set()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._retry_handle: asyncio.TimerHandle = None
+        # Métriques
+        self.handed_out = 0
+        self.on_demand = 0
+        self.created = 0
+        self.failures = 0
+        self.refill_latency_last = 0.0
+        self.refill_latency_max = 0.0
+        self._refill_latency_total = 0.0
+
+    def start(self):
+        self._maybe_refill()
+
+    async def stop(self):
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+        for task in list(self._refills):
+            task.cancel()
+
+    @property
+    def depth(self) -> int:
+        return len(self._wallets)
+
+    async def acquire(self) -> Wallet:
+        """Remet un wallet approvisionné, de la réserve si possible."""
+        if self._wallets:
+            wallet = self._wallets.popleft()
+            self.handed_out += 1
+            self._maybe_refill()
+            return wallet
+        self.on_demand += 1
+        self._maybe_refill()
+        if self.size:
+            logger.warning("Réserve de wallets vide, création à la demande")
+        return await self.gateway.create_wallet()
+
+    def _maybe_refill(self):
+        available = len(self._wallets) + len(self._refills)
+        if available > self.low_watermark or self._retry_handle is not None:
+            return
+        for _ in range(self.size - available):
+            task = asyncio.create_task(self._refill_one())
+            self._refills.add(task)
+            task.add_done_callback(self._refills.discard)
+
+    async def _refill_one(self):
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                wallet = await self.gateway.create_wallet()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Création de wallet pour la réserve échouée: {e}")
+                if self._retry_handle is None:
+                    self._retry_handle = asyncio.get_running_loop().call_later(self.retry_delay, self._retry)
+                return
+            latency = time.monotonic() - started
+            self.created += 1
+            self.refill_latency_last = latency
+            self.refill_latency_max = max(self.refill_latency_max, latency)
+            self._refill_latency_total += latency
+            self._wallets.append(wallet)
+
+    def _retry(self):
+        self._retry_handle = None
+        self._maybe_refill()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "size": self.size,
+            "low_watermark": self.low_watermark,
+            "refilling": len(self._refills),
+            "handed_out": self.handed_out,
+            "on_demand": self.on_demand,
+            "created": self.created,
+            "failures": self.failures,
+            "refill_latency_last": round(self.refill_latency_last, 3),
+            "refill_latency_max": round(self.refill_latency_max, 3),
+            "refill_latency_avg": round(self._refill_latency_total / self.created, 3) if self.created else 0.0,
+        }
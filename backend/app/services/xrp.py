@@ -1,34 +1,134 @@
+from xrpl.asyncio.clients import AsyncJsonRpcClient
+from xrpl.asyncio.clients.exceptions import XRPLRequestFailureException
+from xrpl.asyncio.clients.utils import json_to_response, request_to_json_rpc
+from xrpl.asyncio.wallet import generate_faucet_wallet
+from xrpl.models.requests import AccountInfo, Ledger
+from xrpl.models.response import Response
+from xrpl.utils import drops_to_xrp
 from xrpl.wallet import Wallet
-from xrpl.constants import CryptoAlgorithm
-from xrpl.clients import WebsocketClient
-from xrpl.models.transactions import Payment, Memo
-from xrpl.utils import xrp_to_drops
-from xrpl.transaction import autofill_and_sign
-from xrpl.transaction import submit_and_wait
-from xrpl.clients import JsonRpcClient
-from xrpl.models.requests import AccountInfo
 from app.utils.logger import logger_init
-from xrpl.utils import drops_to_xrp
+from app.services.metrics import XRPL_REQUEST_SECONDS, XRPL_ERRORS
+from json import JSONDecodeError
+from decimal import Decimal
+import asyncio
+import httpx
 import logging
+import os
 
 
 logger_init()
-logger = logging.getLogger(__name__) 
-
-def create_wallet():
-    from xrpl.wallet import generate_faucet_wallet
-    JSON_RPC_URL = "https://s.altnet.rippletest.net:51234/"
-    client = JsonRpcClient(JSON_RPC_URL)
-    wallet = generate_faucet_wallet(client)
-    logger.info(f"Wallet created: {wallet}")
-    return wallet
-
-def get_xrp_balance(wallet_address):
-    from xrpl.clients import JsonRpcClient
-    JSON_RPC_URL = "https://s.altnet.rippletest.net:51234/"
-    client = JsonRpcClient(JSON_RPC_URL)
-    req = AccountInfo(account=wallet_address, ledger_index="validated", strict=True)
-    response = client.request(req)
-    logger.info(f"Balance: {response.result['account_data']['Balance']}")
-    return drops_to_xrp(response.result['account_data']['Balance'])
+logger = logging.getLogger(__name__)
+
+
+class PooledJsonRpcClient(AsyncJsonRpcClient):
+    """
+    AsyncJsonRpcClient qui réutilise une seule session HTTP (connexions keep-alive)
+    au lieu d'en ouvrir une par requête, avec réessais sur les erreurs réseau.
+    """
+
+    def __init__(self, url: str, timeout: float, retries: int, max_connections: int):
+        super().__init__(url)
+        self.timeout = timeout
+        self.retries = retries
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def _request_impl(self, request, *, timeout: float = None) -> Response:
+        method = request.method.value
+        with XRPL_REQUEST_SECONDS.time(method=method):
+            payload = request_to_json_rpc(request)
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await self._http.post(self.url, json=payload)
+                    break
+                except httpx.TransportError as e:
+                    XRPL_ERRORS.inc(method=method, kind="transport")
+                    if attempt == self.retries:
+                        raise
+                    logger.warning(f"Requête XRPL échouée ({e}), nouvel essai")
+                    await asyncio.sleep(0.2 * 2 ** attempt)
+            try:
+                result = json_to_response(response.json())
+            except JSONDecodeError:
+                XRPL_ERRORS.inc(method=method, kind="http")
+                raise XRPLRequestFailureException({
+                    "error": response.status_code,
+                    "error_message": response.text,
+                })
+            if not result.is_successful():
+                XRPL_ERRORS.inc(method=method, kind="ledger")
+            return result
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class XRPLGateway:
+    """
+    Accès au ledger XRPL partagé par toute l'application.
+    - Un seul client JSON-RPC asynchrone, avec pool de connexions HTTP.
+    - Point d'accès, faucet, délai et réessais configurables
+      (XRPL_JSON_RPC_URL, XRPL_FAUCET_HOST, XRPL_TIMEOUT, XRPL_RETRIES, XRPL_MAX_CONNECTIONS),
+      ce qui permet de pointer vers un serveur JSON-RPC local.
+    """
+
+    def __init__(self, url: str = None, faucet_host: str = None, timeout: float = None,
+                 retries: int = None, max_connections: int = None):
+        self.url = url or os.environ.get("XRPL_JSON_RPC_URL", "https://s.altnet.rippletest.net:51234/")
+        self.faucet_host = faucet_host or os.environ.get("XRPL_FAUCET_HOST")
+        self.timeout = timeout or float(os.environ.get("XRPL_TIMEOUT", 10))
+        self.retries = retries if retries is not None else int(os.environ.get("XRPL_RETRIES", 2))
+        self.max_connections = max_connections or int(os.environ.get("XRPL_MAX_CONNECTIONS", 20))
+        self._client: PooledJsonRpcClient = None
+
+    @property
+    def client(self) -> PooledJsonRpcClient:
+        if self._client is None:
+            self._client = PooledJsonRpcClient(self.url, self.timeout, self.retries, self.max_connections)
+        return self._client
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def create_wallet(self) -> Wallet:
+        """Crée un wallet et le fait approvisionner par le faucet."""
+        wallet = await generate_faucet_wallet(self.client, faucet_host=self.faucet_host)
+        logger.info(f"Wallet created: {wallet.address}")
+        return wallet
+
+    async def get_account_balance(self, wallet_address: str) -> tuple:
+        """(solde XRP validé, index du ledger validé), ou (None, None) si le compte n'existe pas."""
+        req = AccountInfo(account=wallet_address, ledger_index="validated", strict=True)
+        response = await self.client.request(req)
+        if not response.is_successful():
+            logger.warning(f"AccountInfo {wallet_address}: {response.result.get('error')}")
+            return None, None
+        balance = drops_to_xrp(response.result['account_data']['Balance'])
+        return balance, response.result.get('ledger_index')
+
+    async def get_balance(self, wallet_address: str) -> Decimal:
+        """Solde XRP validé d'un wallet, ou None si le compte n'existe pas."""
+        balance, _ = await self.get_account_balance(wallet_address)
+        return balance
+
+    async def get_validated_ledger_index(self) -> int:
+        """Index du dernier ledger validé."""
+        response = await self.client.request(Ledger(ledger_index="validated"))
+        if not response.is_successful():
+            raise XRPLRequestFailureException(response.result)
+        return response.result['ledger_index']
+
+
+xrpl_gateway = XRPLGateway()
+
+
+async def create_wallet() -> Wallet:
+    return await xrpl_gateway.create_wallet()
+
 
+async def get_xrp_balance(wallet_address) -> Decimal:
+    return await xrpl_gateway.get_balance(wallet_address)
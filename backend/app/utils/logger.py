@@ -1,5 +1,11 @@
 # logging_config.py
+import atexit
+import json
 import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
 
 
 class CustomFormatter(logging.Formatter):
@@ -21,13 +27,112 @@ class CustomFormatter(logging.Formatter):
             levelname = f"[{self.GREEN}{levelname}{self.RESET}]"
         filename_colored = f"[{self.YELLOW}{record.filename}{self.RESET}]"
         funcName_colored = f"[{self.BOLD}{record.funcName}{self.RESET}]"
-        
+
         base_msg = f"{dt_colored} {levelname} {filename_colored} {funcName_colored}\n{record.getMessage()}\n"
+        if record.exc_text:
+            base_msg += f"{record.exc_text}\n"
         return base_msg
 
-def logger_init(level=logging.INFO):
+
+class JSONFormatter(logging.Formatter):
+    """Une ligne JSON par message (LOG_FORMAT=json)."""
+
+    def format(self, record):
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "file": record.filename,
+            "function": record.funcName,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limite chaque point d'appel (fichier, ligne) à `rate` messages par fenêtre de `window` secondes.
+    Le premier message de la fenêtre suivante indique combien de messages ont été supprimés.
+    """
+
+    def __init__(self, rate: int, window: float):
+        super().__init__()
+        self.rate = rate
+        self.window = window
+        self._counters = {}  # (fichier, ligne) -> [début de fenêtre, messages émis, messages supprimés]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        counter = self._counters.get(key)
+        if counter is None or now - counter[0] >= self.window:
+            suppressed = counter[2] if counter is not None else 0
+            self._counters[key] = [now, 1, 0]
+            if suppressed:
+                record.msg = f"{record.getMessage()} ({suppressed} messages similaires supprimés)"
+                record.args = None
+            return True
+        if counter[1] < self.rate:
+            counter[1] += 1
+            return True
+        counter[2] += 1
+        return False
+
+
+_listener: QueueListener = None
+
+# Loggers des événements très fréquents (connexions, messages WebSocket) limités par LOG_RATE_LIMIT
+DEFAULT_RATE_LOGGERS = "app.services.connections,app.routes.websocket"
+
+
+def _parse_levels(spec: str) -> dict:
+    """LOG_LEVELS="app.services.connections=WARNING,uvicorn.access=ERROR" -> {nom: niveau}"""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def logger_init(level=None):
+    """
+    Configure le logging une seule fois pour tout le processus (les appels suivants ne font rien).
+    - Les messages passent par une file: le formatage et l'écriture se font dans un thread dédié.
+    - LOG_LEVEL: niveau global, LOG_LEVELS: niveaux par logger, LOG_FORMAT=json: sortie JSON.
+    - LOG_RATE_LIMIT / LOG_RATE_WINDOW: messages max par point d'appel et par fenêtre (0 = illimité,
+      par défaut), appliqué seulement aux loggers des chemins chauds listés dans LOG_RATE_LOGGERS.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = level or os.environ.get("LOG_LEVEL", "INFO").upper()
+
     handler = logging.StreamHandler()
-    handler.setFormatter(CustomFormatter())
+    if os.environ.get("LOG_FORMAT", "").lower() == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(CustomFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+
     root_logger = logging.getLogger()
-    root_logger.handlers = [handler]
-    root_logger.setLevel(level)
\ No newline at end of file
+    root_logger.handlers = [queue_handler]
+    root_logger.setLevel(level)
+    for name, logger_level in _parse_levels(os.environ.get("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(logger_level)
+    rate = int(os.environ.get("LOG_RATE_LIMIT", 0))
+    if rate > 0:
+        rate_filter = RateLimitFilter(rate, float(os.environ.get("LOG_RATE_WINDOW", 10)))
+        for name in os.environ.get("LOG_RATE_LOGGERS", DEFAULT_RATE_LOGGERS).split(","):
+            if name.strip():
+                logging.getLogger(name.strip()).addFilter(rate_filter)
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
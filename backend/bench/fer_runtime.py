@@ -0,0 +1,293 @@
+"""
+Export et validation des moteurs du classifieur d'émotions (voir app/services/fer_backends.py).
+
+export: convertit le modèle Keras de DeepFace en TFLite et/ou ONNX (float32), et avec --int8
+en version quantifiée int8, calibrée sur les visages des images de --images.
+validate: compare un moteur exporté au modèle Keras sur un dossier d'images locales
+(distributions d'émotions, score final, émotion dominante), de la détection au score si le
+détecteur OpenCV natif est utilisé, puis mesure le débit par cœur des deux moteurs.
+
+Dépendances d'export: tensorflow (TFLite), tf2onnx et onnxruntime (ONNX).
+
+Usage (depuis backend/):
+    python -m bench.fer_runtime export --images ./faces --formats tflite onnx --int8
+    python -m bench.fer_runtime validate --images ./faces --backend tflite --precision int8 --output fer.json
+Code de sortie 1 (validate) si l'écart moyen de score dépasse --max-score-diff ou si l'accord sur
+l'émotion dominante est inférieur à --min-agreement. Avec le détecteur opencv, la chaîne complète
+(détection native + moteur exporté) est aussi vérifiée: --max-pipeline-score-diff,
+--min-pipeline-agreement, et --min-detection-ratio (part des visages détectés par DeepFace que la
+détection native retrouve).
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+
+from app.services.ai import decode_bytes, emotion_results
+from app.services.fer_backends import (FER_MODEL_DIR, INPUT_SHAPE, KerasEmotionClassifier, create_classifier,
+                                       deepface_face, detect_face, model_path)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_images(folder: str) -> list:
+    images = []
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(folder, name), "rb") as f:
+                images.append((name, f.read()))
+    return images
+
+
+def extract_faces(images: list, detect) -> dict:
+    """{nom: visage 48x48} pour les images où un visage est détecté."""
+    faces = {}
+    for name, data in images:
+        try:
+            faces[name] = detect(decode_bytes(data))
+        except (ValueError, OSError):
+            pass  # image illisible ou sans visage
+    return faces
+
+
+def keras_function():
+    import tensorflow as tf
+
+    model = KerasEmotionClassifier().model
+    spec = [tf.TensorSpec((None, *INPUT_SHAPE), tf.float32, name="input")]
+    return model, tf.function(lambda x: model(x, training=False), input_signature=spec), spec
+
+
+def calibration_samples(faces: list):
+    for face in faces:
+        yield face[np.newaxis, ..., np.newaxis].astype(np.float32)
+
+
+def export_tflite(path: str, calibration: list = None):
+    import tensorflow as tf
+
+    model, function, _ = keras_function()
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([function.get_concrete_function()], model)
+    if calibration is not None:
+        # Poids et activations en int8; entrée et sortie restent en float32
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([sample] for sample in calibration_samples(calibration))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+
+
+def export_onnx(path: str, calibration: list = None):
+    import tf2onnx
+
+    _, function, spec = keras_function()
+    if calibration is None:
+        tf2onnx.convert.from_function(function, input_signature=spec, opset=13, output_path=path)
+        return
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class FaceReader(CalibrationDataReader):
+        def __init__(self):
+            self.samples = calibration_samples(calibration)
+
+        def get_next(self):
+            sample = next(self.samples, None)
+            return None if sample is None else {"input": sample}
+
+    float_path = path + ".float.onnx"
+    tf2onnx.convert.from_function(function, input_signature=spec, opset=13, output_path=float_path)
+    try:
+        quantize_static(float_path, path, FaceReader(), quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QInt8, weight_type=QuantType.QInt8)
+    finally:
+        os.unlink(float_path)
+
+
+def export(args) -> dict:
+    os.makedirs(args.model_dir, exist_ok=True)
+    calibration = None
+    if args.int8:
+        if not args.images:
+            raise SystemExit("--int8 demande des images de calibration (--images)")
+        faces = extract_faces(load_images(args.images), lambda image: deepface_face(image, args.detector))
+        if not faces:
+            raise SystemExit(f"Aucun visage détecté dans {args.images}")
+        calibration = list(faces.values())[:args.calibration_size]
+    exporters = {"tflite": export_tflite, "onnx": export_onnx}
+    models = {}
+    for backend in args.formats:
+        precisions = ["float32"] + (["int8"] if args.int8 else [])
+        for precision in precisions:
+            path = os.path.join(args.model_dir, os.path.basename(model_path(backend, precision)))
+            started = time.perf_counter()
+            exporters[backend](path, calibration if precision == "int8" else None)
+            models[f"{backend}-{precision}"] = {"path": path, "bytes": os.path.getsize(path),
+                                                "seconds": time.perf_counter() - started}
+            print(f"{path}: {os.path.getsize(path)} octets", file=sys.stderr)
+    return {"calibration_faces": len(calibration) if calibration else 0, "models": models}
+
+
+def predict(classifier, faces: list, batch_size: int) -> np.ndarray:
+    batch = np.stack(faces).astype(np.float32)[..., np.newaxis]
+    return np.concatenate([classifier.predict(batch[i:i + batch_size]) for i in range(0, len(batch), batch_size)])
+
+
+def compare(reference: list, candidate: list) -> dict:
+    """Écarts entre deux listes de résultats {"emotions", "score"} (mêmes visages, même ordre)."""
+    if not reference:
+        return {"count": 0}
+    labels = list(reference[0]["emotions"])
+    ref = np.array([[r["emotions"][label] for label in labels] for r in reference])
+    cand = np.array([[r["emotions"][label] for label in labels] for r in candidate])
+    score_diff = np.abs(np.array([r["score"] for r in reference]) - np.array([r["score"] for r in candidate]))
+    return {
+        "count": len(reference),
+        "emotion_mean_abs_diff": float(np.abs(ref - cand).mean()),
+        "emotion_max_abs_diff": float(np.abs(ref - cand).max()),
+        "top1_agreement": float((ref.argmax(axis=1) == cand.argmax(axis=1)).mean()),
+        "score_mean_abs_diff": float(score_diff.mean()),
+        "score_p95_abs_diff": float(np.percentile(score_diff, 95)),
+        "score_max_abs_diff": float(score_diff.max()),
+    }
+
+
+def throughput(classifier, faces: list, batch_size: int, seconds: float) -> dict:
+    batch = np.stack((faces * batch_size)[:batch_size]).astype(np.float32)[..., np.newaxis]
+    classifier.predict(batch)  # préchauffage
+    count, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        classifier.predict(batch)
+        count += len(batch)
+    elapsed = time.perf_counter() - started
+    return {"batch_size": batch_size, "faces_per_second": count / elapsed}
+
+
+def validate(args) -> tuple:
+    images = load_images(args.images)
+    reference_faces = extract_faces(images, lambda image: deepface_face(image, args.detector))
+    if not reference_faces:
+        raise SystemExit(f"Aucun visage détecté dans {args.images}")
+    names = list(reference_faces)
+    faces = [reference_faces[name] for name in names]
+
+    keras = KerasEmotionClassifier()
+    path = args.model or os.path.join(args.model_dir, os.path.basename(model_path(args.backend, args.precision)))
+    candidate = create_classifier(args.backend, path, args.threads)
+    reference = emotion_results(predict(keras, faces, args.batch_size))
+    results = emotion_results(predict(candidate, faces, args.batch_size))
+    report = {
+        "backend": args.backend,
+        "precision": args.precision,
+        "model": path,
+        "model_bytes": os.path.getsize(path),
+        "images": len(images),
+        "faces": len(faces),
+        # Même visage (détection DeepFace), classifieurs différents
+        "classifier": compare(reference, results),
+    }
+
+    if args.detector == "opencv":
+        # De l'image au score: détection OpenCV native + moteur exporté, contre DeepFace + Keras
+        native_faces = extract_faces(images, detect_face)
+        common = [name for name in names if name in native_faces]
+        native = emotion_results(predict(candidate, [native_faces[name] for name in common], args.batch_size)) \
+            if common else []
+        by_name = dict(zip(names, reference))
+        report["pipeline"] = {
+            "detected_reference": len(reference_faces),
+            "detected_native": len(native_faces),
+            "detected_both": len(common),
+            **compare([by_name[name] for name in common], native),
+        }
+
+    report["throughput"] = {
+        "threads": args.threads,
+        "keras": throughput(keras, faces, args.batch_size, args.seconds),
+        args.backend: throughput(candidate, faces, args.batch_size, args.seconds),
+    }
+    report["speedup"] = report["throughput"][args.backend]["faces_per_second"] / \
+        report["throughput"]["keras"]["faces_per_second"]
+
+    failures = []
+    if report["classifier"]["score_mean_abs_diff"] > args.max_score_diff:
+        failures.append(f"écart de score {report['classifier']['score_mean_abs_diff']:.3f} > {args.max_score_diff}")
+    if report["classifier"]["top1_agreement"] < args.min_agreement:
+        failures.append(f"accord {report['classifier']['top1_agreement']:.3f} < {args.min_agreement}")
+    if "pipeline" in report:
+        pipeline = report["pipeline"]
+        ratio = pipeline["detected_both"] / pipeline["detected_reference"]
+        pipeline["detection_ratio"] = ratio
+        if ratio < args.min_detection_ratio:
+            failures.append(f"détection native {ratio:.3f} < {args.min_detection_ratio}")
+        if pipeline["count"]:
+            if pipeline["score_mean_abs_diff"] > args.max_pipeline_score_diff:
+                failures.append(f"écart de score (chaîne) {pipeline['score_mean_abs_diff']:.3f} > "
+                                f"{args.max_pipeline_score_diff}")
+            if pipeline["top1_agreement"] < args.min_pipeline_agreement:
+                failures.append(f"accord (chaîne) {pipeline['top1_agreement']:.3f} < {args.min_pipeline_agreement}")
+    return report, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export et validation des moteurs du classifieur d'émotions")
+    parser.add_argument("--model-dir", default=FER_MODEL_DIR)
+    parser.add_argument("--detector", default=os.environ.get("FER_DETECTOR", "opencv"))
+    parser.add_argument("--output", help="fichier JSON de résultats (sinon sortie standard)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="exporter le modèle Keras")
+    export_parser.add_argument("--formats", nargs="+", choices=("tflite", "onnx"), default=["tflite"])
+    export_parser.add_argument("--int8", action="store_true", help="ajouter la version quantifiée int8")
+    export_parser.add_argument("--images", help="dossier d'images de calibration (int8)")
+    export_parser.add_argument("--calibration-size", type=int, default=200)
+
+    validate_parser = commands.add_parser("validate", help="comparer un moteur exporté au modèle Keras")
+    validate_parser.add_argument("--images", required=True, help="dossier d'images de visages")
+    validate_parser.add_argument("--backend", choices=("tflite", "onnx"), default="tflite")
+    validate_parser.add_argument("--precision", choices=("float32", "int8"), default="float32")
+    validate_parser.add_argument("--model", help="chemin du modèle (sinon déduit de --backend/--precision)")
+    validate_parser.add_argument("--threads", type=int, default=1, help="threads du moteur exporté")
+    validate_parser.add_argument("--batch-size", type=int, default=32)
+    validate_parser.add_argument("--seconds", type=float, default=5, help="durée de chaque mesure de débit")
+    validate_parser.add_argument("--max-score-diff", type=float, default=2.0, help="écart moyen de score accepté (0-100)")
+    validate_parser.add_argument("--min-agreement", type=float, default=0.9, help="accord minimum sur l'émotion dominante")
+    validate_parser.add_argument("--max-pipeline-score-diff", type=float, default=5.0,
+                                 help="écart moyen de score accepté de l'image au score (détection native)")
+    validate_parser.add_argument("--min-pipeline-agreement", type=float, default=0.8,
+                                 help="accord minimum sur l'émotion dominante de l'image au score")
+    validate_parser.add_argument("--min-detection-ratio", type=float, default=0.9,
+                                 help="part minimum des visages DeepFace retrouvés par la détection native")
+    args = parser.parse_args()
+
+    failures = []
+    if args.command == "export":
+        result = export(args)
+    else:
+        result, failures = validate(args)
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "command": args.command,
+        **result,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    if failures:
+        print("; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
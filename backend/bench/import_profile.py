@@ -0,0 +1,95 @@
+"""
+Profil du temps d'import de la passerelle.
+
+Importe un module (app.main par défaut) dans un processus neuf avec `python -X importtime`
+et rapporte le temps total, les modules les plus coûteux (temps cumulé) et la présence de
+modules lourds (tensorflow, deepface...) qui ne devraient pas être chargés par la passerelle.
+
+Usage (depuis backend/):
+    INFERENCE_MODE=remote python -m bench.import_profile --top 25 --max-seconds 1 --output import.json
+Code de sortie 1 si --max-seconds est dépassé ou si un module interdit est importé.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Modules réservés au processus d'inférence
+HEAVY_MODULES = ("tensorflow", "keras", "tf_keras", "deepface", "torch", "cv2", "gtts", "pyttsx3", "pydub")
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile(module: str) -> dict:
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=os.environ.copy())
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise SystemExit(f"Import de {module} impossible:\n{result.stderr[-2000:]}")
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                "module": name,
+                "self_s": int(self_us) / 1e6,
+                "cumulative_s": int(cumulative_us) / 1e6,
+                "depth": len(indent) // 2,
+            })
+    top_level = [m for m in modules if m["depth"] == 0]
+    return {
+        "module": module,
+        "wall_s": wall,
+        "import_s": sum(m["cumulative_s"] for m in top_level),
+        "modules": modules,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil du temps d'import")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=20, help="nombre de modules rapportés")
+    parser.add_argument("--max-seconds", type=float, help="temps d'import maximum accepté")
+    parser.add_argument("--allow-heavy", action="store_true", help="ne pas refuser les modules lourds")
+    parser.add_argument("--output", help="fichier JSON de résultats (sinon sortie standard)")
+    args = parser.parse_args()
+
+    result = profile(args.module)
+    heavy = sorted({m["module"].split(".")[0] for m in result["modules"]
+                    if m["module"].split(".")[0] in HEAVY_MODULES})
+    report = {
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "module": args.module,
+        "inference_mode": os.environ.get("INFERENCE_MODE", "local"),
+        "wall_s": result["wall_s"],
+        "import_s": result["import_s"],
+        "modules_imported": len(result["modules"]),
+        "heavy_modules": heavy,
+        "top_cumulative": sorted(result["modules"], key=lambda m: m["cumulative_s"], reverse=True)[:args.top],
+        "top_self": sorted(result["modules"], key=lambda m: m["self_s"], reverse=True)[:args.top],
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    failures = []
+    if args.max_seconds is not None and report["import_s"] > args.max_seconds:
+        failures.append(f"import en {report['import_s']:.3f}s > {args.max_seconds}s")
+    if heavy and not args.allow_heavy:
+        failures.append(f"modules lourds importés: {', '.join(heavy)}")
+    if failures:
+        print("; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
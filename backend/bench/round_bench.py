@@ -0,0 +1,263 @@
+"""
+Banc de charge hors-ligne d'une manche complète.
+
+Lance l'application FastAPI dans le processus (uvicorn sur un port local), inscrit N joueurs,
+connecte N clients sur /ws/{wallet_address} et M masters sur /ws/manager, lance un compte à
+rebours via /api/broadcast_countdown puis envoie N résultats concurrents sur /api/game-result.
+
+DeepFace, gTTS et le faucet XRPL sont remplacés par des bouchons à latence configurable.
+
+Usage (depuis backend/):
+    python -m bench.round_bench --players 200 --masters 2 --duration 3 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+# Configuration lue à l'import des services: à fixer avant d'importer l'application
+os.environ.setdefault("TTS_PREWARM", "")
+os.environ.setdefault("WALLET_POOL_SIZE", "0")
+os.environ.setdefault("BALANCE_REFRESH_INTERVAL", "3600")
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "min": ordered[0],
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": ordered[-1],
+        "mean": sum(ordered) / len(ordered),
+    }
+
+
+class StubEmotionService:
+    """Remplace EmotionInferenceService: latence fixe, émotions constantes."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.ready = True
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def score(self, file) -> dict:
+        await asyncio.sleep(self.latency)
+        emotions = {"angry": 1.0, "disgust": 0.0, "fear": 1.0, "happy": 80.0,
+                    "sad": 2.0, "surprise": 6.0, "neutral": 10.0}
+        return {"emotions": emotions, "score": 90.0}
+
+
+def install_stubs(fer_latency: float, faucet_latency: float, tts_latency: float):
+    """Remplace les dépendances réseau et les modèles par des bouchons locaux."""
+    from decimal import Decimal
+    from xrpl.wallet import Wallet
+    import app.main
+    import app.routes.api as api
+    from app.services.xrp import xrpl_gateway
+
+    stub = StubEmotionService(fer_latency)
+    app.main.emotion_service = stub
+    api.emotion_service = stub
+
+    async def create_wallet():
+        await asyncio.sleep(faucet_latency)
+        return Wallet.create()
+
+    async def get_account_balance(wallet_address):
+        await asyncio.sleep(faucet_latency / 10)
+        return Decimal("100"), 1
+
+    async def get_validated_ledger_index():
+        return 1
+
+    xrpl_gateway.create_wallet = create_wallet
+    xrpl_gateway.get_account_balance = get_account_balance
+    xrpl_gateway.get_validated_ledger_index = get_validated_ledger_index
+
+    def synthesize(text, lang="fr", voice=None):
+        time.sleep(tts_latency)
+        return b"\xff\xfb\x90\x00" * 256
+
+    app.main.synthesize_google = synthesize
+    api.synthesize_google = synthesize
+    api.synthesize_x3 = synthesize
+    return app.main.app
+
+
+class Recorder:
+    """Horodatage de réception des ticks de compte à rebours, par socket."""
+
+    def __init__(self):
+        self.ticks = {}  # valeur -> liste des heures de réception
+        self.round_ends_at = None
+        self.master_results = set()  # joueurs apparus dans les messages "scoreboard" des masters
+        self.scoreboard_messages = 0
+        self.round_complete = None  # taille du classement final ("round_complete")
+        self.zero_received = 0
+
+    def on_message(self, raw, is_master: bool):
+        received = time.time()
+        try:
+            data = json.loads(raw)
+        except (TypeError, json.JSONDecodeError):
+            return
+        if data.get("type") == "round_start":
+            self.round_ends_at = data["ends_at"]
+        elif data.get("type") == "countdown":
+            self.ticks.setdefault(data["value"], []).append(received)
+            if data["value"] == 0 and not is_master:
+                self.zero_received += 1
+        elif data.get("type") == "scoreboard" and is_master:
+            self.scoreboard_messages += 1
+            self.master_results.update(change["wallet_address"] for change in data["changes"])
+        elif data.get("type") == "round_complete" and is_master:
+            self.round_complete = len(data["leaderboard"])
+
+
+async def reader(ws, recorder: Recorder, is_master: bool):
+    try:
+        async for raw in ws:
+            recorder.on_message(raw, is_master)
+    except Exception:
+        pass
+
+
+async def run(args) -> dict:
+    import httpx
+    import uvicorn
+    from websockets.asyncio.client import connect
+
+    app = install_stubs(args.fer_latency, args.faucet_latency, args.tts_latency)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning",
+                                           ws_max_size=16 * 1024 * 1024))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+    ws_base = f"ws://127.0.0.1:{port}"
+
+    image = open(args.image, "rb").read() if args.image else os.urandom(args.image_size)
+    recorder = Recorder()
+    sockets, readers = [], []
+    limits = httpx.Limits(max_connections=args.http_connections)
+    async with httpx.AsyncClient(base_url=base, timeout=120, limits=limits) as http:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(http.get(f"/api/create_user/bench{i}") for i in range(args.players)))
+        wallets = [r.json()["wallet_address"] for r in responses]
+        registration_time = time.perf_counter() - started
+
+        for _ in range(args.masters):
+            ws = await connect(f"{ws_base}/ws/manager", max_size=None)
+            sockets.append(ws)
+            readers.append(asyncio.create_task(reader(ws, recorder, True)))
+        started = time.perf_counter()
+        client_sockets = await asyncio.gather(*(connect(f"{ws_base}/ws/{w}", max_size=None) for w in wallets))
+        connect_time = time.perf_counter() - started
+        for ws in client_sockets:
+            sockets.append(ws)
+            readers.append(asyncio.create_task(reader(ws, recorder, False)))
+
+        response = await http.post("/api/broadcast_countdown", json={"duration": args.duration})
+        response.raise_for_status()
+        deadline = time.time() + args.duration + args.timeout
+        while recorder.zero_received < len(wallets) and time.time() < deadline:
+            await asyncio.sleep(0.01)
+        zero_time = time.perf_counter()
+
+        async def submit(wallet):
+            sent = time.perf_counter()
+            r = await http.post("/api/game-result",
+                                data={"wallet_address": wallet, "gesture": "pierre"},
+                                files={"image": ("frame.jpg", image, "image/jpeg")})
+            return r.status_code, time.perf_counter() - sent
+
+        results = await asyncio.gather(*(submit(w) for w in wallets))
+        all_results_time = time.perf_counter() - zero_time
+        # Le classement final part ROUND_RESULTS_GRACE secondes après la fin du compte à rebours
+        deadline = time.time() + args.timeout
+        while (recorder.round_complete is None or len(recorder.master_results) < len(wallets)) \
+                and time.time() < deadline:
+            await asyncio.sleep(0.05)
+
+    for ws in sockets:
+        await ws.close()
+    for task in readers:
+        task.cancel()
+    server.should_exit = True
+    await serve_task
+
+    # Décalage de chaque tick par rapport à son échéance théorique (fin de manche - valeur)
+    skews, fanout = [], []
+    for value, times in recorder.ticks.items():
+        if recorder.round_ends_at is not None:
+            skews.extend(t - (recorder.round_ends_at - value) for t in times)
+        first = min(times)
+        fanout.extend(t - first for t in times)
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "parameters": vars(args),
+        "registration_s": registration_time,
+        "ws_connect_s": connect_time,
+        "countdown_zero_received": recorder.zero_received,
+        "tick_skew_s": percentiles(skews),
+        "broadcast_fanout_s": percentiles(fanout),
+        "time_to_all_results_s": all_results_time,
+        "game_result_latency_s": percentiles([latency for _, latency in results]),
+        "game_result_errors": sum(1 for status, _ in results if status != 200),
+        "master_results_received": len(recorder.master_results),
+        "master_scoreboard_messages": recorder.scoreboard_messages,
+        "round_complete_results": recorder.round_complete,
+        # Le processus héberge aussi les clients simulés: c'est un majorant du serveur seul
+        "peak_rss_mb": maxrss / 1024 if sys.platform != "darwin" else maxrss / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de charge d'une manche complète")
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--masters", type=int, default=1)
+    parser.add_argument("--duration", type=int, default=3, help="durée du compte à rebours (s)")
+    parser.add_argument("--image", help="image envoyée par chaque joueur (sinon octets aléatoires)")
+    parser.add_argument("--image-size", type=int, default=200_000)
+    parser.add_argument("--fer-latency", type=float, default=0.05, help="latence du bouchon d'analyse (s)")
+    parser.add_argument("--faucet-latency", type=float, default=0.0, help="latence du bouchon faucet (s)")
+    parser.add_argument("--tts-latency", type=float, default=0.0, help="latence du bouchon TTS (s)")
+    parser.add_argument("--http-connections", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=10, help="attente max après la fin du compte à rebours (s)")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--output", help="fichier JSON de résultats (sinon sortie standard)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
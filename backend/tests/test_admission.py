@@ -0,0 +1,214 @@
+import asyncio
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from app.services.admission import (PRIORITY_ROUND, PRIORITY_SCORING, PRIORITY_TTS, AdmissionController,
+                                    AdmissionRejected, DeadlineExceeded)
+from app.services.tts_cache import ClosingStreamingResponse
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_admits_up_to_concurrency_then_queues():
+    async def main():
+        controller = AdmissionController(concurrency=2, per_client=10, queue_depth=10, low_queue_depth=5)
+        first = await controller.acquire(PRIORITY_SCORING)
+        await controller.acquire(PRIORITY_SCORING)
+        waiting = asyncio.create_task(controller.acquire(PRIORITY_SCORING))
+        await settle()
+        assert (controller.active, controller.queued) == (2, 1)
+        controller.release(first)
+        third = await waiting
+        assert (controller.active, controller.queued) == (2, 0)
+        # release est idempotent: un second appel ne libère pas une autre place
+        controller.release(first)
+        assert controller.active == 2
+        controller.release(third)
+        assert controller.active == 1
+
+    asyncio.run(main())
+
+
+def test_round_results_pass_before_lower_priorities():
+    async def main():
+        controller = AdmissionController(concurrency=1, per_client=10, queue_depth=10, low_queue_depth=10)
+        running = await controller.acquire(PRIORITY_ROUND)
+        order = []
+
+        async def request(priority, name):
+            ticket = await controller.acquire(priority)
+            order.append(name)
+            controller.release(ticket)
+
+        tasks = [asyncio.create_task(request(PRIORITY_TTS, "tts")),
+                 asyncio.create_task(request(PRIORITY_SCORING, "scoring")),
+                 asyncio.create_task(request(PRIORITY_ROUND, "round-1")),
+                 asyncio.create_task(request(PRIORITY_ROUND, "round-2"))]
+        await settle()
+        assert controller.queued == 4
+        controller.release(running)
+        await asyncio.gather(*tasks)
+        assert order == ["round-1", "round-2", "scoring", "tts"]
+        assert (controller.active, controller.queued) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_low_priorities_are_shed_past_low_queue_depth():
+    async def main():
+        controller = AdmissionController(concurrency=1, per_client=10, queue_depth=10, low_queue_depth=2)
+        running = await controller.acquire(PRIORITY_ROUND)
+        queued = [asyncio.create_task(controller.acquire(PRIORITY_SCORING)) for _ in range(2)]
+        await settle()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire(PRIORITY_TTS)
+        assert rejected.value.retry_after >= 1
+        with pytest.raises(AdmissionRejected):
+            controller.check(PRIORITY_SCORING)
+        # Les résultats de manche restent acceptés jusqu'à queue_depth
+        controller.check(PRIORITY_ROUND)
+        round_ticket = asyncio.create_task(controller.acquire(PRIORITY_ROUND))
+        await settle()
+        assert controller.queued == 3
+        controller.release(running)
+        controller.release(await round_ticket)
+        for task in queued:
+            controller.release(await task)
+        assert (controller.active, controller.queued) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_full_queue_evicts_most_recent_lower_priority_request():
+    async def main():
+        controller = AdmissionController(concurrency=1, per_client=10, queue_depth=3, low_queue_depth=3)
+        running = await controller.acquire(PRIORITY_ROUND)
+        oldest_tts = asyncio.create_task(controller.acquire(PRIORITY_TTS))
+        scoring = asyncio.create_task(controller.acquire(PRIORITY_SCORING))
+        newest_tts = asyncio.create_task(controller.acquire(PRIORITY_TTS))
+        await settle()
+        assert controller.queued == 3
+
+        round_ticket = asyncio.create_task(controller.acquire(PRIORITY_ROUND))
+        await settle()
+        with pytest.raises(AdmissionRejected):
+            await newest_tts
+        assert not oldest_tts.done() and not scoring.done()
+        assert controller.queued == 3
+
+        # La priorité la plus basse part d'abord, même plus ancienne
+        second_round = asyncio.create_task(controller.acquire(PRIORITY_ROUND))
+        await settle()
+        with pytest.raises(AdmissionRejected):
+            await oldest_tts
+        assert not scoring.done()
+        third_round = asyncio.create_task(controller.acquire(PRIORITY_ROUND))
+        await settle()
+        with pytest.raises(AdmissionRejected):
+            await scoring
+        # File pleine de résultats de manche seulement: plus de victime, refus
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire(PRIORITY_ROUND)
+
+        controller.release(running)
+        for task in (round_ticket, second_round, third_round):
+            controller.release(await task)
+        assert (controller.active, controller.queued, controller.stats()["clients"]) == (0, 0, 0)
+
+    asyncio.run(main())
+
+
+def test_deadline_expires_while_queued():
+    async def main():
+        loop = asyncio.get_running_loop()
+        controller = AdmissionController(concurrency=1, per_client=10, queue_depth=10, low_queue_depth=10)
+        with pytest.raises(DeadlineExceeded):
+            await controller.acquire(PRIORITY_ROUND, "w1", deadline=loop.time() - 1)
+        running = await controller.acquire(PRIORITY_ROUND)
+        with pytest.raises(DeadlineExceeded):
+            await controller.acquire(PRIORITY_ROUND, "w1", deadline=loop.time() + 0.05)
+        assert (controller.queued, controller.stats()["clients"]) == (0, 0)
+        controller.release(running)
+        assert controller.active == 0
+
+    asyncio.run(main())
+
+
+def test_expired_ticket_is_skipped_when_a_slot_frees():
+    async def main():
+        loop = asyncio.get_running_loop()
+        controller = AdmissionController(concurrency=1, per_client=10, queue_depth=10, low_queue_depth=10)
+        running = await controller.acquire(PRIORITY_ROUND)
+        expiring = asyncio.create_task(controller.acquire(PRIORITY_ROUND, deadline=loop.time() + 10))
+        later = asyncio.create_task(controller.acquire(PRIORITY_SCORING))
+        await settle()
+        # L'échéance passe sans que le minuteur de l'attente ait encore expiré
+        controller._heap[0].deadline = loop.time() - 1
+        controller.release(running)
+        with pytest.raises(DeadlineExceeded):
+            await expiring
+        controller.release(await later)
+        assert (controller.active, controller.queued) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_per_client_limit_counts_running_and_queued_requests():
+    async def main():
+        controller = AdmissionController(concurrency=1, per_client=2, queue_depth=10, low_queue_depth=10)
+        first = await controller.acquire(PRIORITY_ROUND, "w1")
+        second = asyncio.create_task(controller.acquire(PRIORITY_ROUND, "w1"))
+        await settle()
+        with pytest.raises(AdmissionRejected, match="client"):
+            await controller.acquire(PRIORITY_ROUND, "w1")
+        other = asyncio.create_task(controller.acquire(PRIORITY_ROUND, "w2"))
+        await settle()
+        controller.release(first)
+        controller.release(await second)
+        controller.release(await other)
+        assert controller.stats()["clients"] == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_gives_its_place_back():
+    async def main():
+        controller = AdmissionController(concurrency=1, per_client=10, queue_depth=10, low_queue_depth=10)
+        running = await controller.acquire(PRIORITY_SCORING, "w1")
+        waiting = asyncio.create_task(controller.acquire(PRIORITY_SCORING, "w1"))
+        await settle()
+        waiting.cancel()
+        await settle()
+        assert (controller.queued, controller.stats()["clients"]) == (0, 1)
+        controller.release(running)
+        assert (controller.active, controller.stats()["clients"]) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_streamed_response_releases_when_client_leaves_before_first_chunk():
+    async def main():
+        controller = AdmissionController(concurrency=1, per_client=10, queue_depth=10, low_queue_depth=10)
+        ticket = await controller.acquire(PRIORITY_TTS, "client")
+
+        async def chunks():
+            yield b"audio"
+
+        async def send(message):
+            raise OSError("client parti")
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        body = chunks()
+        response = ClosingStreamingResponse(body, on_close=lambda: controller.release(ticket))
+        with pytest.raises(ClientDisconnect):
+            await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+        assert (controller.active, controller.stats()["clients"]) == (0, 0)
+        assert body.ag_frame is None  # générateur fermé
+
+    asyncio.run(main())
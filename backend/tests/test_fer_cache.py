@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+
+import numpy as np
+import pytest
+
+from app.services.fer_cache import EmotionResultCache, dhash
+
+RESULT = {"emotions": {"happy": 90.0}, "score": 90.0}
+
+
+def digest(name: str) -> bytes:
+    return hashlib.blake2b(name.encode(), digest_size=16).digest()
+
+
+def flip(phash: int, *bits: int) -> int:
+    for bit in bits:
+        phash ^= 1 << bit
+    return phash
+
+
+def test_bands_cover_the_64_bits():
+    for distance in (0, 3, 4, 7):
+        cache = EmotionResultCache(distance=distance)
+        assert len(cache._bands) == distance + 1
+        covered = 0
+        for shift, mask in cache._bands:
+            assert covered & (mask << shift) == 0  # bandes disjointes
+            covered |= mask << shift
+        assert covered == (1 << 64) - 1
+
+
+def test_nearest_finds_hashes_within_distance_in_any_band():
+    cache = EmotionResultCache(max_entries=10, distance=4)
+    base = 0x0123456789ABCDEF
+    cache.store((digest("a"), base), RESULT)
+    # 4 bits différents, répartis sur plusieurs bandes: au moins une bande reste identique
+    assert cache._nearest(flip(base, 0, 17, 35, 63)) is not None
+    assert cache._nearest(flip(base, 0, 1, 2, 3, 4)) is None
+    assert cache._nearest(flip(base, 0, 13, 26, 39, 52)) is None
+
+
+def test_nearest_prefers_the_closest_entry():
+    cache = EmotionResultCache(max_entries=10, distance=4)
+    base = 0xFFFF0000FFFF0000
+    cache.store((digest("far"), flip(base, 1, 2, 3)), {"score": 1.0})
+    cache.store((digest("near"), flip(base, 1)), {"score": 2.0})
+    assert cache._nearest(base).result == {"score": 2.0}
+
+
+def test_eviction_and_expiry_clean_the_band_index():
+    cache = EmotionResultCache(max_entries=2, ttl=60, distance=4)
+    a, b, c = 0, (1 << 64) - 1, 0xAAAAAAAAAAAAAAAA  # à au moins 32 bits les unes des autres
+    cache.store((digest("a"), a), RESULT)
+    cache.store((digest("b"), b), RESULT)
+    cache.store((digest("c"), c), RESULT)  # évince "a" (LRU)
+    assert len(cache) == 2
+    assert cache._nearest(a) is None
+    assert all(digest("a") not in digests for index in cache._index for digests in index.values())
+
+    cache._entries[digest("b")].expires = 0
+    assert cache._nearest(b) is None
+    assert len(cache) == 1
+    cache._remove(cache._entries[digest("c")])
+    assert cache._index == [{} for _ in cache._bands]
+
+
+def test_errors_are_not_cached():
+    cache = EmotionResultCache(max_entries=10)
+    cache.store((digest("a"), 1), {"error": "Face could not be detected"})
+    cache.store(None, RESULT)
+    assert len(cache) == 0
+
+
+def test_exact_path_without_decoding():
+    async def main():
+        cache = EmotionResultCache(max_entries=10, perceptual=False)
+        result, key = await cache.lookup(b"not an image")
+        assert result is None and key == (digest_of(b"not an image"), None)
+        cache.store(key, RESULT)
+        assert cache.exact(b"not an image")[0] == RESULT
+        assert (cache.hits, cache.near_hits, cache.misses) == (1, 0, 1)
+
+    def digest_of(data):
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    asyncio.run(main())
+
+
+def test_disabled_cache():
+    async def main():
+        cache = EmotionResultCache(max_entries=0)
+        assert await cache.lookup(b"image") == (None, None)
+        assert cache.exact(b"image") == (None, None)
+
+    asyncio.run(main())
+
+
+def test_recompressed_image_is_a_near_hit():
+    cv2 = pytest.importorskip("cv2")
+    rng = np.random.default_rng(0)
+    image = cv2.resize(rng.integers(0, 255, (8, 8, 3), dtype=np.uint8), (256, 256), interpolation=cv2.INTER_CUBIC)
+    original = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+    recompressed = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 70])[1].tobytes()
+    assert original != recompressed
+    assert (dhash(original) ^ dhash(recompressed)).bit_count() <= 4
+
+    async def main():
+        cache = EmotionResultCache(max_entries=10)
+        result, key = await cache.lookup(original)
+        assert result is None
+        cache.store(key, RESULT)
+        assert await cache.lookup(recompressed) == (RESULT, None)
+        assert cache.near_hits == 1
+        # La copie est ensuite trouvée par le chemin exact
+        assert cache.exact(recompressed)[0] == RESULT
+
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+from app.services.admission import DeadlineExceeded
+from app.services.jobs import DONE, FAILED, PENDING, ScoringFailed, ScoringJobs
+
+
+class FakeManager:
+    def __init__(self):
+        self.sent = []
+
+    async def send_personal_message(self, message: str, wallet_address: str):
+        self.sent.append((wallet_address, json.loads(message)))
+
+
+def run_jobs(process, scenario, **kwargs):
+    async def main():
+        manager = FakeManager()
+        jobs = ScoringJobs(manager, process, **kwargs)
+        await scenario(jobs)
+        await asyncio.gather(*jobs._tasks)
+        return jobs, manager
+    return asyncio.run(main())
+
+
+async def score(job, data):
+    return {"emotions": {"happy": 90.0}, "emotion_score": 90.0, "outcome": None}
+
+
+def test_reserved_job_is_found_before_it_starts():
+    async def scenario(jobs):
+        job = jobs.reserve("w1", "alice", "pierre", "r1")
+        assert jobs.find("w1", "r1") is job
+        assert job.status == PENDING and job.image_id is None
+        assert jobs.find("w1", "r2") is None
+        assert jobs.find("w1", None) is None  # hors manche: pas de déduplication
+        jobs.start(job, b"image", "img1")
+
+    jobs, manager = run_jobs(score, scenario)
+    job = jobs.find("w1", "r1")
+    assert job.status == DONE and job.image_id == "img1"
+    wallet, message = manager.sent[0]
+    assert wallet == "w1"
+    assert message["type"] == "score_result" and message["emotion_score"] == 90.0
+
+
+def test_cancelled_reservation_allows_a_retry():
+    async def scenario(jobs):
+        job = jobs.reserve("w1", "alice", "pierre", "r1")
+        jobs.cancel(job)
+        assert jobs.find("w1", "r1") is None
+        assert jobs.get(job.job_id) is None
+        retry = jobs.reserve("w1", "alice", "pierre", "r1")
+        jobs.cancel(job)  # sans effet sur la nouvelle réservation
+        assert jobs.find("w1", "r1") is retry
+
+    run_jobs(score, scenario)
+
+
+def test_failed_analysis_is_reported_and_can_be_retried():
+    async def fail(job, data):
+        raise ScoringFailed("Face could not be detected")
+
+    async def scenario(jobs):
+        jobs.start(jobs.reserve("w1", "alice", "pierre", "r1"), b"image", "img1")
+
+    jobs, manager = run_jobs(fail, scenario)
+    _, message = manager.sent[0]
+    assert message["status"] == FAILED
+    assert message["error"] == "Face could not be detected"
+    assert "emotion_score" not in message
+    assert jobs.find("w1", "r1") is None
+    assert jobs.stats()[FAILED] == 1
+
+
+def test_deadline_exceeded_fails_the_job():
+    async def late(job, data):
+        raise DeadlineExceeded("Échéance dépassée")
+
+    async def scenario(jobs):
+        jobs.start(jobs.reserve("w1", "alice", "pierre", "r1"), b"image", "img1")
+
+    _, manager = run_jobs(late, scenario)
+    assert manager.sent[0][1]["error"] == "Manche terminée, résultat non analysé"
+
+
+def test_finished_jobs_expire_after_ttl():
+    async def scenario(jobs):
+        old = jobs.reserve("w1", "alice", "pierre", "r1")
+        jobs.start(old, b"image", "img1")
+        await asyncio.gather(*jobs._tasks)
+        old.finished -= 120
+        recent = jobs.reserve("w2", "bob", "pierre", "r1")
+        assert jobs.get(old.job_id) is None
+        assert jobs.find("w1", "r1") is None
+        assert jobs.get(recent.job_id) is recent
+
+    run_jobs(score, scenario, ttl=60)
+
+
+def test_max_jobs_forgets_finished_jobs_but_not_running_ones():
+    async def scenario(jobs):
+        pending = jobs.reserve("w0", "alice", "pierre", "r1")  # jamais lancée: jamais oubliée
+        done = []
+        for i in range(1, 3):
+            job = jobs.reserve(f"w{i}", "bob", "pierre", "r1")
+            jobs.start(job, b"image", f"img{i}")
+            done.append(job)
+        await asyncio.gather(*jobs._tasks)
+        jobs.reserve("w3", "carol", "pierre", "r1")
+        assert jobs.get(pending.job_id) is pending
+        assert jobs.get(done[0].job_id) is None
+        assert jobs.get(done[1].job_id) is done[1]
+        assert len(jobs._jobs) == 3
+
+    run_jobs(score, scenario, ttl=600, max_jobs=3)
@@ -0,0 +1,80 @@
+from app.services.registry import PlayerRegistry
+
+
+def make_registry(count: int = 10) -> PlayerRegistry:
+    registry = PlayerRegistry()
+    for i in range(count):
+        registry.add(f"w{i}", {"username": f"user{i % 3}", "is_connected": i % 2 == 0,
+                               "round_id": "r1" if i < 4 else None})
+    return registry
+
+
+def wallets(players) -> list:
+    return [p.wallet_address for p in players]
+
+
+def test_page_without_filters_keeps_registration_order():
+    registry = make_registry()
+    total, players = registry.page(offset=3, limit=4)
+    assert total == 10
+    assert wallets(players) == ["w3", "w4", "w5", "w6"]
+
+
+def test_page_past_the_end_is_empty():
+    total, players = make_registry().page(offset=20, limit=5)
+    assert total == 10
+    assert players == []
+
+
+def test_page_connected_and_disconnected():
+    registry = make_registry()
+    total, players = registry.page(connected=True, limit=2)
+    assert total == 5
+    assert wallets(players) == ["w0", "w2"]
+    total, players = registry.page(connected=False, offset=1, limit=10)
+    assert total == 5
+    assert wallets(players) == ["w3", "w5", "w7", "w9"]
+
+
+def test_page_combined_filters():
+    registry = make_registry()
+    total, players = registry.page(username="user0")
+    assert wallets(players) == ["w0", "w3", "w6", "w9"] and total == 4
+    total, players = registry.page(username="user0", round_id="r1")
+    assert wallets(players) == ["w0", "w3"] and total == 2
+    total, players = registry.page(round_id="r1", connected=True)
+    assert wallets(players) == ["w0", "w2"] and total == 2
+
+
+def test_update_moves_player_between_indexes():
+    registry = make_registry()
+    version = registry.version
+    assert registry.update("w1", {"is_connected": True, "username": "renamed", "round_id": "r2"}) == {
+        "is_connected": True, "username": "renamed", "round_id": "r2"}
+    assert registry.version == version + 1
+    assert registry.page(connected=True)[0] == 6
+    assert wallets(registry.by_username("renamed")) == ["w1"]
+    assert "w1" not in wallets(registry.by_username("user1"))
+    assert wallets(registry.in_round("r2")) == ["w1"]
+    # Aucun changement réel: version inchangée
+    assert registry.update("w1", {"is_connected": True}) == {}
+    assert registry.version == version + 1
+
+
+def test_update_ignores_wallet_address_and_unknown_fields():
+    registry = make_registry(1)
+    assert registry.update("w0", {"wallet_address": "other", "unknown": 1}) == {}
+    assert registry.get("w0").wallet_address == "w0"
+
+
+def test_remove_and_readd_clean_indexes():
+    registry = make_registry()
+    registry.remove("w0")
+    assert "w0" not in registry
+    assert registry.page(connected=True)[0] == 4
+    assert "w0" not in wallets(registry.in_round("r1"))
+    registry.add("w2", {"username": "again"})
+    # Réinscription: les anciens index du joueur sont retirés
+    assert registry.by_username("user2") == [registry.get("w5"), registry.get("w8")]
+    assert not registry.get("w2").is_connected
+    assert len(registry) == 9
@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from app.services.rounds import RoundScheduler
+from app.services.state import MemoryStateBackend
+
+
+class FakeManager:
+    def __init__(self):
+        self.sent = []
+
+    async def broadcast(self, message: str):
+        self.sent.append(json.loads(message))
+
+    async def broadcast_masters(self, message: str):
+        pass
+
+    async def broadcast_countdown(self, message: str):
+        self.sent.append(json.loads(message))
+
+
+def test_round_start_then_sparse_resyncs():
+    async def scenario():
+        manager = FakeManager()
+        scheduler = RoundScheduler(manager, resync_interval=2, backend=MemoryStateBackend())
+        current = await scheduler.start(3)
+        await asyncio.wait_for(scheduler._task, 5)
+        return manager.sent, current
+
+    sent, current = asyncio.run(scenario())
+    assert sent[0]["type"] == "round_start"
+    assert round(sent[0]["ends_at"] - sent[0]["server_time"]) == 3
+    # Une resynchronisation toutes les 2 secondes, et toujours la valeur 0 en fin de manche
+    assert [m["value"] for m in sent if m["type"] == "countdown"] == [3, 1, 0]
+    assert current.state == "finished"
+
+
+def test_state_message_for_late_joiners():
+    async def scenario():
+        scheduler = RoundScheduler(FakeManager(), backend=MemoryStateBackend())
+        before = scheduler.state_message()
+        current = await scheduler.start(10)
+        running = json.loads(scheduler.state_message())
+        await scheduler.pause(current.round_id)
+        paused = json.loads(scheduler.state_message())
+        await scheduler.cancel(current.round_id)
+        return before, running, paused, scheduler.state_message()
+
+    before, running, paused, after = asyncio.run(scenario())
+    assert before is None
+    assert running["type"] == "round_start" and 9 < running["ends_at"] - running["server_time"] <= 10
+    assert paused["type"] == "round_paused" and 9 < paused["remaining"] <= 10
+    assert after is None
@@ -0,0 +1,71 @@
+from app.services.scoreboard import RoundResults, game_outcome, normalize_gesture
+
+
+def leaderboard_wallets(results: RoundResults, limit: int = None) -> list:
+    return [entry["wallet_address"] for entry in results.leaderboard(limit)]
+
+
+def test_normalize_gesture():
+    assert normalize_gesture(0) == "pierre"
+    assert normalize_gesture(2) == "ciseau"
+    assert normalize_gesture(" Ciseaux ") == "ciseau"
+    assert normalize_gesture("Feuille") == "feuille"
+
+
+def test_game_outcome_matches_client_rule():
+    assert game_outcome("pierre", "Pierre") == "gagné"  # reproduire le geste
+    assert game_outcome("feuille", "pierre") == "gagné"  # le battre
+    assert game_outcome("ciseau", "pierre") == "perdu"
+    assert game_outcome("lézard", "pierre") == "invalide"
+
+
+def test_ranking_by_emotion_then_arrival_without_master_gesture():
+    results = RoundResults("r1")
+    results.record("a", {"gesture": "pierre", "emotion_score": 40.0})
+    results.record("b", {"gesture": "pierre", "emotion_score": 80.0})
+    results.record("c", {"gesture": "pierre", "emotion_score": 40.0})
+    results.record("d", {"gesture": "pierre"})  # score pas encore connu
+    assert leaderboard_wallets(results) == ["b", "a", "c", "d"]
+    assert [results.rank(w) for w in "abcd"] == [2, 1, 3, 4]
+    assert results.rank("unknown") is None
+
+
+def test_winners_first_once_master_gesture_is_known():
+    results = RoundResults("r1")
+    results.record("a", {"gesture": "ciseau", "emotion_score": 90.0})
+    results.record("b", {"gesture": "feuille", "emotion_score": 10.0})
+    results.record("c", {"gesture": "pierre", "emotion_score": 50.0})
+    results.set_master_gesture("Pierre")
+    assert results.wins == 2
+    assert leaderboard_wallets(results) == ["c", "b", "a"]
+    assert [entry["rank"] for entry in results.leaderboard()] == [1, 2, 3]
+    assert results.leaderboard()[2]["outcome"] == "perdu"
+    # Résultat arrivé après le geste du master: issue calculée à l'enregistrement
+    results.record("d", {"gesture": "feuille", "emotion_score": 70.0})
+    assert results.wins == 3
+    assert leaderboard_wallets(results) == ["d", "c", "b", "a"]
+
+
+def test_update_reranks_a_player():
+    results = RoundResults("r1")
+    for wallet, score in (("a", 10.0), ("b", 20.0), ("c", 30.0)):
+        results.record(wallet, {"gesture": "pierre", "emotion_score": score})
+    results.set_master_gesture("feuille")
+    assert results.wins == 0
+    # Le score émotionnel arrive après le geste (mode asynchrone)
+    results.record("a", {"emotion_score": 99.0})
+    assert leaderboard_wallets(results) == ["a", "c", "b"]
+    results.record("b", {"gesture": "ciseau"})
+    assert results.wins == 1
+    assert leaderboard_wallets(results) == ["b", "a", "c"]
+    assert len(results._ranking) == len(results.results) == 3
+
+
+def test_leaderboard_limit_and_ignored_fields():
+    results = RoundResults("r1")
+    for i in range(5):
+        results.record(f"w{i}", {"gesture": "pierre", "emotion_score": float(i), "outcome": "gagné"})
+    assert leaderboard_wallets(results, 2) == ["w4", "w3"]
+    # outcome n'est pas un champ enregistrable: il est calculé
+    assert results.wins == 0
+    assert results.summary() == {"round_id": "r1", "master_gesture": None, "results": 5, "wins": 0}
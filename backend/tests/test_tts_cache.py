@@ -0,0 +1,25 @@
+import asyncio
+import time
+
+from app.services.tts_cache import TTSCache
+
+
+def test_coalesced_requests_are_not_counted_as_misses():
+    calls = []
+
+    def synthesize(text, lang, voice):
+        calls.append(text)
+        time.sleep(0.05)
+        return b"mp3"
+
+    async def scenario():
+        cache = TTSCache(max_bytes=1024)
+        results = await asyncio.gather(*(cache.get_or_synthesize("google", "fr", "com", "Bonjour", synthesize)
+                                         for _ in range(3)))
+        await cache.get_or_synthesize("google", "fr", "com", " Bonjour ", synthesize)
+        return cache.stats(), results
+
+    stats, results = asyncio.run(scenario())
+    assert calls == ["Bonjour"]
+    assert {data for _, data in results} == {b"mp3"}
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 2, 1)
@@ -1,6 +1,7 @@
 "use client";
 import { useEffect, useRef, useState } from "react";
 import { getGameOutcome } from "@/lib/gestures";
+import { useRoundCountdown } from "@/lib/countdown";
 
 // Déclarations globales MediaPipe
 declare const Hands: any;
@@ -41,7 +42,7 @@ export default function Home() {
   const videoRef = useRef<HTMLVideoElement>(null);
   const canvasRef = useRef<HTMLCanvasElement>(null);
   const [gesture, setGesture] = useState<string>("...");
-  const [currentCount, setCurrentCount] = useState<number | null>(null);
+  const { count: currentCount, handleRoundMessage } = useRoundCountdown();
   const [isConnected, setIsConnected] = useState(false);
   const [walletAddress, setWalletAddress] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(true);
@@ -219,13 +220,15 @@ export default function Home() {
       try {
         const data = JSON.parse(event.data);
         console.log('Message WebSocket reçu:', data);
-        if (data.type === 'countdown' && typeof data.value === 'number') {
-          setCurrentCount(data.value);
-        }
+        // Début de manche, resynchronisation, pause ou annulation: décompte local
+        if (handleRoundMessage(data)) return;
         if (data.type === 'game_result') {
           console.log('Résultat du master reçu :', data.value);
           setMasterResult(data.value);
         }
+        if (data.type === 'score_result') {
+          console.log('Analyse émotionnelle reçue :', data.status, data.emotion_score);
+        }
       } catch (error) {
         console.error('Erreur de parsing WebSocket:', error);
       }
@@ -4,6 +4,7 @@ import { useState, useEffect, useRef } from 'react'
 import ClientsDrawer from './ClientsDrawer'
 import React from 'react'
 import { speak } from "@/lib/tts"
+import { useRoundCountdown } from "@/lib/countdown"
 
 interface Client {
   username: string
@@ -16,9 +17,10 @@ export default function MasterPage() {
   const [isLoading, setIsLoading] = useState(false)
   const [clients, setClients] = useState<Client[]>([])
   const [isConnected, setIsConnected] = useState(false)
-  const [countdown, setCountdown] = useState<number | null>(null)
+  const { count: countdown, setCount: setCountdown, handleRoundMessage } = useRoundCountdown()
   const [isDrawerOpen, setIsDrawerOpen] = useState(false)
   const wsRef = useRef<WebSocket | null>(null)
+  const clientsSeqRef = useRef<number | null>(null)
   const audioCtxRef = useRef<any>(null)
   const prevValueRef = useRef<number | null>(null)
   const [isEditing, setIsEditing] = useState(false)
@@ -40,11 +42,26 @@ export default function MasterPage() {
       try {
         const data = JSON.parse(event.data)
         if (data.type === 'clients_update') {
+          clientsSeqRef.current = data.seq ?? null
           setClients(data.clients)
         }
-        if (data.type === 'countdown' && typeof data.value === 'number') {
-          setCountdown(data.value)
+        if (data.type === 'clients_delta') {
+          // Un changement manqué: on redemande la liste complète
+          if (clientsSeqRef.current === null || data.seq !== clientsSeqRef.current + 1) {
+            ws.send(JSON.stringify({ type: 'resync' }))
+            return
+          }
+          clientsSeqRef.current = data.seq
+          setClients(prev => {
+            const byWallet = new Map(prev.map(c => [c.wallet_address, c]))
+            for (const change of data.changes) {
+              byWallet.set(change.wallet_address, { ...byWallet.get(change.wallet_address), ...change })
+            }
+            return Array.from(byWallet.values())
+          })
         }
+        // Début de manche, resynchronisation, pause ou annulation: décompte local
+        if (handleRoundMessage(data)) return
 
         if (data.type === 'master_result') {
           console.log('🎲 Résultat du master reçu:', data.value);
@@ -68,6 +85,13 @@ export default function MasterPage() {
           }
           console.log(`📊 Score émotionnel global: ${Math.round(data.emotion_score)}%`);
         }
+        // Classement de la manche, envoyé par lots pendant l'arrivée des résultats
+        if (data.type === 'scoreboard') {
+          console.log(`🏆 Manche ${data.round_id}: ${data.results} résultats, ${data.wins} gagnants`, data.top);
+        }
+        if (data.type === 'round_complete') {
+          console.log(`🏁 Manche ${data.round_id} terminée (master: ${data.master_gesture})`, data.leaderboard);
+        }
       } catch (error) {
         console.error('Erreur de parsing du message:', error)
       }
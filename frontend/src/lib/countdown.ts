@@ -0,0 +1,74 @@
+import { useEffect, useRef, useState } from "react";
+
+// Compte à rebours d'une manche, décompté localement.
+// - round_start donne l'heure de fin (ends_at) et l'heure d'envoi (server_time) du serveur:
+//   la durée restante (ends_at - server_time) est reportée sur l'horloge locale, ce qui corrige
+//   l'écart entre les deux horloges.
+// - Les messages countdown ne servent qu'à resynchroniser (dérive, connexion en cours de manche);
+//   la valeur 0 du serveur termine toujours la manche.
+export function useRoundCountdown() {
+  const [count, setCount] = useState<number | null>(null);
+  const endRef = useRef<number | null>(null); // fin de manche, horloge locale (ms)
+  const timerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
+
+  const stop = () => {
+    if (timerRef.current) clearTimeout(timerRef.current);
+    timerRef.current = null;
+    endRef.current = null;
+  };
+
+  const tick = () => {
+    if (endRef.current === null) return;
+    const left = Math.max(0, Math.ceil((endRef.current - Date.now()) / 1000 - 1e-3));
+    setCount(left);
+    if (left === 0) {
+      stop();
+      return;
+    }
+    // Prochain changement de valeur: la seconde entière suivante avant la fin
+    timerRef.current = setTimeout(tick, Math.max(0, endRef.current - (left - 1) * 1000 - Date.now()));
+  };
+
+  const runUntil = (end: number) => {
+    stop();
+    endRef.current = end;
+    tick();
+  };
+
+  // À appeler pour chaque message WebSocket; retourne true si le message concernait la manche
+  const handleRoundMessage = (data: any): boolean => {
+    if (data.type === 'round_start' && typeof data.ends_at === 'number') {
+      const remaining = typeof data.server_time === 'number' ? data.ends_at - data.server_time : data.remaining;
+      runUntil(Date.now() + remaining * 1000);
+      return true;
+    }
+    if (data.type === 'countdown' && typeof data.value === 'number') {
+      if (data.value === 0) {
+        stop();
+        setCount(0);
+        return true;
+      }
+      const local = endRef.current === null ? null : Math.ceil((endRef.current - Date.now()) / 1000 - 1e-3);
+      if (local !== data.value) {
+        // Décompte absent (connexion en cours de manche) ou décalé: le serveur fait foi
+        runUntil(Date.now() + data.value * 1000);
+      }
+      return true;
+    }
+    if (data.type === 'round_paused' && typeof data.remaining === 'number') {
+      stop();
+      setCount(Math.ceil(data.remaining));
+      return true;
+    }
+    if (data.type === 'round_cancelled') {
+      stop();
+      setCount(null);
+      return true;
+    }
+    return false;
+  };
+
+  useEffect(() => stop, []);
+
+  return { count, setCount, handleRoundMessage };
+}